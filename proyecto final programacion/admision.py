@@ -0,0 +1,166 @@
+"""
+Control de admisión y contrapresión del backend bajo sobrecarga.
+
+Cada solicitud pertenece a una clase de prioridad (ver CLASES: primero las escrituras y el
+cobro en caja, después las consultas livianas y por último los reportes). Cada clase tiene
+un máximo de solicitudes en curso y una cola acotada: si la cola está llena, o la espera
+supera el máximo, la solicitud se rechaza de inmediato con 503 y Retry-After en lugar de
+acumular latencia para todos. Una solicitud en cola no pasa mientras haya solicitudes de
+una clase más prioritaria esperando.
+
+Además, cada cliente (por dirección IP) puede tener un límite de solicitudes por segundo
+con un token bucket; al superarlo se responde 429 con Retry-After.
+
+Se configura por variables de entorno (ver ControlAdmision.desde_entorno):
+- TIENDA_ADMISION: '0' desactiva el control de admisión (por defecto activo).
+- TIENDA_ADMISION_<CLASE>: máximo de solicitudes en curso de la clase (ESCRITURA, CONSULTA, REPORTE).
+- TIENDA_ADMISION_COLA_<CLASE>: máximo de solicitudes esperando de la clase.
+- TIENDA_ADMISION_ESPERA_MS: espera máxima en cola antes de rechazar (por defecto 2000).
+- TIENDA_LIMITE_CLIENTE: solicitudes por segundo por cliente (0 = sin límite, por defecto).
+- TIENDA_RAFAGA_CLIENTE: ráfaga máxima por cliente (por defecto el doble del límite).
+"""
+import collections
+import math
+import os
+import threading
+import time
+
+# Clases de prioridad, de la más a la menos prioritaria
+CLASES = ('escritura', 'consulta', 'reporte')
+MAX_CLIENTES = 10000 # Token buckets de clientes que se conservan (se descartan los menos recientes)
+SUAVIZADO_DURACION = 0.2 # Peso de cada solicitud nueva en la duración media de su clase
+
+
+class Rechazo(Exception):
+    """Solicitud no admitida: el servidor está saturado o el cliente superó su límite."""
+    def __init__(self, codigo, motivo, reintentar_s):
+        super().__init__(motivo)
+        self.codigo = codigo
+        self.motivo = motivo
+        self.reintentar_s = reintentar_s
+
+
+class ControlAdmision:
+    """
+    Limita las solicitudes en curso y en cola por clase de prioridad, y la tasa por cliente.
+    """
+    def __init__(self, limites, colas, espera_s=2.0, limite_cliente=0.0, rafaga_cliente=None, activo=True):
+        """
+        :param limites: {clase: máximo de solicitudes en curso}.
+        :param colas: {clase: máximo de solicitudes esperando}.
+        :param espera_s: Espera máxima en cola antes de rechazar.
+        :param limite_cliente: Solicitudes por segundo por cliente (0 = sin límite).
+        :param rafaga_cliente: Solicitudes que un cliente puede hacer de golpe.
+        """
+        self.limites = dict(limites)
+        self.colas = dict(colas)
+        self.espera_s = espera_s
+        self.limite_cliente = limite_cliente
+        self.rafaga_cliente = rafaga_cliente or max(limite_cliente * 2, 1)
+        self.activo = activo
+        self._condicion = threading.Condition()
+        self.en_curso = {clase: 0 for clase in CLASES}
+        self.esperando = {clase: 0 for clase in CLASES}
+        self._duracion_media = {clase: 0.1 for clase in CLASES}
+        self._buckets = collections.OrderedDict() # cliente -> [tokens, última_recarga]
+        self._lock_buckets = threading.Lock()
+
+    @classmethod
+    def desde_entorno(cls):
+        """Crea el control de admisión a partir de las variables de entorno."""
+        hilos = int(os.environ.get('TIENDA_HILOS', '8'))
+        # Por defecto los reportes usan a lo sumo un cuarto de los hilos, así el cobro en
+        # caja siempre encuentra hilos libres
+        por_defecto = {'escritura': (hilos, hilos * 4), 'consulta': (hilos, hilos * 2),
+                       'reporte': (max(hilos // 4, 1), max(hilos // 4, 1))}
+        limites, colas = {}, {}
+        for clase, (limite, cola) in por_defecto.items():
+            limites[clase] = int(os.environ.get(f'TIENDA_ADMISION_{clase.upper()}', str(limite)))
+            colas[clase] = int(os.environ.get(f'TIENDA_ADMISION_COLA_{clase.upper()}', str(cola)))
+        limite_cliente = float(os.environ.get('TIENDA_LIMITE_CLIENTE', '0'))
+        rafaga = os.environ.get('TIENDA_RAFAGA_CLIENTE')
+        return cls(limites, colas,
+                   espera_s=float(os.environ.get('TIENDA_ADMISION_ESPERA_MS', '2000')) / 1000,
+                   limite_cliente=limite_cliente,
+                   rafaga_cliente=float(rafaga) if rafaga else None,
+                   activo=os.environ.get('TIENDA_ADMISION', '1') != '0')
+
+    def _consumir_token(self, cliente):
+        """Descuenta un token del bucket del cliente; lanza Rechazo (429) si no le quedan."""
+        ahora = time.monotonic()
+        with self._lock_buckets:
+            bucket = self._buckets.get(cliente)
+            if bucket is None:
+                bucket = [self.rafaga_cliente, ahora]
+                self._buckets[cliente] = bucket
+                if len(self._buckets) > MAX_CLIENTES:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(cliente)
+                bucket[0] = min(self.rafaga_cliente, bucket[0] + (ahora - bucket[1]) * self.limite_cliente)
+                bucket[1] = ahora
+            if bucket[0] < 1:
+                raise Rechazo(429, 'limite_cliente', (1 - bucket[0]) / self.limite_cliente)
+            bucket[0] -= 1
+
+    def _hay_prioritarias_esperando(self, clase):
+        return any(self.esperando[c] for c in CLASES[:CLASES.index(clase)])
+
+    def _puede_pasar(self, clase):
+        return self.en_curso[clase] < self.limites[clase] and not self._hay_prioritarias_esperando(clase)
+
+    def _reintentar_en(self, clase):
+        """Segundos sugeridos para reintentar: lo que tardaría en vaciarse la cola de la clase."""
+        tandas = (self.esperando[clase] + 1) / max(self.limites[clase], 1)
+        return self._duracion_media[clase] * tandas
+
+    def admitir(self, clase, cliente=None):
+        """
+        Admite una solicitud de la clase dada, esperando en cola si hace falta.
+        :param cliente: Identificador del cliente para el límite por cliente (ej. su IP).
+        :return: El instante de admisión, para pasarlo a liberar().
+        :raises Rechazo: Si la cola está llena, la espera venció o el cliente superó su límite.
+        """
+        if self.limite_cliente > 0 and cliente is not None:
+            self._consumir_token(cliente)
+        with self._condicion:
+            if not self._puede_pasar(clase):
+                if self.esperando[clase] >= self.colas[clase]:
+                    raise Rechazo(503, 'cola_llena', self._reintentar_en(clase))
+                limite = time.monotonic() + self.espera_s
+                self.esperando[clase] += 1
+                try:
+                    while not self._puede_pasar(clase):
+                        restante = limite - time.monotonic()
+                        if restante <= 0:
+                            raise Rechazo(503, 'espera_agotada', self._reintentar_en(clase))
+                        self._condicion.wait(restante)
+                finally:
+                    self.esperando[clase] -= 1
+                    # Al salir de la cola pueden pasar solicitudes de menor prioridad
+                    self._condicion.notify_all()
+            self.en_curso[clase] += 1
+        return time.monotonic()
+
+    def liberar(self, clase, inicio):
+        """
+        Libera el lugar de una solicitud admitida y actualiza la duración media de su clase.
+        :param inicio: El valor retornado por admitir().
+        """
+        with self._condicion:
+            self.en_curso[clase] -= 1
+            duracion = time.monotonic() - inicio
+            self._duracion_media[clase] += SUAVIZADO_DURACION * (duracion - self._duracion_media[clase])
+            self._condicion.notify_all()
+
+    def estado(self):
+        """Retorna las solicitudes en curso y en cola por clase."""
+        with self._condicion:
+            return {clase: {'en_curso': self.en_curso[clase], 'en_cola': self.esperando[clase],
+                            'limite': self.limites[clase], 'cola_maxima': self.colas[clase]}
+                    for clase in CLASES}
+
+
+def encabezado_retry_after(segundos):
+    """Valor del encabezado Retry-After: segundos enteros, al menos 1."""
+    return str(max(1, math.ceil(segundos)))
@@ -0,0 +1,261 @@
+"""
+Resúmenes aproximados (sketches) de las ventas para analítica sobre historiales enormes.
+
+Por cada día, y por cada producto y día, se guardan dos resúmenes combinables (merge):
+- HyperLogLog: estima los clientes distintos con un error estándar de ~3% en 1 KB como
+  máximo (los días con pocos clientes usan una representación dispersa mucho menor).
+- HistogramaCuantiles: estima los cuantiles de la cantidad por venta con un error relativo
+  acotado (ERROR_RELATIVO), agrupando los valores en cubetas de tamaño geométrico
+  (el esquema de DDSketch). Son unos pocos contadores por día.
+
+Una consulta sobre un rango combina los resúmenes de sus días: cuesta O(días), no O(ventas).
+"""
+import hashlib
+import math
+from datetime import date
+
+PRECISION_HLL = 10 # 2^10 = 1024 registros de un byte: error estándar 1.04/sqrt(1024) ~ 3.3%
+REGISTROS_HLL = 1 << PRECISION_HLL
+MAX_DISPERSO_HLL = REGISTROS_HLL // 64 # Registros usados a partir de los cuales se pasa a un arreglo denso
+ERROR_RELATIVO = 0.01 # Error relativo de los cuantiles estimados
+
+
+class HyperLogLog:
+    """
+    Estimador de cardinalidad (elementos distintos) combinable. Mientras tiene pocos
+    registros usados los guarda en un diccionario; después, en un bytearray de 1 KB.
+    """
+    __slots__ = ('_disperso', '_registros')
+
+    def __init__(self):
+        self._disperso = {}
+        self._registros = None
+
+    @staticmethod
+    def _hash(valor):
+        # Hash estable entre procesos (hash() de Python cambia en cada ejecución)
+        return int.from_bytes(hashlib.blake2b(str(valor).encode('utf-8'), digest_size=8).digest(), 'big')
+
+    def _fijar(self, indice, rango):
+        if self._registros is not None:
+            if rango > self._registros[indice]:
+                self._registros[indice] = rango
+            return
+        if rango > self._disperso.get(indice, 0):
+            self._disperso[indice] = rango
+            if len(self._disperso) > MAX_DISPERSO_HLL:
+                self._registros = bytearray(REGISTROS_HLL)
+                for i, r in self._disperso.items():
+                    self._registros[i] = r
+                self._disperso = None
+
+    def agregar(self, valor):
+        """Agrega un elemento (ej. el nombre de un cliente)."""
+        h = self._hash(valor)
+        resto = h & ((1 << (64 - PRECISION_HLL)) - 1)
+        self._fijar(h >> (64 - PRECISION_HLL), (64 - PRECISION_HLL) - resto.bit_length() + 1)
+
+    def combinar(self, otro):
+        """Combina otro HyperLogLog en este (unión de los conjuntos)."""
+        if otro._registros is None:
+            for indice, rango in otro._disperso.items():
+                self._fijar(indice, rango)
+        elif self._registros is None:
+            registros = bytearray(otro._registros)
+            for indice, rango in self._disperso.items():
+                if rango > registros[indice]:
+                    registros[indice] = rango
+            self._registros, self._disperso = registros, None
+        else:
+            self._registros = bytearray(map(max, self._registros, otro._registros))
+        return self
+
+    def registros(self):
+        """Retorna los registros usados como pares [índice, rango], para guardarlos en JSON."""
+        if self._registros is None:
+            return [[indice, rango] for indice, rango in sorted(self._disperso.items())]
+        return [[indice, rango] for indice, rango in enumerate(self._registros) if rango]
+
+    @classmethod
+    def desde_registros(cls, pares):
+        """Reconstruye un HyperLogLog a partir de registros()."""
+        hll = cls()
+        for indice, rango in pares:
+            hll._fijar(indice, rango)
+        return hll
+
+    def estimar(self):
+        """Retorna la cantidad estimada de elementos distintos."""
+        if self._registros is None:
+            valores = list(self._disperso.values())
+            vacios = REGISTROS_HLL - len(valores)
+        else:
+            valores = self._registros
+            vacios = valores.count(0)
+        suma = vacios + sum(2.0 ** -r for r in valores if r)
+        alfa = 0.7213 / (1 + 1.079 / REGISTROS_HLL)
+        estimacion = alfa * REGISTROS_HLL * REGISTROS_HLL / suma
+        if estimacion <= 2.5 * REGISTROS_HLL and vacios:
+            estimacion = REGISTROS_HLL * math.log(REGISTROS_HLL / vacios) # Corrección para cardinalidades bajas
+        return round(estimacion)
+
+
+class HistogramaCuantiles:
+    """
+    Histograma de cubetas geométricas para estimar cuantiles de valores positivos con error
+    relativo ERROR_RELATIVO. Se combina sumando cubetas y admite quitar valores.
+    """
+    __slots__ = ('cubetas', 'cantidad')
+    GAMMA = (1 + ERROR_RELATIVO) / (1 - ERROR_RELATIVO)
+    LOG_GAMMA = math.log(GAMMA)
+
+    def __init__(self):
+        self.cubetas = {}
+        self.cantidad = 0
+
+    @classmethod
+    def _cubeta(cls, valor):
+        return math.ceil(math.log(valor) / cls.LOG_GAMMA)
+
+    def agregar(self, valor, veces=1):
+        """Agrega (o quita, con veces=-1) un valor positivo."""
+        if valor <= 0:
+            return
+        cubeta = self._cubeta(valor)
+        total = self.cubetas.get(cubeta, 0) + veces
+        if total > 0:
+            self.cubetas[cubeta] = total
+        else:
+            self.cubetas.pop(cubeta, None)
+        self.cantidad = max(self.cantidad + veces, 0)
+
+    def combinar(self, otro):
+        """Combina otro histograma en este."""
+        for cubeta, total in otro.cubetas.items():
+            self.cubetas[cubeta] = self.cubetas.get(cubeta, 0) + total
+        self.cantidad += otro.cantidad
+        return self
+
+    def como_cubetas(self):
+        """Retorna las cubetas como pares [cubeta, cantidad], para guardarlas en JSON."""
+        return [[cubeta, total] for cubeta, total in sorted(self.cubetas.items())]
+
+    @classmethod
+    def desde_cubetas(cls, pares):
+        """Reconstruye un histograma a partir de como_cubetas()."""
+        histograma = cls()
+        for cubeta, total in pares:
+            histograma.cubetas[cubeta] = histograma.cubetas.get(cubeta, 0) + total
+            histograma.cantidad += total
+        return histograma
+
+    def cuantil(self, q):
+        """
+        Retorna el valor estimado del cuantil q (0 <= q <= 1), o None si no hay valores.
+        """
+        if not self.cantidad:
+            return None
+        rango = q * (self.cantidad - 1)
+        acumulado = 0
+        for cubeta in sorted(self.cubetas):
+            acumulado += self.cubetas[cubeta]
+            if acumulado > rango:
+                return 2 * self.GAMMA ** cubeta / (self.GAMMA + 1)
+        return 2 * self.GAMMA ** max(self.cubetas) / (self.GAMMA + 1)
+
+
+class ResumenesVentas:
+    """
+    Resúmenes aproximados de las ventas por día y por producto y día: clientes distintos
+    (HyperLogLog) y distribución de la cantidad por venta (HistogramaCuantiles).
+    """
+    def __init__(self):
+        self.por_dia = {} # dia -> (HyperLogLog, HistogramaCuantiles)
+        self.por_producto = {} # producto -> {dia: (HyperLogLog, HistogramaCuantiles)}
+
+    @staticmethod
+    def _dia(venta):
+        try:
+            return date.fromisoformat(venta.get('fecha')).toordinal()
+        except (TypeError, ValueError):
+            return None
+
+    def agregar(self, venta):
+        """Agrega una venta a los resúmenes de su día y de su producto."""
+        numero_dia = self._dia(venta)
+        cantidad = venta.get('cantidad')
+        if numero_dia is None or not isinstance(cantidad, int):
+            return
+        for resumenes in (self.por_dia, self.por_producto.setdefault(venta.get('producto'), {})):
+            hll, histograma = resumenes.get(numero_dia) or resumenes.setdefault(
+                numero_dia, (HyperLogLog(), HistogramaCuantiles()))
+            hll.agregar(venta.get('cliente'))
+            histograma.agregar(cantidad)
+
+    def agregar_resumen(self, fila):
+        """
+        Agrega una fila de resumen de ventas archivadas (ver archivo.py), que guarda los
+        resúmenes de su día y producto ya combinados.
+        """
+        numero_dia = self._dia(fila)
+        if numero_dia is None:
+            return
+        hll = HyperLogLog.desde_registros(fila.get('clientes', ()))
+        histograma = HistogramaCuantiles.desde_cubetas(fila.get('cubetas', ()))
+        for resumenes in (self.por_dia, self.por_producto.setdefault(fila.get('producto'), {})):
+            actual_hll, actual_histograma = resumenes.get(numero_dia) or resumenes.setdefault(
+                numero_dia, (HyperLogLog(), HistogramaCuantiles()))
+            actual_hll.combinar(hll)
+            actual_histograma.combinar(histograma)
+
+    def quitar(self, venta):
+        """
+        Quita una venta de la distribución de cantidades. Un HyperLogLog no admite quitar
+        elementos: el conteo de clientes distintos puede quedar levemente sobreestimado
+        hasta que se reconstruya el índice de ventas.
+        """
+        numero_dia = self._dia(venta)
+        cantidad = venta.get('cantidad')
+        if numero_dia is None or not isinstance(cantidad, int):
+            return
+        for resumenes in (self.por_dia, self.por_producto.get(venta.get('producto'), {})):
+            if numero_dia in resumenes:
+                resumenes[numero_dia][1].agregar(cantidad, -1)
+
+    def _resumenes(self, producto):
+        return self.por_dia if producto is None else self.por_producto.get(producto, {})
+
+    def _en_rango(self, producto, inicio, fin):
+        """Resúmenes de los días del rango (inicio y fin son números de día o None)."""
+        resumenes = self._resumenes(producto)
+        if inicio is not None and fin is not None and fin - inicio + 1 < len(resumenes):
+            # Rango corto: se consultan solo sus días
+            return [resumenes[d] for d in range(inicio, fin + 1) if d in resumenes]
+        return [r for d, r in resumenes.items()
+                if (inicio is None or d >= inicio) and (fin is None or d <= fin)]
+
+    def combinar_clientes(self, producto=None, inicio=None, fin=None):
+        """Retorna un HyperLogLog nuevo con los clientes de los días del rango (combinable con otros)."""
+        total = HyperLogLog()
+        for hll, _ in self._en_rango(producto, inicio, fin):
+            total.combinar(hll)
+        return total
+
+    def combinar_cantidades(self, producto=None, inicio=None, fin=None):
+        """Retorna un HistogramaCuantiles nuevo con las cantidades de los días del rango (combinable con otros)."""
+        total = HistogramaCuantiles()
+        for _, histograma in self._en_rango(producto, inicio, fin):
+            total.combinar(histograma)
+        return total
+
+    def clientes_unicos(self, producto=None, inicio=None, fin=None):
+        """Retorna la cantidad estimada de clientes distintos en el rango."""
+        return self.combinar_clientes(producto, inicio, fin).estimar()
+
+    def distribucion(self, cuantiles, producto=None, inicio=None, fin=None):
+        """
+        Retorna la cantidad de ventas y los cuantiles estimados de la cantidad por venta en el rango.
+        :param cuantiles: Lista de cuantiles a estimar (ej. [0.5, 0.9, 0.99]).
+        """
+        total = self.combinar_cantidades(producto, inicio, fin)
+        return total.cantidad, {q: total.cuantil(q) for q in cuantiles}
@@ -0,0 +1,49 @@
+"""
+Archiva las ventas antiguas de venta.json en el archivo frío (ver archivo.py).
+
+Las ventas con fecha anterior a hoy menos los días de retención se agregan al archivo
+comprimido del mes y se reemplazan por filas de resumen por día, producto y origen: las
+estadísticas las siguen incluyendo, pero venta.json (que se reescribe con cada venta)
+deja de crecer. También se puede configurar TIENDA_RETENCION_DIAS para que el servidor
+archive al iniciar, o usar POST /admin/archivar con el servidor en marcha.
+
+Usar con el servidor detenido (o sobre una copia de los datos):
+    python archivar.py --dias 365                     # carpeta dat/ del proyecto
+    python archivar.py --datos /ruta/dat --dias 365 --simular
+    python archivar.py --exportar 2023-01 > ventas-2023-01.ndjson
+"""
+import argparse
+import json
+import os
+import sys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Archiva las ventas antiguas en el archivo frío.')
+    parser.add_argument('--datos', help='Carpeta de datos (por defecto TIENDA_DATOS_DIR o dat/ del proyecto)')
+    parser.add_argument('--dias', type=int, help='Días de retención (por defecto TIENDA_RETENCION_DIAS)')
+    parser.add_argument('--simular', action='store_true', help='Solo informa cuántas ventas se archivarían')
+    parser.add_argument('--exportar', metavar='YYYY-MM', help='Escribe las ventas archivadas del mes como NDJSON')
+    args = parser.parse_args(argv)
+
+    if args.datos:
+        os.environ['TIENDA_DATOS_DIR'] = os.path.abspath(args.datos)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import backfinal # Después de fijar TIENDA_DATOS_DIR: el módulo lee la carpeta al importarse
+
+    if args.exportar:
+        for venta in backfinal.Venta.archivo.ventas_archivadas(args.exportar):
+            print(json.dumps(venta, ensure_ascii=False))
+        return 0
+
+    dias = args.dias or backfinal.RETENCION_DIAS
+    if dias <= 0:
+        parser.error('indique --dias o defina TIENDA_RETENCION_DIAS')
+    resumen = backfinal.Venta.archivar(dias, simular=args.simular)
+    backfinal.cerrar()
+    print(json.dumps(dict(resumen, simulado=args.simular), ensure_ascii=False))
+    return 1 if 'error' in resumen else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
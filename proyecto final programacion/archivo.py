@@ -0,0 +1,324 @@
+"""
+Archivo frío de las ventas antiguas y sus resúmenes diarios (almacenamiento por niveles).
+
+Las ventas anteriores a la ventana de retención casi solo se usan en reportes agregados,
+pero seguían completas en venta.json, que se reescribe con cada venta. La compactación
+(ver Venta.archivar en backfinal.py) las mueve a:
+- el archivo frío: un NDJSON comprimido con gzip por mes (ventas-YYYY-MM.ndjson.gz), al que
+  cada compactación agrega un miembro gzip sin reescribir lo anterior;
+- filas de resumen por día, producto y origen: unidades, número de ventas y los resúmenes
+  aproximados combinables de clientes distintos y de cantidades por venta (ver aproximados.py);
+- agregados de compra por cliente (ventas, unidades por producto y por origen, primera y
+  última compra), con los que el resumen de cada cliente sigue incluyendo sus ventas archivadas.
+
+Las filas de resumen y el resto del estado del archivo se guardan en un JSON que solo se
+reescribe al compactar, así venta.json solo guarda las ventas de la ventana de retención y
+las estadísticas combinan esas ventas con las filas de resumen.
+
+Una compactación interrumpida no pierde ventas ni las cuenta dos veces:
+1) se agregan las ventas al archivo frío;
+2) se guarda el estado con sus resúmenes y sus ids como 'pendientes' (un solo archivo,
+   escrito de forma atómica);
+3) se guarda venta.json sin esas ventas;
+4) se vacían los pendientes.
+Si se interrumpe antes de 2), el estado sigue siendo el anterior y lo agregado al archivo
+frío se descarta en la compactación siguiente (el estado guarda hasta qué byte es válido
+cada archivo). Si se interrumpe después, al cargar las ventas se quitan de venta.json las
+pendientes que hayan quedado (ver Venta.cargar_con_indice).
+"""
+import gzip
+import itertools
+import json
+import os
+import threading
+
+from aproximados import HyperLogLog, HistogramaCuantiles
+
+NIVEL_GZIP_ARCHIVO = 9 # El archivo frío se escribe al compactar y casi no se lee: se prioriza el tamaño
+
+
+def _clave(fila):
+    return (fila.get('fecha'), fila.get('producto'), fila.get('origen'))
+
+def resumir(ventas, filas=()):
+    """
+    Agrupa ventas en filas de resumen por (fecha, producto, origen), sumándolas a las filas
+    existentes de la misma clave. Las ventas sin cantidad entera se ignoran, como en las
+    estadísticas.
+    :param ventas: Ventas a resumir.
+    :param filas: Filas de resumen existentes (no se modifican).
+    :return: La lista de filas resultante, ordenada por fecha.
+    """
+    resultado = {_clave(fila): fila for fila in filas}
+    grupos = {}
+    for venta in ventas:
+        cantidad = venta.get('cantidad')
+        if not isinstance(cantidad, int):
+            continue
+        clave = _clave(venta)
+        grupo = grupos.get(clave)
+        if grupo is None:
+            anterior = resultado.get(clave)
+            if anterior is None:
+                grupo = [0, 0, HyperLogLog(), HistogramaCuantiles()]
+            else:
+                grupo = [anterior['cantidad'], anterior['ventas'], HyperLogLog.desde_registros(anterior['clientes']),
+                         HistogramaCuantiles.desde_cubetas(anterior['cubetas'])]
+            grupos[clave] = grupo
+        grupo[0] += cantidad
+        grupo[1] += 1
+        grupo[2].agregar(venta.get('cliente'))
+        grupo[3].agregar(cantidad)
+    for (fecha, producto, origen), (cantidad, numero, hll, histograma) in grupos.items():
+        resultado[(fecha, producto, origen)] = {
+            'fecha': fecha,
+            'producto': producto,
+            'origen': origen,
+            'cantidad': cantidad,
+            'ventas': numero,
+            'clientes': hll.registros(),
+            'cubetas': histograma.como_cubetas(),
+        }
+    return sorted(resultado.values(), key=lambda fila: tuple(str(valor) for valor in _clave(fila)))
+
+def resumir_clientes(ventas, clientes=None):
+    """
+    Acumula por cliente los agregados de compra de las ventas (los mismos que ResumenCliente
+    en backfinal.py), sumándolos a los existentes. Las ventas sin cantidad entera cuentan
+    como venta sin unidades, como en ResumenCliente.
+    :param ventas: Ventas a resumir.
+    :param clientes: Agregados existentes, cliente -> agregados (no se modifican).
+    :return: El diccionario cliente -> {'ventas', 'unidades', 'por_producto', 'por_origen',
+             'primera', 'ultima'} resultante.
+    """
+    resultado = dict(clientes or {})
+    copiados = set()
+    for venta in ventas:
+        cliente = venta.get('cliente')
+        if not isinstance(cliente, str):
+            continue
+        if cliente not in copiados:
+            anterior = resultado.get(cliente) or {'ventas': 0, 'unidades': 0, 'por_producto': {}, 'por_origen': {},
+                                                  'primera': None, 'ultima': None}
+            resultado[cliente] = dict(anterior, por_producto=dict(anterior['por_producto']),
+                                      por_origen=dict(anterior['por_origen']))
+            copiados.add(cliente)
+        agregados = resultado[cliente]
+        cantidad = venta.get('cantidad') if isinstance(venta.get('cantidad'), int) else 0
+        agregados['ventas'] += 1
+        agregados['unidades'] += cantidad
+        if cantidad > 0:
+            producto, origen = str(venta.get('producto')), venta.get('origen') or 'Desconocido'
+            agregados['por_producto'][producto] = agregados['por_producto'].get(producto, 0) + cantidad
+            agregados['por_origen'][origen] = agregados['por_origen'].get(origen, 0) + cantidad
+        fecha = venta.get('fecha')
+        if isinstance(fecha, str):
+            if agregados['primera'] is None or fecha < agregados['primera']:
+                agregados['primera'] = fecha
+            if agregados['ultima'] is None or fecha > agregados['ultima']:
+                agregados['ultima'] = fecha
+    return resultado
+
+
+class ArchivoVentas:
+    """
+    Archivo frío de ventas (un NDJSON con gzip por mes) y filas de resumen de las ventas
+    archivadas. El estado (filas de resumen, agregados por cliente, pendientes, siguiente
+    id y último ticket archivados, y bytes válidos de cada archivo mensual) es de solo
+    lectura: cada cambio publica uno nuevo.
+    """
+    def __init__(self, carpeta, ruta_estado, publicar=None):
+        """
+        :param carpeta: Carpeta de los archivos mensuales.
+        :param ruta_estado: Archivo JSON del estado.
+        :param publicar: Función estado -> None que se llama cada vez que cambia el estado
+                         vigente (ej. para incluirlo en las instantáneas de las solicitudes).
+        """
+        self.carpeta = carpeta
+        self.ruta_estado = ruta_estado
+        self.publicar = publicar
+        self._lock = threading.RLock()
+        self._estado = None
+
+    @staticmethod
+    def _estado_inicial():
+        return {'filas': [], 'clientes': {}, 'pendientes': [], 'siguiente_id': 1, 'ultimo_ticket': 0,
+                'archivadas': 0, 'bytes': {}}
+
+    def _leer(self):
+        try:
+            with open(self.ruta_estado, 'rb') as file:
+                guardado = json.loads(file.read())
+        except (FileNotFoundError, json.JSONDecodeError, UnicodeDecodeError):
+            return self._estado_inicial()
+        estado = dict(self._estado_inicial(), **guardado)
+        if 'clientes' not in guardado and estado['archivadas']:
+            # Estado de antes de los agregados por cliente: se calculan desde el archivo frío
+            # (quedan guardados en la compactación siguiente)
+            estado['clientes'] = resumir_clientes(itertools.chain.from_iterable(
+                self._leer_mes(mes, bytes_validos) for mes, bytes_validos in sorted(estado['bytes'].items())))
+        return estado
+
+    def _escribir(self, estado):
+        """Guarda el estado de forma atómica (archivo temporal con fsync y reemplazo). Retorna True si se guardó."""
+        contenido = json.dumps(estado, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        temporal = f"{self.ruta_estado}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.ruta_estado), exist_ok=True)
+            with open(temporal, 'wb') as file:
+                file.write(contenido)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporal, self.ruta_estado)
+        except OSError:
+            return False
+        return True
+
+    def _fijar(self, estado):
+        self._estado = estado
+        if self.publicar is not None:
+            self.publicar(estado)
+
+    def estado(self):
+        """Retorna el estado vigente (solo lectura), leyéndolo del disco la primera vez."""
+        if self._estado is None:
+            with self._lock:
+                if self._estado is None:
+                    self._fijar(self._leer())
+        return self._estado
+
+    def filas(self):
+        """Retorna las filas de resumen de las ventas archivadas (solo lectura)."""
+        return self.estado()['filas']
+
+    def clientes(self):
+        """Retorna los agregados de compra por cliente de las ventas archivadas (solo lectura)."""
+        return self.estado()['clientes']
+
+    def pendientes(self):
+        """Retorna los ids de las ventas archivadas que quizás sigan en venta.json (ver docstring del módulo)."""
+        return set(self.estado()['pendientes'])
+
+    def siguiente_id(self):
+        """Retorna el id siguiente al mayor id archivado: los ids archivados no se reutilizan."""
+        return self.estado()['siguiente_id']
+
+    def ultimo_ticket(self):
+        """Retorna el mayor número de ticket archivado."""
+        return self.estado()['ultimo_ticket']
+
+    def _ruta_mes(self, mes):
+        return os.path.join(self.carpeta, f'ventas-{mes}.ndjson.gz')
+
+    def _agregar_al_mes(self, mes, bytes_validos, ventas):
+        """
+        Agrega las ventas al archivo del mes como un miembro gzip nuevo, descartando antes lo
+        escrito después de 'bytes_validos' (una compactación interrumpida).
+        :return: Los bytes válidos del archivo después de agregar.
+        """
+        contenido = gzip.compress(b''.join(json.dumps(venta, ensure_ascii=False).encode('utf-8') + b'\n'
+                                           for venta in ventas), compresslevel=NIVEL_GZIP_ARCHIVO)
+        ruta = self._ruta_mes(mes)
+        with open(ruta, 'r+b' if os.path.exists(ruta) else 'wb') as file:
+            file.truncate(bytes_validos)
+            file.seek(bytes_validos)
+            file.write(contenido)
+            file.flush()
+            os.fsync(file.fileno())
+        return bytes_validos + len(contenido)
+
+    def _descartar(self, bytes_validos, meses):
+        """Recorta los archivos de los meses indicados a sus bytes válidos (borra los que quedan vacíos)."""
+        for mes in meses:
+            ruta = self._ruta_mes(mes)
+            try:
+                if bytes_validos.get(mes):
+                    with open(ruta, 'r+b') as file:
+                        file.truncate(bytes_validos[mes])
+                elif os.path.exists(ruta):
+                    os.remove(ruta)
+            except OSError:
+                pass # Se vuelve a recortar en la compactación siguiente
+
+    def preparar(self, ventas):
+        """
+        Pasos 1 y 2 de la compactación (ver docstring del módulo): agrega las ventas al archivo
+        frío y guarda el estado nuevo con sus resúmenes y sus ids como pendientes. El estado
+        nuevo no pasa a ser el vigente hasta confirmar() (después de guardar venta.json).
+        :param ventas: Ventas a archivar (con 'fecha' YYYY-MM-DD válida).
+        :return: El estado nuevo, o None si no se pudo escribir (el archivo queda como estaba).
+        """
+        with self._lock:
+            anterior = self.estado()
+            por_mes = {}
+            for venta in ventas:
+                por_mes.setdefault(venta['fecha'][:7], []).append(venta)
+            bytes_validos = dict(anterior['bytes'])
+            try:
+                os.makedirs(self.carpeta, exist_ok=True)
+                for mes, del_mes in sorted(por_mes.items()):
+                    bytes_validos[mes] = self._agregar_al_mes(mes, anterior['bytes'].get(mes, 0), del_mes)
+            except OSError:
+                self._descartar(anterior['bytes'], por_mes)
+                return None
+            ids = [venta['id'] for venta in ventas if isinstance(venta.get('id'), int)]
+            tickets = [venta['ticket'] for venta in ventas if isinstance(venta.get('ticket'), int)]
+            estado = {
+                'filas': resumir(ventas, anterior['filas']),
+                'clientes': resumir_clientes(ventas, anterior['clientes']),
+                'pendientes': sorted(ids),
+                'siguiente_id': max([anterior['siguiente_id']] + [id_venta + 1 for id_venta in ids]),
+                'ultimo_ticket': max([anterior['ultimo_ticket']] + tickets),
+                'archivadas': anterior['archivadas'] + len(ventas),
+                'bytes': bytes_validos,
+            }
+            if not self._escribir(estado):
+                self._descartar(anterior['bytes'], por_mes)
+                return None
+            return estado
+
+    def confirmar(self, estado):
+        """Hace vigente el estado de preparar() (paso 3 hecho: venta.json ya no tiene esas ventas)."""
+        with self._lock:
+            self._fijar(estado)
+
+    def restaurar(self, anterior):
+        """Deshace un preparar() cuyo venta.json no se pudo guardar: vuelve al estado anterior."""
+        with self._lock:
+            nuevo = self._leer()
+            self._escribir(anterior)
+            self._descartar(anterior['bytes'], set(nuevo['bytes']) | set(anterior['bytes']))
+            self._fijar(anterior)
+
+    def limpiar_pendientes(self):
+        """Paso 4: vacía los pendientes del estado vigente. Retorna True si se guardó."""
+        with self._lock:
+            estado = self.estado()
+            if not estado['pendientes']:
+                return True
+            estado = dict(estado, pendientes=[])
+            if not self._escribir(estado):
+                return False
+            self._fijar(estado)
+            return True
+
+    def meses(self):
+        """Retorna los meses ('YYYY-MM') con ventas archivadas."""
+        return sorted(self.estado()['bytes'])
+
+    def ventas_archivadas(self, mes):
+        """
+        Lee las ventas archivadas de un mes (solo la parte válida del archivo).
+        :param mes: Mes 'YYYY-MM'.
+        :return: Un generador de ventas.
+        """
+        return self._leer_mes(mes, self.estado()['bytes'].get(mes))
+
+    def _leer_mes(self, mes, bytes_validos):
+        if not bytes_validos:
+            return
+        with open(self._ruta_mes(mes), 'rb') as file:
+            contenido = gzip.decompress(file.read(bytes_validos))
+        for linea in contenido.splitlines():
+            if linea.strip():
+                yield json.loads(linea)
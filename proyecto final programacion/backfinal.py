@@ -1,32 +1,290 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, has_request_context
+from flask.json.provider import DefaultJSONProvider
 import json
 import os
-from datetime import datetime
+import heapq
+import bisect
+import collections
+import itertools
+import logging
+import threading
+import time
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+import gzip
+import csv
 from flask_cors import CORS
 
+import metricas
+from inventario import LibroInventario
+from busqueda import IndiceNombres
+from series import SeriesVentas, dia
+from aproximados import ResumenesVentas, ERROR_RELATIVO, REGISTROS_HLL
+from archivo import ArchivoVentas
+from perfilado import Perfilador, token_admin_valido
+from admision import ControlAdmision, Rechazo, encabezado_retry_after
+
+# Codificadores opcionales: si están instalados se usan automáticamente
+try:
+    import orjson # JSON mucho más rápido que el módulo estándar
+except ImportError:
+    orjson = None
+try:
+    import brotli # Compresión 'br' de respuestas
+except ImportError:
+    brotli = None
+
+
+# --- SERIALIZACIÓN JSON ---
+def json_a_bytes(datos, legible=False, default=None):
+    """
+    Serializa datos a JSON en UTF-8 usando orjson si está disponible (o json estándar si no).
+    :param datos: Los datos a serializar.
+    :param legible: Si es True, genera JSON indentado; si no, compacto.
+    :param default: Función para serializar tipos no soportados. Opcional.
+    :return: Los bytes del JSON.
+    """
+    if orjson is not None:
+        return orjson.dumps(datos, default=default, option=orjson.OPT_INDENT_2 if legible else 0)
+    if legible:
+        return json.dumps(datos, indent=4, ensure_ascii=False, default=default).encode('utf-8')
+    return json.dumps(datos, separators=(',', ':'), ensure_ascii=False, default=default).encode('utf-8')
+
+def json_desde_bytes(contenido):
+    """
+    Deserializa JSON (bytes o str) usando orjson si está disponible.
+    Lanza json.JSONDecodeError (orjson.JSONDecodeError es una subclase) si el contenido no es válido.
+    """
+    if orjson is not None:
+        return orjson.loads(contenido)
+    return json.loads(contenido)
+
+
+class ProveedorJson(DefaultJSONProvider):
+    """
+    Proveedor JSON de Flask basado en json_a_bytes/json_desde_bytes (orjson si está
+    disponible). Genera respuestas compactas, conserva el orden de las claves (ej. el
+    top-N de más vendidos) y mide el tiempo de serialización para separarlo del tiempo
+    de cómputo en las métricas.
+    """
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        inicio = time.perf_counter()
+        if kwargs:
+            texto = super().dumps(obj, **kwargs)
+        else:
+            texto = json_a_bytes(obj, default=self.default).decode('utf-8')
+        metricas.sumar_fase('serializacion', time.perf_counter() - inicio)
+        return texto
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return json_desde_bytes(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        inicio = time.perf_counter()
+        cuerpo = json_a_bytes(obj, default=self.default)
+        metricas.sumar_fase('serializacion', time.perf_counter() - inicio)
+        return self._app.response_class(cuerpo, mimetype=self.mimetype)
+
+
 # Inicializa la aplicación Flask
 app = Flask(__name__)
+app.json = ProveedorJson(app)
 CORS(app)
 
 # Define la ruta base del proyecto para asegurar que los archivos JSON se encuentren
 RUTA_BASE = os.path.dirname(os.path.abspath(__file__))
 
-# Define las rutas completas a los archivos JSON dentro de la carpeta 'dat'.
-PRODUCTOS_FILE = os.path.join(RUTA_BASE, 'dat', 'product.json')
-PERSONAS_FILE = os.path.join(RUTA_BASE, 'dat', 'person.json')
-VENTAS_FILE = os.path.join(RUTA_BASE, 'dat', 'venta.json')
+# Carpeta de datos: por defecto 'dat' junto a este archivo; la variable de entorno
+# TIENDA_DATOS_DIR permite apuntar a otra carpeta (ej. datos sintéticos de benchmarks).
+DATOS_DIR = os.environ.get('TIENDA_DATOS_DIR') or os.path.join(RUTA_BASE, 'dat')
+
+# Define las rutas completas a los archivos JSON dentro de la carpeta de datos.
+PRODUCTOS_FILE = os.path.join(DATOS_DIR, 'product.json')
+PERSONAS_FILE = os.path.join(DATOS_DIR, 'person.json')
+VENTAS_FILE = os.path.join(DATOS_DIR, 'venta.json')
+
+# Libro de movimientos de inventario (ver inventario.py): el stock actual sale de aquí,
+# no del campo 'stock' de product.json, que solo se actualiza al editar los productos.
+MOVIMIENTOS_FILE = os.path.join(DATOS_DIR, 'movimientos_inventario.ndjson')
+SNAPSHOT_STOCK_FILE = os.path.join(DATOS_DIR, 'stock_snapshot.json')
+MOVIMIENTOS_POR_SNAPSHOT = int(os.environ.get('TIENDA_MOVIMIENTOS_POR_SNAPSHOT', '1000'))
+# Umbral de reposición por defecto, para los productos sin 'stock_minimo' propio
+UMBRAL_BAJO_STOCK = int(os.environ.get('TIENDA_UMBRAL_BAJO_STOCK', '5'))
+
+# Archivo frío de ventas antiguas (ver archivo.py): las ventas de más de TIENDA_RETENCION_DIAS
+# días se mueven al archivo al iniciar el servidor o con POST /admin/archivar (0 = no se archiva)
+ARCHIVO_VENTAS_DIR = os.path.join(DATOS_DIR, 'archivo')
+ESTADO_ARCHIVO_FILE = os.path.join(DATOS_DIR, 'venta_archivo.json')
+RETENCION_DIAS = int(os.environ.get('TIENDA_RETENCION_DIAS', '0'))
+# Las rutas de administración (/admin/...) requieren TIENDA_TOKEN_ADMIN y el encabezado
+# 'X-Tienda-Admin' con ese token (ver perfilado.token_admin_valido): sin token configurado
+# quedan deshabilitadas
+TOKEN_ADMIN = os.environ.get('TIENDA_TOKEN_ADMIN') or None
+
+# Importación masiva: filas aplicadas por cada escritura (commit) y errores detallados en el reporte
+TAMANO_LOTE_IMPORTACION = int(os.environ.get('TIENDA_LOTE_IMPORTACION', '50000'))
+MAX_ERRORES_REPORTADOS = 1000
+
+# Formato de los archivos de datos: compacto por defecto; TIENDA_JSON_LEGIBLE=1 los indenta
+JSON_LEGIBLE = os.environ.get('TIENDA_JSON_LEGIBLE') == '1'
+
+# Escritura agrupada (group commit), opcional: las escrituras de un mismo archivo que llegan
+# dentro de la ventana (o hasta completar el máximo de pendientes) se guardan juntas en una
+# sola escritura; cada solicitud responde recién cuando su lote quedó en disco.
+GRUPO_COMMIT = os.environ.get('TIENDA_GRUPO_COMMIT') == '1'
+GRUPO_COMMIT_VENTANA_S = float(os.environ.get('TIENDA_GRUPO_COMMIT_MS', '5')) / 1000
+GRUPO_COMMIT_MAX_PENDIENTES = int(os.environ.get('TIENDA_GRUPO_COMMIT_MAX', '64'))
+GRUPO_COMMIT_TIMEOUT_S = 30 # Espera máxima de una solicitud por su lote
+
+# Compresión de respuestas: solo por encima de este tamaño (0 = desactivada)
+COMPRESION_MIN_BYTES = int(os.environ.get('TIENDA_COMPRESION_MIN_BYTES', '1024'))
+NIVEL_GZIP = 5 # Compromiso entre CPU y tamaño
+
+# Perfilado bajo demanda y registro de solicitudes lentas (configurable por entorno, ver perfilado.py)
+perfilador = Perfilador.desde_entorno(RUTA_BASE)
+
+# Control de admisión por clase de prioridad y límite por cliente (configurable por entorno, ver admision.py)
+control_admision = ControlAdmision.desde_entorno()
+RUTAS_SIN_ADMISION = {'/metrics'} # Monitoreo: nunca se rechaza
+RUTAS_LISTAS_COMPLETAS = {'/productos', '/personas', '/ventas'} # Sus GET se tratan como reportes
+
+# Máximo de líneas (productos distintos o repetidos) que acepta un ticket
+MAX_LINEAS_TICKET = 500
+
+# Nombre de la categoría que agrupa a los productos fuera del top-N en las estadísticas
+ETIQUETA_OTROS = 'Otros'
+
+# Comparación de periodos (/estadisticas/comparar)
+MAX_DIAS_COMPARAR = 3660 # Días máximos de cada rango (la respuesta incluye un punto por día)
+VENTANA_MEDIA_MOVIL = 7
+
+# Sugerencias del autocompletado (/productos/sugerir y /personas/sugerir)
+LIMITE_SUGERENCIAS = 10
+MAX_SUGERENCIAS = 50
+
+# Tiendas (sucursales), ver Tienda: la principal usa DATOS_DIR; TIENDA_SUCURSALES agrega otras,
+# como 'norte,sur=/ruta/datos_sur' (sin carpeta se usa DATOS_DIR/tiendas/<nombre>)
+TIENDA_PRINCIPAL = os.environ.get('TIENDA_NOMBRE', 'principal')
+TIENDA_SUCURSALES = os.environ.get('TIENDA_SUCURSALES', '')
+TODAS_LAS_TIENDAS = 'todas' # Nombre reservado: las estadísticas se calculan en todas las tiendas
+# Hilos que calculan en paralelo los agregados parciales de cada tienda
+HILOS_AGREGACION = int(os.environ.get('TIENDA_HILOS_AGREGACION', '4'))
 
 
 # --- UTILIDADES DE ARCHIVO JSON ---
+class LoteEscritura:
+    """Grupo de escrituras de un archivo que se guardan juntas (ver JsonStorage.guardar)."""
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.escrituras = 0
+        self.exito = None
+        self.terminado = threading.Event()
+
+    def esperar(self, timeout=None):
+        """Espera a que el lote quede en disco. Retorna True si se guardó correctamente."""
+        return self.terminado.wait(timeout) and bool(self.exito)
+
+
+class SincronizacionInventario:
+    """Espera de fsync del libro de inventario, con la misma interfaz que LoteEscritura."""
+    def __init__(self, libro, posicion):
+        self.libro = libro
+        self.posicion = posicion
+
+    def esperar(self, timeout=None):
+        return self.libro.sincronizar(self.posicion)
+
+
 class JsonStorage:
     """
     Clase de utilidad para cargar y guardar datos en archivos JSON.
     Gestiona la existencia del archivo y el manejo de errores básicos.
+
+    Los datos se leen del archivo una sola vez y se mantienen en memoria como versiones
+    publicadas (copy-on-write): cada escritura publica una lista nueva y nunca modifica una
+    ya publicada. Así un lector puede fijar una instantánea (ver instantanea()) y recorrerla
+    sin locks mientras otras solicitudes siguen escribiendo.
     """
-    def __init__(self, filepath):
+    # Versiones publicadas de todos los almacenamientos: {ruta_del_archivo: lista}. Nunca se
+    # modifica en el lugar: cada publicación reemplaza el diccionario completo, así una
+    # instantánea tomada por un lector es consistente entre productos, personas y ventas.
+    _publicadas = {}
+    _lock_publicacion = threading.Lock()
+
+    def __init__(self, filepath, agrupar=None):
         self.filepath = filepath
+        self._lock_escritura = threading.Lock() # Serializa las escrituras de este archivo
+        self.version = 0 # Aumenta con cada escritura exitosa (invalida los índices en memoria)
+        self.agrupar = GRUPO_COMMIT if agrupar is None else agrupar
+        # Estado de la escritura agrupada: la última versión pendiente de escribir y su lote
+        self._condicion = threading.Condition()
+        self._pendiente = None
+        self._lote = None
+        self._escribiendo = False
+        self._hilo = None
+        self._guardada = None # Última versión escrita en disco: a ella se vuelve si falla un lote
+        self._generacion = 0 # Aumenta cada vez que se descartan versiones por un lote fallido
+        self._local = threading.local() # Por hilo: generación leída en cargar() y versión publicada
+        if hasattr(os, 'register_at_fork'): # No existe en Windows (donde no hay fork)
+            os.register_at_fork(after_in_child=self._reiniciar_escritor)
+
+    def _reiniciar_escritor(self):
+        """
+        Se ejecuta en el proceso hijo después de un fork (ej. gunicorn con preload_app crea
+        los workers después de precargar, que puede haber guardado). El hilo de escritura
+        agrupada no existe en el hijo y sus locks pueden haber quedado tomados: se descarta
+        ese estado y el siguiente guardar() inicia un hilo propio. Lo pendiente del padre
+        lo escribe el padre.
+        """
+        self._lock_escritura = threading.Lock()
+        self._condicion = threading.Condition()
+        self._pendiente = None
+        self._lote = None
+        self._escribiendo = False
+        self._hilo = None
+        self._local = threading.local()
+
+    @classmethod
+    def instantanea(cls):
+        """
+        Retorna la versión publicada actual de todos los almacenamientos. Es de solo lectura
+        y no cambia aunque haya escrituras posteriores (ver fijar_instantanea).
+        """
+        return cls._publicadas
+
+    @classmethod
+    def publicar(cls, clave, datos):
+        """
+        Publica una versión nueva de unos datos con la clave dada. Además de los archivos
+        JSON, lo usan otros almacenamientos (ej. el archivo de ventas, ver archivo.py) para
+        que sus datos entren en la misma instantánea.
+        """
+        with cls._lock_publicacion:
+            publicadas = dict(cls._publicadas)
+            publicadas[clave] = datos
+            cls._publicadas = publicadas
+
+    @classmethod
+    def leer_publicado(cls, clave):
+        """
+        Retorna los datos publicados con la clave dada en la instantánea de la solicitud (o la
+        última versión fuera de una solicitud), o None si no se publicaron.
+        """
+        instantanea = g.get('instantanea') if has_request_context() else None
+        if instantanea is not None and clave in instantanea:
+            return instantanea[clave]
+        return cls._publicadas.get(clave)
+
+    def _publicar(self, datos):
+        JsonStorage.publicar(self.filepath, datos)
 
-    def cargar(self):
+    def _leer_archivo(self):
         """
         Carga los datos de un archivo JSON.
         Retorna una lista vacía si el archivo no existe o está vacío/corrupto,
@@ -34,26 +292,193 @@ class JsonStorage:
         """
         if not os.path.exists(self.filepath):
             return []
+        inicio = time.perf_counter()
         try:
-            with open(self.filepath, 'r', encoding='utf-8') as file:
-                return json.load(file)
-        except (FileNotFoundError, json.JSONDecodeError):
+            with open(self.filepath, 'rb') as file:
+                contenido = file.read()
+            datos = json_desde_bytes(contenido)
+        except (FileNotFoundError, json.JSONDecodeError, UnicodeDecodeError):
             return []
+        num_bytes = len(contenido)
+        metricas.registrar_almacenamiento('cargar', os.path.basename(self.filepath),
+                                          time.perf_counter() - inicio, num_bytes)
+        return datos
+
+    def _actual(self):
+        """Retorna la última versión publicada, leyendo el archivo la primera vez."""
+        datos = JsonStorage._publicadas.get(self.filepath)
+        if datos is None:
+            with self._lock_escritura:
+                datos = JsonStorage._publicadas.get(self.filepath)
+                if datos is None:
+                    datos = self._leer_archivo()
+                    self._guardada = datos
+                    self._publicar(datos)
+        return datos
+
+    def leer(self):
+        """
+        Retorna los datos para solo lectura, sin copiarlos: no se deben modificar.
+        Dentro de una solicitud se usa la instantánea fijada al inicio de la solicitud,
+        así todas las lecturas de esa solicitud ven la misma versión de cada archivo.
+        """
+        instantanea = g.get('instantanea') if has_request_context() else None
+        if instantanea is not None:
+            datos = instantanea.get(self.filepath)
+            if datos is not None:
+                return datos
+        return self._actual()
+
+    def cargar(self, copiar_registros=True):
+        """
+        Retorna una copia modificable de la última versión de los datos (para escribir).
+        La lista y sus registros son nuevos: modificarlos no afecta a los lectores.
+        :param copiar_registros: Si es False solo se copia la lista (mucho más barato): los
+                                 registros existentes se deben reemplazar, no modificar.
+        """
+        self._local.generacion = self._generacion # Ver _encolar
+        if not copiar_registros:
+            return list(self._actual())
+        return [dict(registro) if isinstance(registro, dict) else registro for registro in self._actual()]
 
-    def guardar(self, datos):
+    def _escribir(self, datos):
         """
-        Guarda los datos en un archivo JSON.
-        Crea el directorio si no existe.
-        Retorna True si la operación fue exitosa, False en caso de error de E/S.
-        :param datos: Los datos (generalmente una lista de diccionarios) a guardar.
+        Escribe los datos en el archivo de forma atómica: se escribe un archivo temporal
+        (con fsync) y luego se reemplaza el original, así un lector concurrente nunca ve
+        un archivo a medio escribir. Retorna True si la operación fue exitosa.
         """
+        inicio = time.perf_counter()
+        temporal = f"{self.filepath}.tmp"
+        contenido = json_a_bytes(datos, legible=JSON_LEGIBLE)
         try:
-            os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
-            with open(self.filepath, 'w', encoding='utf-8') as file:
-                json.dump(datos, file, indent=4, ensure_ascii=False)
-            return True
+            with self._lock_escritura:
+                os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
+                with open(temporal, 'wb') as file:
+                    file.write(contenido)
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(temporal, self.filepath)
         except IOError:
             return False
+        metricas.registrar_almacenamiento('guardar', os.path.basename(self.filepath),
+                                          time.perf_counter() - inicio, len(contenido))
+        return True
+
+    def guardar(self, datos, esperar=False):
+        """
+        Guarda los datos en un archivo JSON (compacto, o indentado si TIENDA_JSON_LEGIBLE=1).
+        Crea el directorio si no existe y escribe de forma atómica (ver _escribir). Los datos
+        se publican como nueva versión en memoria: los registros pasan a ser de solo lectura
+        y no se deben modificar después de guardarlos.
+
+        Con escritura agrupada (TIENDA_GRUPO_COMMIT=1) la versión se publica al instante y se
+        escribe junto con las demás que lleguen dentro de la ventana: dentro de una solicitud,
+        la respuesta espera a que el lote esté en disco (ver esperar_lotes_pendientes); fuera
+        de una solicitud, se espera aquí mismo. Si el lote falla, se vuelve a la última versión
+        guardada (ver _escritor): una escritura que respondió error nunca queda en memoria.
+        Retorna True si la operación fue exitosa, False en caso de error de E/S.
+        :param datos: Los datos (generalmente una lista de diccionarios) a guardar.
+        :param esperar: Si es True, con escritura agrupada se espera aquí (sin timeout) a que
+                        el lote esté en disco también dentro de una solicitud, para quien
+                        necesita el resultado antes de seguir (ver Venta.archivar).
+        """
+        if self.agrupar:
+            lote = self._encolar(list(datos))
+            if esperar:
+                return lote.esperar()
+            if has_request_context():
+                g.setdefault('lotes_pendientes', []).append(lote)
+                return True
+            return lote.esperar(GRUPO_COMMIT_TIMEOUT_S)
+
+        with self._condicion:
+            if not self._escribir(datos):
+                return False
+            self._guardada = list(datos)
+            self._publicar(self._guardada)
+            self.version += 1
+            self._local.version = self.version
+        return True
+
+    def version_propia(self):
+        """Retorna la versión publicada por el último guardar() de este hilo (ver Venta._confirmar_indice)."""
+        return getattr(self._local, 'version', None)
+
+    def _encolar(self, datos):
+        """Publica una versión y la deja pendiente de escribir en el lote abierto."""
+        with self._condicion:
+            if getattr(self._local, 'generacion', self._generacion) != self._generacion:
+                # Se armó sobre una versión que se descartó por un lote fallido: también falla
+                lote = LoteEscritura()
+                lote.exito = False
+                lote.terminado.set()
+                return lote
+            self._publicar(datos)
+            self.version += 1
+            self._local.version = self.version
+            self._pendiente = datos # Cada versión incluye a las anteriores: basta escribir la última
+            if self._lote is None:
+                self._lote = LoteEscritura()
+            lote = self._lote
+            lote.escrituras += 1
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._escritor, name=f'escritor-{os.path.basename(self.filepath)}',
+                                              daemon=True)
+                self._hilo.start()
+            self._condicion.notify_all()
+        return lote
+
+    def _escritor(self):
+        """Hilo de escritura agrupada: junta las versiones de la ventana y las escribe una vez."""
+        while True:
+            with self._condicion:
+                while self._pendiente is None:
+                    self._condicion.wait()
+                lote = self._lote
+                limite = lote.inicio + GRUPO_COMMIT_VENTANA_S
+                while lote.escrituras < GRUPO_COMMIT_MAX_PENDIENTES and time.perf_counter() < limite:
+                    self._condicion.wait(limite - time.perf_counter())
+                datos, self._pendiente, self._lote = self._pendiente, None, None
+                self._escribiendo = True
+            # La serialización y el fsync ocurren fuera de la condición: mientras tanto
+            # se sigue armando el lote siguiente
+            exito = self._escribir(datos)
+            metricas.registrar_lote(os.path.basename(self.filepath), lote.escrituras, exito)
+            with self._condicion:
+                self._escribiendo = False
+                if exito:
+                    self._guardada = datos
+                else:
+                    self._descartar_versiones()
+                lote.exito = exito
+                lote.terminado.set()
+                self._condicion.notify_all()
+
+    def _descartar_versiones(self):
+        """
+        Tras un lote fallido (llamar con la condición tomada): descarta las versiones no
+        guardadas, incluidas las del lote siguiente, que se armaron sobre ellas, y vuelve a
+        publicar la última versión guardada. Sus solicitudes responden 500 y revierten sus
+        movimientos de inventario (ver esperar_lotes_pendientes), así un cliente que reintenta
+        no duplica la venta. Las escrituras armadas antes de descartar también fallan (ver
+        _encolar).
+        """
+        self._generacion += 1
+        if self._pendiente is not None:
+            siguiente, self._pendiente, self._lote = self._lote, None, None
+            metricas.registrar_lote(os.path.basename(self.filepath), siguiente.escrituras, False)
+            siguiente.exito = False
+            siguiente.terminado.set()
+        self._publicar(self._guardada if self._guardada is not None else self._leer_archivo())
+        self.version += 1
+
+    def esperar_escrituras(self):
+        """Espera a que terminen las escrituras en curso y pendientes de este archivo."""
+        with self._condicion:
+            while self._pendiente is not None or self._escribiendo:
+                self._condicion.wait()
+        with self._lock_escritura:
+            pass
 
 
 # --- MODELOS DE DATOS ---
@@ -62,15 +487,103 @@ class Producto:
     """
     Clase que representa y gestiona las operaciones CRUD (Crear, Leer, Actualizar, Eliminar)
     para los productos. Interactúa con el almacenamiento JSON a través de JsonStorage.
+    El stock actual de cada producto lo lleva el libro de inventario.
     """
     storage = JsonStorage(PRODUCTOS_FILE)
+    inventario = LibroInventario(MOVIMIENTOS_FILE, SNAPSHOT_STOCK_FILE, MOVIMIENTOS_POR_SNAPSHOT,
+                                 umbral_bajo_stock=UMBRAL_BAJO_STOCK)
+    _mapa = None # (lista_publicada, {nombre: producto}) de por_nombre()
+    ventas = None # Modelo de ventas de la misma tienda (se asigna después de definir Venta)
+
+    @classmethod
+    def libro(cls):
+        """
+        Retorna el libro de inventario, abriéndolo la primera vez. Si aún no tiene
+        movimientos, toma como stock inicial el de product.json. Al abrirlo se cargan en
+        el índice de bajo stock el catálogo vigente y los umbrales ('stock_minimo').
+        """
+        if not cls.inventario.abierto:
+            cls.inventario.abrir(lambda: {p.get('nombre'): p.get('stock') for p in cls.storage.cargar()})
+            cls.inventario.bajo_stock.configurar({p.get('nombre'): p.get('stock_minimo') for p in cls.storage.leer()})
+        return cls.inventario
+
+    @classmethod
+    def registrar_movimientos(cls, movimientos):
+        """
+        Registra movimientos en el libro de inventario. Con escritura agrupada y dentro de una
+        solicitud, el fsync se difiere hasta antes de responder (ver esperar_lotes_pendientes),
+        así las ventas concurrentes comparten un mismo fsync.
+        :param movimientos: Lista de (tipo, producto, delta, referencia).
+        :return: La lista de movimientos registrados, o None si no se pudo escribir.
+        """
+        libro = cls.libro()
+        diferir = GRUPO_COMMIT and has_request_context()
+        registrados = libro.registrar(movimientos, sincronizar=not diferir)
+        if registrados and diferir:
+            g.setdefault('lotes_pendientes', []).append(SincronizacionInventario(libro, libro.posicion()))
+            # Si falla el lote de la escritura que acompaña a estos movimientos, se revierten
+            g.setdefault('movimientos_diferidos', []).append((cls, movimientos))
+        return registrados
+
+    @classmethod
+    def revertir_movimientos(cls, movimientos):
+        """
+        Registra los movimientos inversos de los dados, como ajustes (ej. los de una solicitud
+        cuyo lote de escritura agrupada falló). Llamar sin lock_inventario tomado.
+        :param movimientos: Lista de (tipo, producto, delta, referencia) ya registrados.
+        :return: La lista de movimientos registrados, o None si no se pudo escribir.
+        """
+        inversos = [('ajuste', producto, -delta, ' '.join(str(dato) for dato in ('no registrado:', tipo, referencia)
+                                                           if dato is not None))
+                    for tipo, producto, delta, referencia in movimientos if delta]
+        if not inversos:
+            return []
+        with cls.ventas.lock_inventario:
+            return cls.libro().registrar(inversos)
 
     @classmethod
     def todos(cls):
         """
-        Retorna una lista de todos los productos almacenados.
+        Retorna una lista de todos los productos almacenados, con su stock actual.
+        Los diccionarios son copias: se pueden modificar.
         """
-        return cls.storage.cargar()
+        libro = cls.libro()
+        return [cls._con_stock(p, libro) for p in cls.storage.leer()]
+
+    @classmethod
+    def _cargar_con_stock(cls):
+        """
+        Retorna una copia modificable de la última versión de los productos (no la de la
+        instantánea de la solicitud), con su stock actual, para guardarla modificada.
+        Se usa dentro de lock_inventario: así ninguna escritura concurrente se pierde.
+        """
+        libro = cls.libro()
+        return [cls._con_stock(p, libro) for p in cls.storage.cargar(copiar_registros=False)]
+
+    @staticmethod
+    def _con_stock(producto, libro):
+        """Retorna una copia del producto con el stock actual del libro de inventario."""
+        copia = dict(producto)
+        stock = libro.stock(copia.get('nombre'))
+        if stock is not None:
+            copia['stock'] = stock
+        return copia
+
+    @classmethod
+    def por_nombre(cls):
+        """
+        Retorna un mapa nombre -> producto (solo lectura, sin el stock del libro de inventario)
+        de la versión de product.json que ve la solicitud. El mapa se construye una vez por
+        versión publicada del archivo y se reutiliza hasta la siguiente escritura.
+        """
+        productos = cls.storage.leer()
+        vigente = cls._mapa
+        if vigente is None or vigente[0] is not productos:
+            # Cada escritura publica una lista nueva: la identidad de la lista es su versión
+            # (en reversa: si un nombre se repite, gana el primero, como en una búsqueda lineal)
+            vigente = (productos, {p.get('nombre'): p for p in reversed(productos)})
+            cls._mapa = vigente
+        return vigente[1]
 
     @classmethod
     def buscar(cls, nombre):
@@ -79,7 +592,38 @@ class Producto:
         :param nombre: El nombre del producto a buscar.
         :return: El diccionario del producto si se encuentra, de lo contrario None.
         """
-        return next((p for p in cls.todos() if p.get('nombre') == nombre), None)
+        producto = cls.por_nombre().get(nombre)
+        return cls._con_stock(producto, cls.libro()) if producto else None
+
+    @classmethod
+    def sugerir(cls, consulta, limite=LIMITE_SUGERENCIAS):
+        """
+        Sugiere nombres de productos para el autocompletado, sin distinguir tildes ni mayúsculas:
+        primero los que empiezan con la consulta y luego los que la contienen (ver busqueda.py).
+        El índice de nombres se reconstruye solo cuando cambia el archivo.
+        :param consulta: Texto escrito por el usuario.
+        :param limite: Cantidad máxima de sugerencias.
+        :return: Una lista de nombres.
+        """
+        indice = IndiceNombres.para(cls.storage.filepath, cls.storage.version,
+                                    lambda: [registro.get('nombre') for registro in cls.storage._actual()])
+        return indice.sugerir(consulta, limite)
+
+    @staticmethod
+    def validar(datos):
+        """
+        Valida los datos de un producto (usado al crear y al importar).
+        :param datos: Un diccionario con 'nombre', 'stock' y 'origen' del producto,
+                      y opcionalmente 'stock_minimo' (umbral de reposición).
+        :return: El mensaje de error, o None si los datos son válidos.
+        """
+        if not isinstance(datos, dict) or not all(key in datos for key in ['nombre', 'stock', 'origen']):
+            return 'Datos inválidos: nombre (str), stock (int), y origen (str) son requeridos'
+        if not isinstance(datos['nombre'], str) or not isinstance(datos['stock'], int) or not isinstance(datos['origen'], str):
+            return 'Datos inválidos: nombre (str), stock (int), y origen (str) son requeridos'
+        if 'stock_minimo' in datos and (not isinstance(datos['stock_minimo'], int) or datos['stock_minimo'] < 0):
+            return 'Datos inválidos: stock_minimo debe ser un entero mayor o igual a 0'
+        return None
 
     @classmethod
     def crear(cls, datos):
@@ -89,19 +633,24 @@ class Producto:
         :param datos: Un diccionario con 'nombre', 'stock' y 'origen' del producto.
         :return: Una tupla (datos_del_producto_o_error, código_HTTP).
         """
-        if not isinstance(datos, dict) or not all(key in datos for key in ['nombre', 'stock', 'origen']):
-            return {'error': 'Datos inválidos: nombre (str), stock (int), y origen (str) son requeridos'}, 400
-        if not isinstance(datos['nombre'], str) or not isinstance(datos['stock'], int) or not isinstance(datos['origen'], str):
-            return {'error': 'Datos inválidos: nombre (str), stock (int), y origen (str) son requeridos'}, 400
-        
-        productos = cls.todos()
-        if cls.buscar(datos['nombre']):
-            return {'error': f'El producto "{datos["nombre"]}" ya existe'}, 409
-
-        productos.append(datos)
-        if cls.storage.guardar(productos):
-            return datos, 201
-        return {'error': 'No se pudo guardar el producto'}, 500
+        error = cls.validar(datos)
+        if error:
+            return {'error': error}, 400
+
+        with cls.ventas.lock_inventario:
+            productos = cls._cargar_con_stock()
+            if any(p.get('nombre') == datos['nombre'] for p in productos):
+                return {'error': f'El producto "{datos["nombre"]}" ya existe'}, 409
+
+            productos.append(datos)
+            if not cls.storage.guardar(productos):
+                return {'error': 'No se pudo guardar el producto'}, 500
+            libro = cls.libro()
+            libro.bajo_stock.fijar_umbral(datos['nombre'], datos.get('stock_minimo'))
+            delta = datos['stock'] - (libro.stock(datos['nombre']) or 0)
+            if delta and not cls.registrar_movimientos([('ajuste', datos['nombre'], delta, 'alta')]):
+                return {'error': 'No se pudo registrar el stock inicial del producto'}, 500
+        return datos, 201
 
     @classmethod
     def actualizar(cls, nombre, nuevos_datos):
@@ -111,16 +660,34 @@ class Producto:
         :param nuevos_datos: Un diccionario con los campos a actualizar del producto.
         :return: Una tupla (datos_del_producto_actualizado_o_error, código_HTTP).
         """
-        productos = cls.todos()
-        encontrado = False
-        for p in productos:
-            if p.get('nombre') == nombre:
-                p.update(nuevos_datos)
-                encontrado = True
-                break
-        if encontrado and cls.storage.guardar(productos):
+        with cls.ventas.lock_inventario:
+            productos = cls._cargar_con_stock()
+            encontrado = False
+            for p in productos:
+                if p.get('nombre') == nombre:
+                    stock_anterior = p.get('stock')
+                    p.update(nuevos_datos)
+                    encontrado = True
+                    break
+            if not (encontrado and cls.storage.guardar(productos)):
+                return {'error': f'Producto "{nombre}" no encontrado'}, 404
+            # Los cambios de stock (o de nombre) se registran como ajustes de inventario
+            libro = cls.libro()
+            if p.get('nombre') != nombre:
+                libro.bajo_stock.quitar(nombre)
+            libro.bajo_stock.fijar_umbral(p.get('nombre'), p.get('stock_minimo'))
+            movimientos = []
+            if p.get('nombre') != nombre:
+                if stock_anterior:
+                    movimientos.append(('ajuste', nombre, -stock_anterior, f'renombrado a {p.get("nombre")}'))
+                movimientos.append(('ajuste', p.get('nombre'), p.get('stock', 0) - (libro.stock(p.get('nombre')) or 0),
+                                    f'renombrado desde {nombre}'))
+            elif isinstance(p.get('stock'), int) and p['stock'] != stock_anterior:
+                movimientos.append(('ajuste', nombre, p['stock'] - (stock_anterior or 0), 'actualizacion'))
+            movimientos = [m for m in movimientos if m[2]]
+            if movimientos and not cls.registrar_movimientos(movimientos):
+                return {'error': 'No se pudo registrar el ajuste de stock'}, 500
             return p, 200
-        return {'error': f'Producto "{nombre}" no encontrado'}, 404
 
     @classmethod
     def eliminar(cls, nombre):
@@ -129,13 +696,119 @@ class Producto:
         :param nombre: El nombre del producto a eliminar.
         :return: Una tupla (mensaje_o_error, código_HTTP).
         """
-        productos = cls.todos()
-        nuevos = [p for p in productos if p.get('nombre') != nombre]
-        if len(nuevos) < len(productos):
-            if cls.storage.guardar(nuevos):
+        with cls.ventas.lock_inventario:
+            productos = cls._cargar_con_stock()
+            nuevos = [p for p in productos if p.get('nombre') != nombre]
+            if len(nuevos) < len(productos):
+                if not cls.storage.guardar(nuevos):
+                    return {'error': 'No se pudo eliminar el producto'}, 500
+                # Se saca del índice de bajo stock antes y después del ajuste a 0: así la baja
+                # no cuenta como un evento de bajo stock ni deja al producto en el índice
+                libro = cls.libro()
+                libro.bajo_stock.quitar(nombre)
+                stock = libro.stock(nombre)
+                if stock:
+                    cls.registrar_movimientos([('ajuste', nombre, -stock, 'baja')])
+                libro.bajo_stock.quitar(nombre)
                 return {'mensaje': f'Producto "{nombre}" eliminado'}, 200
-            return {'error': 'No se pudo eliminar el producto'}, 500
-        return {'error': f'Producto "{nombre}" no encontrado'}, 404
+            return {'error': f'Producto "{nombre}" no encontrado'}, 404
+
+    @classmethod
+    def reabastecer(cls, nombre, cantidad):
+        """
+        Registra la entrada de mercadería de un producto.
+        :param nombre: El nombre del producto.
+        :param cantidad: Unidades recibidas (entero > 0).
+        :return: Una tupla (movimiento_registrado_o_error, código_HTTP).
+        """
+        if not isinstance(cantidad, int) or isinstance(cantidad, bool) or cantidad <= 0:
+            return {'error': 'Datos inválidos: cantidad (int > 0) es requerida'}, 400
+        if not cls.buscar(nombre):
+            return {'error': f'Producto "{nombre}" no encontrado'}, 404
+        registrados = cls.registrar_movimientos([('reabastecimiento', nombre, cantidad, None)])
+        if not registrados:
+            return {'error': 'No se pudo registrar el reabastecimiento'}, 500
+        return registrados[0], 201
+
+    @classmethod
+    def bajo_stock(cls, umbral=None, limite=None):
+        """
+        Retorna los productos con stock menor o igual al umbral, de menor a mayor stock,
+        usando el índice de bajo stock (sin recorrer todo el catálogo).
+        :param umbral: Stock máximo a incluir (por defecto UMBRAL_BAJO_STOCK).
+        :param limite: Número máximo de productos (por defecto 50).
+        """
+        return cls.libro().bajo_stock.consultar(UMBRAL_BAJO_STOCK if umbral is None else umbral, limite or 50)
+
+    @classmethod
+    def stock_en(cls, nombre, fecha=None):
+        """
+        Retorna el stock de un producto al final de una fecha, o el actual si no se indica.
+        :param nombre: El nombre del producto.
+        :param fecha: Fecha 'YYYY-MM-DD' (opcional).
+        :return: Una tupla (datos_o_error, código_HTTP).
+        """
+        libro = cls.libro()
+        if fecha is None:
+            stock = libro.stock(nombre)
+        else:
+            try:
+                datetime.strptime(fecha, '%Y-%m-%d')
+            except ValueError:
+                return {'error': 'Fecha inválida: se espera el formato YYYY-MM-DD'}, 400
+            stock = libro.stock_en(nombre, fecha)
+        if stock is None:
+            return {'error': f'Producto "{nombre}" sin movimientos de inventario'}, 404
+        return {'producto': nombre, 'fecha': fecha, 'stock': stock}, 200
+
+    @classmethod
+    def movimientos(cls, nombre, limite):
+        """
+        Retorna los últimos movimientos de inventario de un producto, del más antiguo al más reciente.
+        :param nombre: El nombre del producto.
+        :param limite: Número máximo de movimientos.
+        """
+        return list(collections.deque(cls.libro().movimientos(nombre), maxlen=limite))
+
+    @classmethod
+    def importar(cls, filas):
+        """
+        Importa productos en lote: crea los nuevos y actualiza los existentes (por nombre),
+        validando cada fila con las mismas reglas que crear() (ver importar_en_lotes).
+        :param filas: Iterable de (número_de_fila, datos, error_de_lectura).
+        :return: Una tupla (reporte, éxito).
+        """
+        def preparar(datos):
+            error = cls.validar(datos)
+            return (None, error) if error else (datos, None)
+
+        def confirmar(lote):
+            # El stock importado se registra como ajuste de inventario (con lock_inventario tomado)
+            stocks = {datos['nombre']: datos['stock'] for datos in lote}
+            libro = cls.libro()
+            for datos in lote:
+                if 'stock_minimo' in datos:
+                    libro.bajo_stock.fijar_umbral(datos['nombre'], datos['stock_minimo'])
+            ajustes = [('ajuste', nombre, stock - (libro.stock(nombre) or 0), 'importacion')
+                       for nombre, stock in stocks.items()]
+            ajustes = [a for a in ajustes if a[2]]
+            if ajustes and not cls.registrar_movimientos(ajustes):
+                return 'No se pudo registrar el stock importado en el inventario'
+            return None
+
+        return importar_en_lotes(cls.storage, filas, preparar, cls.ventas.lock_inventario, clave='nombre',
+                                 confirmar=confirmar)
+
+
+def notificar_bajo_stock(evento, tienda=None):
+    """
+    Registra en el log y en las métricas que un producto bajó hasta su umbral de reposición.
+    :param tienda: Nombre de la tienda del producto (ver Tienda). Opcional.
+    """
+    logging.getLogger('tienda.inventario').warning(
+        'Bajo stock%s: "%s" tiene %s unidades (umbral %s)', f' en {tienda}' if tienda else '',
+        evento['producto'], evento['stock'], evento['umbral'])
+    metricas.registro.incrementar('tienda_inventario_bajo_stock_eventos_total')
 
 
 class Persona:
@@ -144,13 +817,16 @@ class Persona:
     Interactúa con el almacenamiento JSON a través de JsonStorage.
     """
     storage = JsonStorage(PERSONAS_FILE)
+    # Serializa las escrituras de personas: cada una parte de la última versión guardada
+    lock_personas = threading.Lock()
 
     @classmethod
     def todos(cls):
         """
-        Retorna una lista de todas las personas almacenadas.
+        Retorna una lista de todas las personas almacenadas (solo lectura: no modificarla;
+        para modificar usar storage.cargar()).
         """
-        return cls.storage.cargar()
+        return cls.storage.leer()
 
     @classmethod
     def buscar(cls, nombre):
@@ -161,6 +837,33 @@ class Persona:
         """
         return next((p for p in cls.todos() if p.get('nombre') == nombre), None)
 
+    @classmethod
+    def sugerir(cls, consulta, limite=LIMITE_SUGERENCIAS):
+        """
+        Sugiere nombres de personas para el autocompletado, sin distinguir tildes ni mayúsculas:
+        primero los que empiezan con la consulta y luego los que la contienen (ver busqueda.py).
+        El índice de nombres se reconstruye solo cuando cambia el archivo.
+        :param consulta: Texto escrito por el usuario.
+        :param limite: Cantidad máxima de sugerencias.
+        :return: Una lista de nombres.
+        """
+        indice = IndiceNombres.para(cls.storage.filepath, cls.storage.version,
+                                    lambda: [registro.get('nombre') for registro in cls.storage._actual()])
+        return indice.sugerir(consulta, limite)
+
+    @staticmethod
+    def validar(datos):
+        """
+        Valida los datos de una persona (usado al crear y al importar).
+        :param datos: Un diccionario con al menos el 'nombre' de la persona.
+        :return: El mensaje de error, o None si los datos son válidos.
+        """
+        if not isinstance(datos, dict) or not datos.get('nombre'):
+            return 'Datos inválidos: el nombre es requerido'
+        if not isinstance(datos['nombre'], str):
+            return 'Datos inválidos: el nombre debe ser una cadena'
+        return None
+
     @classmethod
     def crear(cls, datos):
         """
@@ -169,19 +872,19 @@ class Persona:
         :param datos: Un diccionario con al menos el 'nombre' de la persona.
         :return: Una tupla (datos_de_la_persona_o_error, código_HTTP).
         """
-        if not isinstance(datos, dict) or not datos.get('nombre'):
-            return {'error': 'Datos inválidos: el nombre es requerido'}, 400
-        if not isinstance(datos['nombre'], str):
-            return {'error': 'Datos inválidos: el nombre debe ser una cadena'}, 400
+        error = cls.validar(datos)
+        if error:
+            return {'error': error}, 400
 
-        personas = cls.todos()
-        if cls.buscar(datos['nombre']):
-            return {'error': f'La persona "{datos["nombre"]}" ya existe'}, 409
+        with cls.lock_personas:
+            personas = cls.storage.cargar()
+            if any(p.get('nombre') == datos['nombre'] for p in personas):
+                return {'error': f'La persona "{datos["nombre"]}" ya existe'}, 409
 
-        personas.append(datos)
-        if cls.storage.guardar(personas):
-            return datos, 201
-        return {'error': 'No se pudo guardar la persona'}, 500
+            personas.append(datos)
+            if cls.storage.guardar(personas):
+                return datos, 201
+            return {'error': 'No se pudo guardar la persona'}, 500
 
     @classmethod
     def actualizar(cls, nombre, nuevos_datos):
@@ -191,16 +894,17 @@ class Persona:
         :param nuevos_datos: Un diccionario con los campos a actualizar de la persona.
         :return: Una tupla (datos_de_la_persona_actualizada_o_error, código_HTTP).
         """
-        personas = cls.todos()
-        encontrado = False
-        for p in personas:
-            if p.get('nombre') == nombre:
-                p.update(nuevos_datos)
-                encontrado = True
-                break
-        if encontrado and cls.storage.guardar(personas):
-            return p, 200
-        return {'error': f'Persona "{nombre}" no encontrada'}, 404
+        with cls.lock_personas:
+            personas = cls.storage.cargar()
+            encontrado = False
+            for p in personas:
+                if p.get('nombre') == nombre:
+                    p.update(nuevos_datos)
+                    encontrado = True
+                    break
+            if encontrado and cls.storage.guardar(personas):
+                return p, 200
+            return {'error': f'Persona "{nombre}" no encontrada'}, 404
 
     @classmethod
     def eliminar(cls, nombre):
@@ -209,13 +913,223 @@ class Persona:
         :param nombre: El nombre de la persona a eliminar.
         :return: Una tupla (mensaje_o_error, código_HTTP).
         """
-        personas = cls.todos()
-        nuevas = [p for p in personas if p.get('nombre') != nombre]
-        if len(nuevas) < len(personas):
-            if cls.storage.guardar(nuevas):
-                return {'mensaje': f'Persona "{nombre}" eliminada'}, 200
-            return {'error': 'No se pudo eliminar la persona'}, 500
-        return {'error': f'Persona "{nombre}" no encontrada'}, 404
+        with cls.lock_personas:
+            personas = cls.storage.cargar()
+            nuevas = [p for p in personas if p.get('nombre') != nombre]
+            if len(nuevas) < len(personas):
+                if cls.storage.guardar(nuevas):
+                    return {'mensaje': f'Persona "{nombre}" eliminada'}, 200
+                return {'error': 'No se pudo eliminar la persona'}, 500
+            return {'error': f'Persona "{nombre}" no encontrada'}, 404
+
+    @classmethod
+    def importar(cls, filas):
+        """
+        Importa personas en lote: crea las nuevas y actualiza las existentes (por nombre),
+        validando cada fila con las mismas reglas que crear() (ver importar_en_lotes).
+        :param filas: Iterable de (número_de_fila, datos, error_de_lectura).
+        :return: Una tupla (reporte, éxito).
+        """
+        def preparar(datos):
+            error = cls.validar(datos)
+            return (None, error) if error else (datos, None)
+        return importar_en_lotes(cls.storage, filas, preparar, cls.lock_personas, clave='nombre')
+
+
+class ResumenCliente:
+    """
+    Agregados incrementales de las compras de un cliente: se actualizan al registrar,
+    cancelar o modificar cada venta, así el resumen se responde sin recorrer sus ventas.
+    Parten de los agregados de sus ventas archivadas, si las tiene (ver archivo.py).
+    """
+    def __init__(self, archivado=None):
+        """
+        :param archivado: Agregados de las ventas archivadas del cliente (ver
+                          archivo.resumir_clientes), o None.
+        """
+        self.ids = [] # Ids de sus ventas de venta.json, en orden de registro
+        self.unidades = 0
+        self.por_producto = {} # producto -> unidades
+        self.por_origen = {} # origen -> unidades
+        self.por_fecha = {} # fecha -> número de ventas (solo las de venta.json)
+        self.archivadas = 0
+        self.extremos_archivados = () # Primera y última compra archivadas
+        self.primera = None
+        self.ultima = None
+        if archivado:
+            self.archivadas = archivado['ventas']
+            self.unidades = archivado['unidades']
+            self.por_producto = dict(archivado['por_producto'])
+            self.por_origen = dict(archivado['por_origen'])
+            self.extremos_archivados = tuple(f for f in (archivado['primera'], archivado['ultima']) if f)
+            self.primera = min(self.extremos_archivados, default=None)
+            self.ultima = max(self.extremos_archivados, default=None)
+
+    @staticmethod
+    def _sumar(conteo, clave, cantidad):
+        total = conteo.get(clave, 0) + cantidad
+        if total > 0:
+            conteo[clave] = total
+        else:
+            conteo.pop(clave, None)
+
+    def agregar(self, venta):
+        self.ids.append(venta['id'])
+        self._sumar_venta(venta)
+
+    def quitar(self, venta):
+        if venta['id'] in self.ids:
+            self.ids.remove(venta['id'])
+        self._restar_venta(venta)
+
+    def reemplazar(self, anterior, venta):
+        """Actualiza los agregados de una venta modificada sin cambiar su lugar en ids."""
+        self._restar_venta(anterior)
+        self._sumar_venta(venta)
+
+    def _sumar_venta(self, venta):
+        cantidad = venta.get('cantidad') if isinstance(venta.get('cantidad'), int) else 0
+        self.unidades += cantidad
+        self._sumar(self.por_producto, venta.get('producto'), cantidad)
+        self._sumar(self.por_origen, venta.get('origen') or 'Desconocido', cantidad)
+        fecha = venta.get('fecha')
+        if isinstance(fecha, str):
+            self._sumar(self.por_fecha, fecha, 1)
+            if self.primera is None or fecha < self.primera:
+                self.primera = fecha
+            if self.ultima is None or fecha > self.ultima:
+                self.ultima = fecha
+
+    def _restar_venta(self, venta):
+        cantidad = venta.get('cantidad') if isinstance(venta.get('cantidad'), int) else 0
+        self.unidades -= cantidad
+        self._sumar(self.por_producto, venta.get('producto'), -cantidad)
+        self._sumar(self.por_origen, venta.get('origen') or 'Desconocido', -cantidad)
+        fecha = venta.get('fecha')
+        if isinstance(fecha, str):
+            self._sumar(self.por_fecha, fecha, -1)
+            # Solo si desaparece una fecha extrema se recorren las fechas del cliente
+            if fecha not in self.por_fecha and fecha in (self.primera, self.ultima):
+                fechas = list(self.por_fecha) + list(self.extremos_archivados)
+                self.primera = min(fechas, default=None)
+                self.ultima = max(fechas, default=None)
+
+    def como_dict(self):
+        return {
+            'ventas': len(self.ids) + self.archivadas,
+            'unidades': self.unidades,
+            'productos_distintos': len(self.por_producto),
+            'primera_compra': self.primera,
+            'ultima_compra': self.ultima,
+            'origen_favorito': max(self.por_origen, key=self.por_origen.get, default=None),
+        }
+
+
+class IndiceVentas:
+    """
+    Índices en memoria de la lista de ventas: id -> posición en la lista,
+    (producto, cliente, fecha) -> ids, para la búsqueda por datos de las rutas antiguas,
+    cliente -> ResumenCliente, con sus ventas y sus agregados de compra, las series
+    diarias acumuladas de unidades vendidas (ver series.py) y los resúmenes aproximados
+    de clientes distintos y cantidades por venta (ver aproximados.py).
+    Las series y los resúmenes aproximados incluyen también las filas de resumen de las
+    ventas archivadas (ver archivo.py), y los agregados de los clientes, sus agregados
+    archivados; los demás índices, solo las ventas de venta.json.
+    Se construye a partir de una lista cargada y es válido mientras el archivo no cambie
+    (ver Venta.cargar_con_indice).
+    """
+    def __init__(self, ventas, filas_archivadas=(), clientes_archivados=None):
+        self.posiciones = {}
+        self.por_clave = {}
+        self.por_cliente = {cliente: ResumenCliente(archivado)
+                            for cliente, archivado in (clientes_archivados or {}).items()}
+        self.aproximados = ResumenesVentas()
+        self.siguiente_id = 1
+        self.ultimo_ticket = 0 # Número del último ticket, para no recorrer las ventas en cada ticket nuevo
+        for fila in filas_archivadas:
+            self.aproximados.agregar_resumen(fila)
+        for posicion, venta in enumerate(ventas):
+            if self._indexar(venta, posicion):
+                self.aproximados.agregar(venta)
+        self.series = SeriesVentas.construir(itertools.chain(
+            filas_archivadas, (v for v in ventas if v.get('id') is not None)))
+
+    @staticmethod
+    def clave(venta):
+        return (venta.get('producto'), venta.get('cliente'), venta.get('fecha'))
+
+    def _indexar(self, venta, posicion):
+        id_venta = venta.get('id')
+        if id_venta is None:
+            return False
+        self.posiciones[id_venta] = posicion
+        self.por_clave.setdefault(self.clave(venta), []).append(id_venta)
+        self.por_cliente.setdefault(venta.get('cliente'), ResumenCliente()).agregar(venta)
+        self.siguiente_id = max(self.siguiente_id, id_venta + 1)
+        if isinstance(venta.get('ticket'), int):
+            self.ultimo_ticket = max(self.ultimo_ticket, venta['ticket'])
+        return True
+
+    def agregar(self, venta, posicion):
+        """Indexa una venta ubicada en la posición dada de la lista."""
+        if self._indexar(venta, posicion):
+            self.series.sumar(venta)
+            self.aproximados.agregar(venta)
+
+    def _quitar_clave(self, venta, cliente=True):
+        clave = self.clave(venta)
+        ids = self.por_clave.get(clave, [])
+        if venta['id'] in ids:
+            ids.remove(venta['id'])
+            if not ids:
+                del self.por_clave[clave]
+        resumen = self.por_cliente.get(venta.get('cliente'))
+        if cliente and resumen is not None:
+            resumen.quitar(venta)
+            if not resumen.ids and not resumen.archivadas:
+                del self.por_cliente[venta.get('cliente')]
+        self.series.sumar(venta, -1)
+        self.aproximados.quitar(venta)
+
+    def reemplazar(self, anterior, venta):
+        """
+        Actualiza los índices secundarios después de modificar una venta (misma posición y mismo id).
+        Si no cambió el cliente, la venta conserva su lugar entre las del cliente.
+        """
+        mismo_cliente = anterior.get('cliente') == venta.get('cliente') and venta.get('cliente') in self.por_cliente
+        self._quitar_clave(anterior, cliente=not mismo_cliente)
+        # Los ids crecen en orden de registro: se inserta en orden para conservar "la primera registrada"
+        bisect.insort(self.por_clave.setdefault(self.clave(venta), []), venta['id'])
+        if mismo_cliente:
+            self.por_cliente[venta.get('cliente')].reemplazar(anterior, venta)
+        else:
+            self.por_cliente.setdefault(venta.get('cliente'), ResumenCliente()).agregar(venta)
+        self.series.sumar(venta)
+        self.aproximados.agregar(venta)
+
+    def quitar(self, venta, posicion, ventas):
+        """
+        Desindexa una venta ya quitada de la lista y corrige las posiciones de las
+        ventas que estaban después de ella.
+        :param ventas: La lista ya sin la venta.
+        """
+        self.posiciones.pop(venta['id'], None)
+        self._quitar_clave(venta)
+        for i in range(posicion, len(ventas)):
+            if ventas[i].get('id') is not None:
+                self.posiciones[ventas[i]['id']] = i
+
+    def posicion(self, id_venta):
+        """Retorna la posición de la venta en la lista, o None si no existe."""
+        return self.posiciones.get(id_venta)
+
+    def buscar_ids(self, producto, cliente, fecha):
+        """Retorna los ids (en orden de registro) de las ventas con esos datos."""
+        return list(self.por_clave.get((producto, cliente, fecha), []))
+
+    def resumen_cliente(self, cliente):
+        """Retorna los agregados de compra del cliente, o None si no tiene ventas."""
+        return self.por_cliente.get(cliente)
 
 
 class Venta:
@@ -224,13 +1138,95 @@ class Venta:
     Además de registrar ventas, se encarga de actualizar el stock de los productos.
     """
     storage = JsonStorage(VENTAS_FILE)
+    # Ventas antiguas archivadas y sus filas de resumen (ver archivo.py y archivar)
+    archivo = ArchivoVentas(ARCHIVO_VENTAS_DIR, ESTADO_ARCHIVO_FILE,
+                            publicar=functools.partial(JsonStorage.publicar, ESTADO_ARCHIVO_FILE))
+    productos = Producto # Modelo de productos de la misma tienda
+    # Serializa las operaciones que leen y modifican a la vez el stock y las ventas
+    lock_inventario = threading.Lock()
+    _indice = None
+    _indice_version = None
+
+    @classmethod
+    def cargar_con_indice(cls):
+        """
+        Carga las ventas junto con su índice en memoria (llamar con lock_inventario tomado).
+        La lista es una copia, pero sus registros son los publicados: para modificar una venta
+        hay que reemplazar su diccionario por una copia.
+        El índice se reconstruye solo si el archivo cambió desde la última vez; las ventas
+        antiguas sin 'id' reciben uno y se guardan una sola vez, y se terminan de quitar las
+        ventas ya archivadas por una compactación interrumpida (ver archivo.py).
+        :return: Una tupla (ventas, indice).
+        """
+        version = cls.storage.version
+        # Solo se copia la lista: quien modifique una venta debe reemplazar su diccionario
+        ventas = cls.storage.cargar(copiar_registros=False)
+        if cls._indice is None or cls._indice_version != version:
+            pendientes = cls.archivo.pendientes()
+            if pendientes:
+                restantes = [v for v in ventas if v.get('id') not in pendientes]
+                # Los pendientes se vacían solo con venta.json ya en disco (ver archivar)
+                if len(restantes) == len(ventas) or cls.storage.guardar(restantes, esperar=True):
+                    cls.archivo.limpiar_pendientes()
+                    ventas = restantes
+                    version = cls.storage.version
+            # Los ids de las ventas archivadas no se reutilizan
+            siguiente_id = max(max((v['id'] for v in ventas if isinstance(v.get('id'), int)), default=0) + 1,
+                               cls.archivo.siguiente_id())
+            sin_id = [i for i, v in enumerate(ventas) if not isinstance(v.get('id'), int)]
+            for posicion in sin_id:
+                ventas[posicion] = {**ventas[posicion], 'id': siguiente_id}
+                siguiente_id += 1
+            if sin_id:
+                cls.storage.guardar(ventas)
+                version = cls.storage.version
+                ventas = cls.storage.cargar(copiar_registros=False) # Lo guardado quedó publicado: se trabaja sobre una copia
+            anterior = cls._indice
+            cls._indice = IndiceVentas(ventas, cls.archivo.filas(), cls.archivo.clientes())
+            cls._indice.siguiente_id = max(cls._indice.siguiente_id, cls.archivo.siguiente_id())
+            # Los números de ticket de las ventas archivadas tampoco se reutilizan
+            cls._indice.ultimo_ticket = max(cls._indice.ultimo_ticket, cls.archivo.ultimo_ticket())
+            if anterior is not None:
+                cls._indice.siguiente_id = max(cls._indice.siguiente_id, anterior.siguiente_id)
+                cls._indice.ultimo_ticket = max(cls._indice.ultimo_ticket, anterior.ultimo_ticket)
+            cls._indice_version = version
+        return ventas, cls._indice
+
+    @classmethod
+    def _confirmar_indice(cls):
+        """
+        Marca el índice como vigente tras una escritura propia (llamar con lock_inventario tomado).
+        Se usa la versión que publicó esa escritura, no la actual: si un lote fallido ya la
+        descartó, el índice se reconstruye.
+        """
+        cls._indice_version = cls.storage.version_propia()
+
+    @classmethod
+    def asegurar_ids(cls):
+        """Asigna un id a las ventas que no lo tienen y prepara el índice en memoria."""
+        with cls.lock_inventario:
+            return len(cls.cargar_con_indice()[0])
 
     @classmethod
     def todas(cls):
         """
-        Retorna una lista de todas las ventas registradas.
+        Retorna una lista de todas las ventas registradas (solo lectura: no modificarla;
+        para modificar usar storage.cargar()).
         """
-        return cls.storage.cargar()
+        return cls.storage.leer()
+
+    @staticmethod
+    def validar(datos):
+        """
+        Valida los datos de una venta (usado al crear y al importar).
+        :param datos: Un diccionario con 'producto' (dict con 'nombre') y 'cantidad'.
+        :return: El mensaje de error, o None si los datos son válidos.
+        """
+        if not isinstance(datos, dict) or not isinstance(datos.get('producto'), dict) or not isinstance(datos.get('cantidad'), int):
+            return 'Datos inválidos: requiere producto (dict con nombre) y cantidad (int)'
+        if not isinstance(datos['producto'].get('nombre'), str) or datos['cantidad'] <= 0:
+            return 'Datos inválidos: nombre del producto (str) y cantidad (> 0) son requeridos'
+        return None
 
     @classmethod
     def crear(cls, datos):
@@ -240,18 +1236,22 @@ class Venta:
                       y opcionalmente 'cliente'.
         :return: Una tupla (datos_de_la_venta_o_error, código_HTTP).
         """
-        if not isinstance(datos, dict) or not isinstance(datos.get('producto'), dict) or not isinstance(datos.get('cantidad'), int):
-            return {'error': 'Datos inválidos: requiere producto (dict con nombre) y cantidad (int)'}, 400
+        error = cls.validar(datos)
+        if error:
+            return {'error': error}, 400
 
         nombre_producto = datos['producto'].get('nombre')
         cantidad = datos['cantidad']
         cliente = datos.get('cliente', 'Sin nombre')
         fecha = datetime.now().strftime('%Y-%m-%d')
 
-        if not isinstance(nombre_producto, str) or cantidad <= 0:
-            return {'error': 'Datos inválidos: nombre del producto (str) y cantidad (> 0) son requeridos'}, 400
+        with cls.lock_inventario:
+            return cls._crear(nombre_producto, cantidad, cliente, fecha)
 
-        producto = next((p for p in Producto.todos() if p.get('nombre') == nombre_producto), None)
+    @classmethod
+    def _crear(cls, nombre_producto, cantidad, cliente, fecha):
+        """Registra una venta ya validada (llamar con lock_inventario tomado)."""
+        producto = cls.productos.buscar(nombre_producto)
 
         if not producto:
             return {'error': f'Producto "{nombre_producto}" no encontrado'}, 404
@@ -259,13 +1259,13 @@ class Venta:
         if not isinstance(producto.get('stock'), int) or producto['stock'] < cantidad:
             return {'error': f'Stock insuficiente para "{nombre_producto}"'}, 400
 
-        producto['stock'] -= cantidad
-        resultado_actualizacion_producto, codigo_actualizacion_producto = Producto.actualizar(nombre_producto, producto)
-
-        if codigo_actualizacion_producto != 200:
-            return {'error': f'No se pudo actualizar el stock del producto: {resultado_actualizacion_producto.get("error")}'}, 500
+        ventas, indice = cls.cargar_con_indice()
+        # El descuento de stock es una línea en el libro de inventario, no una reescritura de product.json
+        if not cls.productos.registrar_movimientos([('venta', nombre_producto, -cantidad, indice.siguiente_id)]):
+            return {'error': 'No se pudo actualizar el stock del producto'}, 500
 
         nueva_venta = {
+            'id': indice.siguiente_id,
             'producto': nombre_producto,
             'cantidad': cantidad,
             'cliente': cliente,
@@ -273,22 +1273,319 @@ class Venta:
             'fecha': fecha
         }
 
-        ventas = cls.todas()
         ventas.append(nueva_venta)
         if cls.storage.guardar(ventas):
+            indice.agregar(nueva_venta, len(ventas) - 1)
+            cls._confirmar_indice()
             return nueva_venta, 201
+        cls.productos.registrar_movimientos([('ajuste', nombre_producto, cantidad, f'venta {nueva_venta["id"]} no registrada')])
         return {'error': 'No se pudo registrar la venta'}, 500
 
     @classmethod
-    def obtener_estadisticas_ventas_por_dia(cls, fecha_inicio=None, fecha_fin=None):
+    def buscar(cls, id_venta):
+        """
+        Busca una venta por su id usando el índice en memoria.
+        :param id_venta: El id de la venta.
+        :return: El diccionario de la venta si se encuentra, de lo contrario None.
+        """
+        with cls.lock_inventario:
+            ventas, indice = cls.cargar_con_indice()
+            posicion = indice.posicion(id_venta)
+            return ventas[posicion] if posicion is not None else None
+
+    @classmethod
+    def buscar_id(cls, producto, cliente, fecha):
+        """
+        Busca el id de una venta por sus datos (forma antigua de identificar una venta).
+        Si hay varias ventas con los mismos datos, retorna la primera registrada.
+        :return: El id de la venta, o None si no se encuentra.
+        """
+        with cls.lock_inventario:
+            ids = cls.cargar_con_indice()[1].buscar_ids(producto, cliente, fecha)
+        return ids[0] if ids else None
+
+    @classmethod
+    def _indice_vigente(cls):
+        """
+        Retorna (ventas, indice) sin copiar la lista (llamar con lock_inventario tomado).
+        La lista es la versión publicada: es de solo lectura.
+        """
+        if cls._indice is None or cls._indice_version != cls.storage.version:
+            cls.cargar_con_indice()
+        return cls.storage._actual(), cls._indice
+
+    @classmethod
+    def historial_cliente(cls, cliente, limite=50, desde=0):
+        """
+        Retorna una página de las ventas de un cliente, de la más reciente a la más antigua,
+        usando el índice cliente -> ventas (no recorre las ventas de los demás clientes).
+        :param cliente: El nombre del cliente.
+        :param limite: Cantidad máxima de ventas de la página.
+        :param desde: Cantidad de ventas (las más recientes) que se saltan.
+        :return: Un diccionario con el total de ventas del cliente y las de la página,
+                 o None si el cliente no tiene ventas.
+        """
+        with cls.lock_inventario:
+            ventas, indice = cls._indice_vigente()
+            resumen = indice.resumen_cliente(cliente)
+            if resumen is None:
+                return None
+            fin = len(resumen.ids) - desde
+            ids = resumen.ids[max(fin - limite, 0):max(fin, 0)]
+            return {
+                'cliente': cliente,
+                'total': len(resumen.ids),
+                'ventas': [ventas[indice.posicion(id_venta)] for id_venta in reversed(ids)],
+            }
+
+    @classmethod
+    def resumen_cliente(cls, cliente):
+        """
+        Retorna el resumen de compras de un cliente (unidades, productos distintos, primera
+        y última compra y origen favorito) desde los agregados incrementales del índice.
+        :param cliente: El nombre del cliente.
+        :return: El diccionario del resumen, o None si el cliente no tiene ventas.
+        """
+        with cls.lock_inventario:
+            resumen = cls._indice_vigente()[1].resumen_cliente(cliente)
+            return dict(resumen.como_dict(), cliente=cliente) if resumen else None
+
+    @classmethod
+    def cancelar(cls, id_venta):
+        """
+        Cancela una venta por su id y revierte el stock del producto vendido.
+        :param id_venta: El id de la venta a cancelar.
+        :return: Una tupla (mensaje_o_error, código_HTTP).
+        """
+        with cls.lock_inventario:
+            ventas, indice = cls.cargar_con_indice()
+            posicion = indice.posicion(id_venta)
+            if posicion is None:
+                return {'error': 'Venta no encontrada'}, 404
+            venta = ventas[posicion]
+            nombre_producto = venta.get('producto')
+            cantidad_vendida = venta.get('cantidad', 0)
+            if not isinstance(cantidad_vendida, int) or cantidad_vendida <= 0:
+                return {'error': 'Cantidad de venta inválida para cancelar'}, 400
+
+            libro = cls.productos.libro()
+            if libro.stock(nombre_producto) is None:
+                return {'error': f"Producto '{nombre_producto}' no encontrado para revertir el stock"}, 404
+            if not cls.productos.registrar_movimientos([('cancelacion', nombre_producto, cantidad_vendida, id_venta)]):
+                return {'error': f"Error al actualizar stock del producto '{nombre_producto}'"}, 500
+
+            ventas.pop(posicion)
+            if not cls.storage.guardar(ventas):
+                cls.productos.registrar_movimientos([('ajuste', nombre_producto, -cantidad_vendida, f'cancelacion {id_venta} no registrada')])
+                return {'error': 'No se pudo guardar la cancelación de la venta'}, 500
+            # Las posiciones posteriores se desplazan; el id de la venta cancelada no se reutiliza
+            indice.quitar(venta, posicion, ventas)
+            cls._confirmar_indice()
+            return {'mensaje': 'Venta cancelada y stock revertido correctamente'}, 200
+
+    @classmethod
+    def modificar(cls, id_venta, datos):
+        """
+        Modifica una venta por su id. Por ahora solo se puede cambiar la 'fecha'.
+        :param id_venta: El id de la venta a modificar.
+        :param datos: Un diccionario con 'fecha' (YYYY-MM-DD).
+        :return: Una tupla (venta_modificada_o_error, código_HTTP).
+        """
+        fecha = datos.get('fecha') if isinstance(datos, dict) else None
+        try:
+            datetime.strptime(fecha, '%Y-%m-%d')
+        except (TypeError, ValueError):
+            return {'error': "Datos inválidos: se requiere 'fecha' con el formato YYYY-MM-DD"}, 400
+
+        with cls.lock_inventario:
+            ventas, indice = cls.cargar_con_indice()
+            posicion = indice.posicion(id_venta)
+            if posicion is None:
+                return {'error': 'Venta no encontrada'}, 404
+            anterior = ventas[posicion]
+            venta = ventas[posicion] = dict(anterior, fecha=fecha)
+            if not cls.storage.guardar(ventas):
+                return {'error': 'No se pudo guardar la modificación'}, 500
+            indice.reemplazar(anterior, venta)
+            cls._confirmar_indice()
+            return venta, 200
+
+    @classmethod
+    def crear_ticket(cls, datos):
+        """
+        Registra un ticket (carrito) con varias líneas de venta de forma atómica: valida
+        todas las líneas y el stock en una sola pasada y, si todo es válido, descuenta el
+        stock de todos los productos con una sola escritura en el libro de inventario y
+        agrega todas las líneas con otra. Si alguna línea es inválida no se vende nada; si falla la escritura de las
+        ventas, se restaura el stock anterior.
+        :param datos: Un diccionario con 'lineas' (lista de {'producto', 'cantidad'}, donde
+                      'producto' es un nombre o un dict con 'nombre') y opcionalmente 'cliente'.
+        :return: Una tupla (datos_del_ticket_o_error, código_HTTP).
+        """
+        if not isinstance(datos, dict) or not isinstance(datos.get('lineas'), list) or not datos['lineas']:
+            return {'error': 'Datos inválidos: se requiere una lista no vacía de lineas'}, 400
+        if len(datos['lineas']) > MAX_LINEAS_TICKET:
+            return {'error': f'Un ticket admite como máximo {MAX_LINEAS_TICKET} líneas'}, 400
+
+        lineas = []
+        errores = []
+        for i, linea in enumerate(datos['lineas']):
+            if isinstance(linea, dict) and isinstance(linea.get('producto'), str):
+                linea = dict(linea, producto={'nombre': linea['producto']})
+            error = cls.validar(linea)
+            if error:
+                errores.append({'linea': i, 'error': error})
+            else:
+                lineas.append((linea['producto']['nombre'], linea['cantidad']))
+        if errores:
+            return {'error': 'El ticket tiene líneas inválidas', 'lineas': errores}, 400
+
+        cliente = datos.get('cliente') or 'Sin nombre'
+        fecha = datetime.now().strftime('%Y-%m-%d')
+        with cls.lock_inventario:
+            return cls._crear_ticket(lineas, cliente, fecha)
+
+    @classmethod
+    def _crear_ticket(cls, lineas, cliente, fecha):
+        """Registra las líneas ya validadas de un ticket (llamar con lock_inventario tomado)."""
+        productos_map = {nombre_producto: cls.productos.buscar(nombre_producto) for nombre_producto, _ in lineas}
+
+        # Cantidad total pedida por producto (un producto puede repetirse en varias líneas)
+        pedido = {}
+        for nombre_producto, cantidad in lineas:
+            pedido[nombre_producto] = pedido.get(nombre_producto, 0) + cantidad
+
+        errores = []
+        for nombre_producto, cantidad in pedido.items():
+            producto = productos_map.get(nombre_producto)
+            if not producto:
+                errores.append({'producto': nombre_producto, 'error': f'Producto "{nombre_producto}" no encontrado'})
+            elif not isinstance(producto.get('stock'), int) or producto['stock'] < cantidad:
+                errores.append({'producto': nombre_producto, 'error': f'Stock insuficiente para "{nombre_producto}"'})
+        if errores:
+            codigo = 404 if all('no encontrado' in e['error'] for e in errores) else 400
+            return {'error': 'No se puede completar el ticket', 'lineas': errores}, codigo
+
+        ventas, indice = cls.cargar_con_indice()
+        # Todo el descuento de stock del ticket es una sola escritura en el libro de inventario
+        if not cls.productos.registrar_movimientos([('venta', nombre_producto, -cantidad, indice.siguiente_id + i)
+                                                    for i, (nombre_producto, cantidad) in enumerate(lineas)]):
+            return {'error': 'No se pudo actualizar el stock de los productos'}, 500
+
+        numero_ticket = indice.ultimo_ticket + 1
+        nuevas_ventas = [{
+            'id': indice.siguiente_id + i,
+            'producto': nombre_producto,
+            'cantidad': cantidad,
+            'cliente': cliente,
+            'origen': productos_map[nombre_producto].get('origen', 'Desconocido'),
+            'fecha': fecha,
+            'ticket': numero_ticket,
+        } for i, (nombre_producto, cantidad) in enumerate(lineas)]
+        ventas.extend(nuevas_ventas)
+        if not cls.storage.guardar(ventas):
+            # Deshace el descuento de stock para no dejar el ticket vendido a medias
+            cls.productos.registrar_movimientos([('ajuste', nombre_producto, cantidad, f'ticket {numero_ticket} no registrado')
+                                                 for nombre_producto, cantidad in pedido.items()])
+            return {'error': 'No se pudo registrar el ticket'}, 500
+        for posicion, venta in enumerate(nuevas_ventas, start=len(ventas) - len(nuevas_ventas)):
+            indice.agregar(venta, posicion)
+        cls._confirmar_indice()
+
+        return {
+            'ticket': numero_ticket,
+            'cliente': cliente,
+            'fecha': fecha,
+            'lineas': nuevas_ventas,
+            'unidades': sum(cantidad for _, cantidad in lineas),
+        }, 201
+
+    @classmethod
+    def filas_archivadas(cls):
+        """
+        Retorna las filas de resumen de las ventas archivadas (ver archivo.py), que tienen
+        'fecha', 'producto', 'origen' y 'cantidad' como una venta: las estadísticas que
+        recorren las ventas las recorren también a ellas. Son de la misma instantánea que las
+        ventas de la solicitud, así un reporte en curso durante una compactación no cuenta
+        dos veces las ventas recién archivadas.
+        """
+        estado = JsonStorage.leer_publicado(cls.archivo.ruta_estado)
+        return (estado or cls.archivo.estado())['filas']
+
+    @staticmethod
+    def agrupar_por_periodo(estadisticas, max_puntos):
+        """
+        Reduce una serie diaria {'YYYY-MM-DD': unidades} a como máximo max_puntos puntos.
+        Si la serie diaria ya cabe se retorna ordenada por fecha; si no, se agrupa por semana
+        (clave: lunes de la semana), luego por mes ('YYYY-MM') y luego por año ('YYYY'),
+        sumando las unidades de cada periodo para que el total se conserve. Si hay más años
+        que puntos, se juntan años consecutivos en tramos iguales (clave 'YYYY-YYYY').
+        :param estadisticas: Diccionario con fechas como claves y unidades vendidas como valores.
+        :param max_puntos: Número máximo de puntos a retornar (entero > 0).
+        :return: Un diccionario ordenado por periodo con las unidades vendidas por periodo.
+        """
+        fechas = sorted(estadisticas)
+        if len(fechas) <= max_puntos:
+            return {fecha: estadisticas[fecha] for fecha in fechas}
+
+        def semana(fecha):
+            dia = datetime.strptime(fecha, '%Y-%m-%d').date()
+            return (dia - timedelta(days=dia.weekday())).isoformat()
+
+        for clave_periodo in (semana, lambda fecha: fecha[:7], lambda fecha: fecha[:4]):
+            agrupado = {}
+            for fecha in fechas:
+                periodo = clave_periodo(fecha)
+                agrupado[periodo] = agrupado.get(periodo, 0) + estadisticas[fecha]
+            if len(agrupado) <= max_puntos:
+                return agrupado
+        anios = list(agrupado)
+        por_tramo = -(-len(anios) // max_puntos) # División hacia arriba
+        tramos = (anios[i:i + por_tramo] for i in range(0, len(anios), por_tramo))
+        return {(tramo[0] if len(tramo) == 1 else f'{tramo[0]}-{tramo[-1]}'): sum(agrupado[anio] for anio in tramo)
+                for tramo in tramos}
+
+    @staticmethod
+    def seleccionar_top(estadisticas, top):
+        """
+        Selecciona las top-N categorías con más unidades mediante una selección parcial
+        con heap (O(n log N)) y agrupa el resto en una categoría 'Otros' (ver etiqueta_otros).
+        :param estadisticas: Diccionario con categorías como claves y unidades como valores.
+        :param top: Número de categorías a conservar (entero > 0).
+        :return: Un diccionario ordenado de forma descendente, más 'Otros' si corresponde.
+        """
+        mejores = heapq.nlargest(top, estadisticas.items(), key=lambda item: item[1])
+        resultado = dict(mejores)
+        resto = sum(estadisticas.values()) - sum(resultado.values())
+        if len(estadisticas) > len(resultado):
+            resultado[Venta.etiqueta_otros(estadisticas)] = resto
+        return resultado
+
+    @staticmethod
+    def etiqueta_otros(estadisticas):
+        """
+        Retorna la etiqueta del resto en seleccionar_top: ETIQUETA_OTROS, o una variante si
+        alguna categoría real se llama así (ej. un producto 'Otros'), para no mezclarlas.
+        """
+        etiqueta, numero = ETIQUETA_OTROS, 1
+        while etiqueta in estadisticas:
+            numero += 1
+            etiqueta = f'{ETIQUETA_OTROS} (resto)' if numero == 2 else f'{ETIQUETA_OTROS} (resto {numero - 1})'
+        return etiqueta
+
+    @classmethod
+    def obtener_estadisticas_ventas_por_dia(cls, fecha_inicio=None, fecha_fin=None, max_puntos=None):
         """
         Calcula las ventas totales (unidades vendidas) por día.
-        Opcionalmente, puede filtrar por un rango de fechas.
+        Incluye las ventas archivadas (ver filas_archivadas). Opcionalmente, puede filtrar
+        por un rango de fechas.
         :param fecha_inicio: Fecha de inicio del rango (formato 'YYYY-MM-DD'). Opcional.
         :param fecha_fin: Fecha de fin del rango (formato 'YYYY-MM-DD'). Opcional.
-        :return: Un diccionario con fechas como claves y total de unidades vendidas como valores.
+        :param max_puntos: Máximo de puntos a retornar; si se supera, se agrupa por semana,
+                           mes o año (ver agrupar_por_periodo). Opcional.
+        :return: Un diccionario con fechas (o periodos) como claves y total de unidades vendidas como valores.
         """
-        ventas = cls.todas()
+        ventas = itertools.chain(cls.filas_archivadas(), cls.todas())
         estadisticas = {}
         for venta in ventas:
             try:
@@ -304,18 +1601,22 @@ class Venta:
                 estadisticas[fecha] = estadisticas.get(fecha, 0) + venta['cantidad']
             except (ValueError, KeyError):
                 continue
-        return estadisticas
+        if max_puntos:
+            return cls.agrupar_por_periodo(estadisticas, max_puntos)
+        return dict(sorted(estadisticas.items())) # Las respuestas conservan el orden: por fecha
 
     @classmethod
-    def obtener_estadisticas_productos_mas_vendidos(cls, fecha_inicio=None, fecha_fin=None):
+    def obtener_estadisticas_productos_mas_vendidos(cls, fecha_inicio=None, fecha_fin=None, top=None):
         """
         Calcula la cantidad total vendida de cada producto.
-        Opcionalmente, puede filtrar por un rango de fechas.
+        Incluye las ventas archivadas (ver filas_archivadas). Opcionalmente, puede filtrar
+        por un rango de fechas.
         :param fecha_inicio: Fecha de inicio del rango (formato 'YYYY-MM-DD'). Opcional.
         :param fecha_fin: Fecha de fin del rango (formato 'YYYY-MM-DD'). Opcional.
+        :param top: Número de productos a retornar; el resto se agrupa en 'Otros'. Opcional.
         :return: Un diccionario ordenado por cantidad vendida (descendente).
         """
-        ventas = cls.todas()
+        ventas = itertools.chain(cls.filas_archivadas(), cls.todas())
         estadisticas = {}
         for venta in ventas:
             try:
@@ -331,19 +1632,25 @@ class Venta:
                 estadisticas[nombre_producto] = estadisticas.get(nombre_producto, 0) + venta['cantidad']
             except (ValueError, KeyError):
                 continue
+        if top:
+            return cls.seleccionar_top(estadisticas, top)
         return dict(sorted(estadisticas.items(), key=lambda item: item[1], reverse=True))
 
     @classmethod
     def obtener_estadisticas_ventas_por_origen(cls, fecha_inicio=None, fecha_fin=None):
         """
         Calcula las ventas agrupadas por el origen del producto.
-        Opcionalmente, puede filtrar por un rango de fechas.
+        Usa el 'origen' guardado en cada venta, así cuentan también las ventas de productos
+        renombrados o eliminados. Solo las ventas antiguas sin 'origen' (ver completar_origen)
+        se cruzan con el mapa de productos en memoria.
+        Incluye las ventas archivadas (ver filas_archivadas). Opcionalmente, puede filtrar
+        por un rango de fechas.
         :param fecha_inicio: Fecha de inicio del rango (formato 'YYYY-MM-DD'). Opcional.
         :param fecha_fin: Fecha de fin del rango (formato 'YYYY-MM-DD'). Opcional.
         :return: Un diccionario con orígenes como claves y total de unidades vendidas como valores.
         """
-        ventas = cls.todas()
-        productos_map = {p['nombre']: p for p in Producto.todos()} # Usar un mapa para búsqueda rápida
+        ventas = itertools.chain(cls.filas_archivadas(), cls.todas())
+        productos_map = cls.productos.por_nombre() # Mapa en caché: no relee product.json
         origenes_ventas = {}
         for venta in ventas:
             try:
@@ -355,19 +1662,820 @@ class Venta:
                     if not (inicio_dt <= venta_fecha_dt <= fin_dt):
                         continue
 
-                nombre_producto = venta['producto']
-                producto_obj = productos_map.get(nombre_producto) # Obtener del mapa
-                
-                if producto_obj and producto_obj.get('origen'):
-                    origen = producto_obj['origen']
+                origen = venta.get('origen')
+                if not origen:
+                    producto_obj = productos_map.get(venta['producto'])
+                    origen = producto_obj.get('origen') if producto_obj else None
+                if origen:
                     origenes_ventas[origen] = origenes_ventas.get(origen, 0) + venta['cantidad']
             except (ValueError, KeyError):
                 continue
-        return origenes_ventas
+        return dict(sorted(origenes_ventas.items())) # Las respuestas conservan el orden: alfabético
+
+    @classmethod
+    def unidades_diarias(cls, rangos, producto=None, origen=None, dias_previos=0):
+        """
+        Retorna las unidades vendidas en cada día de cada rango usando las series diarias
+        acumuladas del índice: cada día cuesta una búsqueda binaria, sin recorrer las ventas.
+        Las listas de varias tiendas se combinan sumándolas posición por posición.
+        :param rangos: Lista de tuplas (inicio, fin) de fechas 'YYYY-MM-DD' ya validadas.
+        :param producto: Limita las unidades a un producto. Opcional.
+        :param origen: Limita las unidades a un origen. Opcional.
+        :param dias_previos: Días anteriores al inicio de cada rango que también se incluyen.
+        :return: Una lista de unidades por día (de inicio - dias_previos a fin) por cada rango.
+        """
+        with cls.lock_inventario:
+            serie = cls._indice_vigente()[1].series.serie(producto, origen)
+            resultado = []
+            for inicio, fin in rangos:
+                acumulados = [serie.hasta(d) for d in range(dia(inicio) - dias_previos - 1, dia(fin) + 1)]
+                resultado.append([actual - anterior for anterior, actual in zip(acumulados, acumulados[1:])])
+        return resultado
+
+    @staticmethod
+    def resumir_comparacion(rango_a, rango_b, unidades_a, unidades_b, producto=None, origen=None, ventana=7):
+        """
+        Arma la comparación de dos rangos a partir de sus unidades por día (ver unidades_diarias,
+        con dias_previos = ventana - 1 para la media móvil de los primeros días).
+        :return: Un diccionario con el detalle de cada rango y la diferencia de A respecto de B.
+        """
+        def detalle(rango, diarias):
+            inicio, fin = rango
+            unidades = sum(diarias[ventana - 1:])
+            dias = len(diarias) - (ventana - 1)
+            # Media móvil de los 'ventana' días que terminan en cada día del rango (ventana deslizante)
+            media_movil = {}
+            suma = sum(diarias[:ventana - 1])
+            for i, d in enumerate(range(dia(inicio), dia(fin) + 1)):
+                suma += diarias[i + ventana - 1]
+                media_movil[date.fromordinal(d).isoformat()] = round(suma / ventana, 2)
+                suma -= diarias[i]
+            return {
+                'inicio': inicio,
+                'fin': fin,
+                'dias': dias,
+                'unidades': unidades,
+                'promedio_diario': round(unidades / dias, 2),
+                'media_movil': media_movil,
+            }
+
+        a = detalle(rango_a, unidades_a)
+        b = detalle(rango_b, unidades_b)
+        diferencia = a['unidades'] - b['unidades']
+        return {
+            'producto': producto,
+            'origen': origen,
+            'ventana': ventana,
+            'rango_a': a,
+            'rango_b': b,
+            'diferencia': diferencia,
+            'variacion_porcentual': round(diferencia * 100 / b['unidades'], 2) if b['unidades'] else None,
+            'diferencia_promedio_diario': round(a['promedio_diario'] - b['promedio_diario'], 2),
+        }
+
+    @classmethod
+    def comparar_periodos(cls, rango_a, rango_b, producto=None, origen=None, ventana=7):
+        """
+        Compara las unidades vendidas en dos rangos de fechas usando las series diarias
+        acumuladas del índice (ver unidades_diarias y resumir_comparacion).
+        :param rango_a: Tupla (inicio, fin) de fechas 'YYYY-MM-DD' ya validadas.
+        :param rango_b: Tupla (inicio, fin) del rango con el que se compara A.
+        :param producto: Limita la comparación a un producto. Opcional.
+        :param origen: Limita la comparación a un origen. Opcional.
+        :param ventana: Días de la media móvil de cada rango.
+        :return: Un diccionario con el detalle de cada rango y la diferencia de A respecto de B.
+        """
+        unidades_a, unidades_b = cls.unidades_diarias([rango_a, rango_b], producto, origen, ventana - 1)
+        return cls.resumir_comparacion(rango_a, rango_b, unidades_a, unidades_b, producto, origen, ventana)
+
+    @classmethod
+    def histograma_cantidades(cls, fecha_inicio=None, fecha_fin=None, producto=None):
+        """
+        Combina los resúmenes de la cantidad por venta de cada día del rango (ver aproximados.py):
+        cuesta O(días), no O(ventas). El histograma retornado es nuevo y combinable con el de
+        otras tiendas.
+        :param fecha_inicio: Fecha de inicio del rango (formato 'YYYY-MM-DD'). Opcional.
+        :param fecha_fin: Fecha de fin del rango (formato 'YYYY-MM-DD'). Opcional.
+        :param producto: Limita el histograma a un producto. Opcional.
+        """
+        inicio = dia(fecha_inicio) if fecha_inicio else None
+        fin = dia(fecha_fin) if fecha_fin else None
+        with cls.lock_inventario:
+            return cls._indice_vigente()[1].aproximados.combinar_cantidades(producto, inicio, fin)
+
+    @staticmethod
+    def resumir_distribucion(histograma, cuantiles, producto=None):
+        """Retorna la cantidad de ventas y los cuantiles estimados de un histograma de cantidades."""
+        return {
+            'producto': producto,
+            'ventas': histograma.cantidad,
+            # Las cantidades son enteras: redondear la estimación la hace exacta para valores chicos
+            'cuantiles': {f'p{q * 100:g}': round(v) if v is not None else None
+                          for q, v in ((q, histograma.cuantil(q)) for q in cuantiles)},
+            'error_relativo': ERROR_RELATIVO,
+        }
+
+    @classmethod
+    def distribucion_cantidades(cls, cuantiles, fecha_inicio=None, fecha_fin=None, producto=None):
+        """
+        Estima los cuantiles de la cantidad por venta combinando los resúmenes aproximados
+        de cada día del rango (ver histograma_cantidades).
+        :param cuantiles: Lista de cuantiles entre 0 y 1 (ej. [0.5, 0.9, 0.99]).
+        :param fecha_inicio: Fecha de inicio del rango (formato 'YYYY-MM-DD'). Opcional.
+        :param fecha_fin: Fecha de fin del rango (formato 'YYYY-MM-DD'). Opcional.
+        :param producto: Limita la estimación a un producto. Opcional.
+        :return: Un diccionario con la cantidad de ventas y los cuantiles estimados.
+        """
+        return cls.resumir_distribucion(cls.histograma_cantidades(fecha_inicio, fecha_fin, producto),
+                                        cuantiles, producto)
+
+    @classmethod
+    def hll_clientes(cls, fecha_inicio=None, fecha_fin=None, producto=None):
+        """
+        Combina los HyperLogLog de clientes de cada día del rango (ver aproximados.py): cuesta
+        O(días), no O(ventas). El HyperLogLog retornado es nuevo y combinable con el de otras
+        tiendas (un cliente que compra en varias se cuenta una vez).
+        :param fecha_inicio: Fecha de inicio del rango (formato 'YYYY-MM-DD'). Opcional.
+        :param fecha_fin: Fecha de fin del rango (formato 'YYYY-MM-DD'). Opcional.
+        :param producto: Limita la estimación a los compradores de un producto. Opcional.
+        """
+        inicio = dia(fecha_inicio) if fecha_inicio else None
+        fin = dia(fecha_fin) if fecha_fin else None
+        with cls.lock_inventario:
+            return cls._indice_vigente()[1].aproximados.combinar_clientes(producto, inicio, fin)
+
+    @staticmethod
+    def resumir_clientes_unicos(hll, producto=None):
+        """Retorna la estimación de clientes distintos de un HyperLogLog y su error estándar relativo."""
+        return {
+            'producto': producto,
+            'clientes_unicos': hll.estimar(),
+            'error_estandar': round(1.04 / REGISTROS_HLL ** 0.5, 4),
+        }
+
+    @classmethod
+    def clientes_unicos(cls, fecha_inicio=None, fecha_fin=None, producto=None):
+        """
+        Estima la cantidad de clientes distintos combinando los HyperLogLog de cada día del
+        rango (ver hll_clientes).
+        :param fecha_inicio: Fecha de inicio del rango (formato 'YYYY-MM-DD'). Opcional.
+        :param fecha_fin: Fecha de fin del rango (formato 'YYYY-MM-DD'). Opcional.
+        :param producto: Limita la estimación a los compradores de un producto. Opcional.
+        :return: Un diccionario con la estimación y su error estándar relativo.
+        """
+        return cls.resumir_clientes_unicos(cls.hll_clientes(fecha_inicio, fecha_fin, producto), producto)
+
+    @classmethod
+    def completar_origen(cls, simular=False):
+        """
+        Completa el 'origen' de las ventas antiguas que no lo tienen, copiándolo del producto
+        vendido ('Desconocido' si el producto ya no existe o no tiene origen). Se usa una vez,
+        desde completar_origen.py, para que las estadísticas por origen no dependan del catálogo.
+        :param simular: Si es True, solo cuenta las ventas a completar sin guardar nada.
+        :return: Un diccionario con las ventas revisadas, las completadas y las que quedaron
+                 como 'Desconocido' por no encontrar el producto.
+        """
+        productos_map = cls.productos.por_nombre()
+        with cls.lock_inventario:
+            ventas = cls.cargar_con_indice()[0]
+            completadas = sin_producto = 0
+            for posicion, venta in enumerate(ventas):
+                if venta.get('origen'):
+                    continue
+                producto = productos_map.get(venta.get('producto'))
+                if not producto:
+                    sin_producto += 1
+                # Se reemplaza el registro: los publicados no se modifican (ver cargar_con_indice)
+                ventas[posicion] = dict(venta, origen=(producto or {}).get('origen') or 'Desconocido')
+                completadas += 1
+            resumen = {'revisadas': len(ventas), 'completadas': completadas, 'sin_producto': sin_producto}
+            if completadas and not simular:
+                # No se confirma el índice: los agregados por origen de los clientes se reconstruyen
+                if not cls.storage.guardar(ventas):
+                    return dict(resumen, error='No se pudieron guardar las ventas')
+                cls.storage.esperar_escrituras()
+            return resumen
+
+    @classmethod
+    def archivar(cls, dias, simular=False):
+        """
+        Compactación: mueve las ventas de más de 'dias' días al archivo frío y las reemplaza por
+        filas de resumen por día, producto y origen (ver archivo.py). Así venta.json, que se
+        reescribe con cada venta, solo guarda la ventana de retención. Las estadísticas, las
+        series, los resúmenes aproximados y los resúmenes de clientes siguen incluyendo las
+        ventas archivadas; el historial de clientes y las búsquedas por id, no.
+        :param dias: Días de retención (entero > 0): se archivan las ventas con fecha anterior a hoy - dias.
+        :param simular: Si es True, solo cuenta las ventas a archivar sin modificar nada.
+        :return: Un diccionario con la fecha de corte y las ventas archivadas y restantes,
+                 con 'error' si no se pudo completar.
+        """
+        corte = (date.today() - timedelta(days=dias)).isoformat()
+        with cls.lock_inventario:
+            ventas = cls.cargar_con_indice()[0]
+            antiguas, recientes = [], []
+            for venta in ventas:
+                try:
+                    anterior = dia(venta.get('fecha')) < dia(corte)
+                except (TypeError, ValueError):
+                    anterior = False # Sin fecha válida no se puede resumir por día: queda en venta.json
+                (antiguas if anterior else recientes).append(venta)
+            resumen = {'corte': corte, 'archivadas': len(antiguas), 'restantes': len(recientes)}
+            if not antiguas or simular:
+                return resumen
+            anterior = cls.archivo.estado()
+            estado = cls.archivo.preparar(antiguas)
+            if estado is None:
+                return dict(resumen, error='No se pudo escribir el archivo de ventas')
+            # Se espera el resultado de la escritura aunque sea agrupada: si el lote fallara
+            # después de confirmar, volvería venta.json con las ventas ya resumidas
+            if not cls.storage.guardar(recientes, esperar=True):
+                cls.archivo.restaurar(anterior)
+                return dict(resumen, error='No se pudieron guardar las ventas')
+            cls.archivo.confirmar(estado)
+            cls.archivo.limpiar_pendientes()
+            # No se confirma el índice: se reconstruye con las filas de resumen nuevas
+            return dict(resumen, filas_resumen=len(estado['filas']))
+
+    @classmethod
+    def importar(cls, filas):
+        """
+        Importa ventas históricas en lote (ver importar_en_lotes). Cada fila se valida con
+        las mismas reglas que crear() y el producto debe existir, pero no se descuenta stock:
+        son ventas ya ocurridas. Acepta 'producto' como nombre o como dict con 'nombre',
+        y 'fecha' opcional (YYYY-MM-DD, por defecto hoy).
+        :param filas: Iterable de (número_de_fila, datos, error_de_lectura).
+        :return: Una tupla (reporte, éxito).
+        """
+        productos_map = cls.productos.por_nombre()
+        hoy = datetime.now().strftime('%Y-%m-%d')
+
+        def preparar(datos):
+            if isinstance(datos, dict) and isinstance(datos.get('producto'), str):
+                datos = dict(datos, producto={'nombre': datos['producto']})
+            error = cls.validar(datos)
+            if error:
+                return None, error
+            nombre_producto = datos['producto']['nombre']
+            producto = productos_map.get(nombre_producto)
+            if not producto:
+                return None, f'Producto "{nombre_producto}" no encontrado'
+            fecha = datos.get('fecha') or hoy
+            try:
+                datetime.strptime(fecha, '%Y-%m-%d')
+            except (TypeError, ValueError):
+                return None, 'Fecha inválida: se espera el formato YYYY-MM-DD'
+            return {
+                'producto': nombre_producto,
+                'cantidad': datos['cantidad'],
+                'cliente': datos.get('cliente') or 'Sin nombre',
+                'origen': producto.get('origen', 'Desconocido'),
+                'fecha': fecha,
+            }, None
+
+        def asignar_ids(lote):
+            # Con lock_inventario tomado: los ids siguen a los de la última versión
+            indice = cls.cargar_con_indice()[1]
+            for posicion, venta in enumerate(lote):
+                lote[posicion] = {'id': indice.siguiente_id + posicion, **venta}
+            indice.siguiente_id += len(lote)
+
+        return importar_en_lotes(cls.storage, filas, preparar, cls.lock_inventario, completar=asignar_ids)
+
+Producto.ventas = Venta
+
+
+# --- TIENDAS (SUCURSALES) ---
+class Tienda:
+    """
+    Una tienda (sucursal) con su propia carpeta de datos. Sus modelos son subclases de
+    Producto, Persona y Venta con almacenamientos, libro de inventario, lock de inventario e
+    índice de ventas propios: una venta en una sucursal nunca espera el lock ni las
+    escrituras de otra, así agregar sucursales no encarece el cobro en ninguna.
+    La tienda principal usa las clases base, sobre DATOS_DIR.
+    """
+    def __init__(self, nombre, datos_dir, productos, personas, ventas):
+        self.nombre = nombre
+        self.datos_dir = datos_dir
+        self.productos = productos
+        self.personas = personas
+        self.ventas = ventas
+        productos.inventario.bajo_stock.suscribir(functools.partial(notificar_bajo_stock, tienda=nombre))
+
+    @classmethod
+    def sucursal(cls, nombre, datos_dir):
+        """
+        Crea una sucursal con sus propios modelos sobre la carpeta de datos indicada
+        (se crea al guardar el primer dato).
+        """
+        class ProductoSucursal(Producto):
+            storage = JsonStorage(os.path.join(datos_dir, 'product.json'))
+            inventario = LibroInventario(os.path.join(datos_dir, 'movimientos_inventario.ndjson'),
+                                         os.path.join(datos_dir, 'stock_snapshot.json'),
+                                         MOVIMIENTOS_POR_SNAPSHOT, umbral_bajo_stock=UMBRAL_BAJO_STOCK)
+            _mapa = None
+
+        class PersonaSucursal(Persona):
+            storage = JsonStorage(os.path.join(datos_dir, 'person.json'))
+            lock_personas = threading.Lock()
+
+        class VentaSucursal(Venta):
+            storage = JsonStorage(os.path.join(datos_dir, 'venta.json'))
+            archivo = ArchivoVentas(os.path.join(datos_dir, 'archivo'), os.path.join(datos_dir, 'venta_archivo.json'),
+                                    publicar=functools.partial(JsonStorage.publicar,
+                                                               os.path.join(datos_dir, 'venta_archivo.json')))
+            productos = ProductoSucursal
+            lock_inventario = threading.Lock()
+            _indice = None
+            _indice_version = None
+
+        ProductoSucursal.ventas = VentaSucursal
+        return cls(nombre, datos_dir, ProductoSucursal, PersonaSucursal, VentaSucursal)
+
+    def archivos(self):
+        """Retorna las rutas de los archivos de datos de la tienda."""
+        return [self.productos.storage.filepath, self.personas.storage.filepath, self.ventas.storage.filepath]
+
+    def precargar(self):
+        """
+        Carga los datos de la tienda y construye su índice de ventas (ver precargar). Con
+        TIENDA_RETENCION_DIAS, antes archiva las ventas más antiguas (ver Venta.archivar).
+        """
+        resumen = {}
+        if RETENCION_DIAS > 0:
+            resumen['archivadas'] = self.ventas.archivar(RETENCION_DIAS)['archivadas']
+        resumen.update({
+            'productos': len(self.productos.todos()),
+            'personas': len(self.personas.todos()),
+            'ventas': self.ventas.asegurar_ids(),
+        })
+        return resumen
+
+    def cerrar(self):
+        """Espera las escrituras pendientes de la tienda y guarda una foto de su stock (ver cerrar)."""
+        for storage in (self.productos.storage, self.personas.storage, self.ventas.storage):
+            storage.esperar_escrituras()
+        # Con una foto al día, el próximo inicio no necesita reaplicar movimientos
+        if self.productos.inventario.abierto:
+            self.productos.inventario.guardar_snapshot()
+
+
+def cargar_tiendas(sucursales):
+    """
+    Crea el registro de tiendas: la principal (clases base, DATOS_DIR) más las sucursales.
+    :param sucursales: Texto 'nombre[=carpeta],...' (ver TIENDA_SUCURSALES).
+    :return: Un diccionario {nombre: Tienda}.
+    :raises ValueError: Si un nombre es inválido o está repetido.
+    """
+    tiendas = {TIENDA_PRINCIPAL: Tienda(TIENDA_PRINCIPAL, DATOS_DIR, Producto, Persona, Venta)}
+    for entrada in sucursales.split(','):
+        nombre, _, carpeta = (parte.strip() for parte in entrada.partition('='))
+        if not nombre:
+            continue
+        if not nombre.replace('-', '').replace('_', '').isalnum() or nombre == TODAS_LAS_TIENDAS:
+            raise ValueError(f'Nombre de tienda inválido: "{nombre}"')
+        if nombre in tiendas:
+            raise ValueError(f'Tienda repetida: "{nombre}"')
+        tiendas[nombre] = Tienda.sucursal(nombre, carpeta or os.path.join(DATOS_DIR, 'tiendas', nombre))
+    return tiendas
+
+TIENDAS = cargar_tiendas(TIENDA_SUCURSALES)
+# Calcula los agregados parciales de cada tienda en las estadísticas de 'todas' (ver calcular_en_tiendas)
+ejecutor_tiendas = ThreadPoolExecutor(max_workers=HILOS_AGREGACION, thread_name_prefix='agregacion')
+
+
+class PrefijoTienda:
+    """
+    Middleware WSGI para las rutas con prefijo /tiendas/<nombre>/...: quita el prefijo (las
+    rutas de la API no cambian) y deja el nombre de la tienda en el entorno de la solicitud
+    (ver elegir_tienda).
+    """
+    PREFIJO = '/tiendas/'
+
+    def __init__(self, aplicacion):
+        self.aplicacion = aplicacion
+
+    def __call__(self, environ, start_response):
+        ruta = environ.get('PATH_INFO', '')
+        if ruta.startswith(self.PREFIJO):
+            nombre, _, resto = ruta[len(self.PREFIJO):].partition('/')
+            if nombre:
+                environ['tienda.nombre'] = nombre
+                environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + self.PREFIJO + nombre
+                environ['PATH_INFO'] = '/' + resto
+        return self.aplicacion(environ, start_response)
+
+app.wsgi_app = PrefijoTienda(app.wsgi_app)
+
+
+# --- IMPORTACIÓN MASIVA ---
+def leer_filas(flujo, formato, campos_enteros=()):
+    """
+    Lee filas de un flujo NDJSON (un objeto JSON por línea) o CSV (con encabezado) sin
+    cargarlo completo en memoria.
+    :param flujo: Flujo binario iterable por líneas (ej. request.stream).
+    :param formato: 'ndjson' o 'csv'.
+    :param campos_enteros: Columnas CSV que se convierten a entero (ej. 'stock', 'cantidad').
+    :return: Un generador de (número_de_fila, datos_o_None, error_o_None).
+    """
+    if formato == 'csv':
+        lineas = (linea.decode('utf-8-sig', errors='replace') for linea in flujo)
+        lector = csv.DictReader(lineas)
+        for fila in lector:
+            datos = {clave: valor for clave, valor in fila.items() if clave is not None and valor not in (None, '')}
+            for campo in campos_enteros:
+                if isinstance(datos.get(campo), str) and datos[campo].strip().lstrip('-').isdigit():
+                    datos[campo] = int(datos[campo])
+            yield lector.line_num, datos, None
+        return
+
+    for numero, linea in enumerate(flujo, start=1):
+        if not linea.strip():
+            continue
+        try:
+            yield numero, json_desde_bytes(linea), None
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            yield numero, None, 'JSON inválido'
+
+def importar_en_lotes(storage, filas, preparar, lock, clave=None, completar=None, confirmar=None, tamano_lote=None):
+    """
+    Aplica filas sobre un almacenamiento haciendo una sola escritura (commit) cada
+    tamano_lote filas válidas, en lugar de una escritura por fila. Si se indica 'clave',
+    las filas cuyo valor de clave ya existe actualizan el registro (upsert); si no, se agregan.
+    Las filas se leen y validan sin lock (el cuerpo puede tardar en llegar); el lock del
+    modelo se toma solo para combinar cada lote con la última versión guardada y escribirlo
+    (ver guardar_lote), así una importación no frena las ventas ni pisa sus escrituras.
+    Los lotes ya escritos quedan guardados aunque un lote posterior falle.
+    :param storage: JsonStorage de destino.
+    :param filas: Iterable de (número_de_fila, datos, error_de_lectura).
+    :param preparar: Función datos -> (registro, None) o (None, mensaje_de_error).
+    :param lock: Lock que serializa las escrituras del modelo (ej. lock_inventario).
+    :param clave: Campo único para el upsert (ej. 'nombre'). Opcional.
+    :param completar: Función lote -> None que completa los registros con el lock tomado,
+                      antes de combinarlos (ej. asignar ids). Opcional.
+    :param confirmar: Función lote -> mensaje_de_error_o_None que se ejecuta con el lock
+                      tomado después de guardar el lote (ej. ajustes de inventario). Opcional.
+    :param tamano_lote: Filas por escritura (por defecto TAMANO_LOTE_IMPORTACION).
+    :return: Una tupla (reporte, éxito). El reporte incluye el detalle de errores por fila.
+    """
+    tamano_lote = tamano_lote or TAMANO_LOTE_IMPORTACION
+    reporte = {'procesadas': 0, 'creadas': 0, 'actualizadas': 0, 'con_error': 0,
+               'lotes_guardados': 0, 'errores': []}
+    lote = []
+    for numero, datos, error in filas:
+        reporte['procesadas'] += 1
+        if error is None:
+            registro, error = preparar(datos)
+        if error:
+            reporte['con_error'] += 1
+            if len(reporte['errores']) < MAX_ERRORES_REPORTADOS:
+                reporte['errores'].append({'fila': numero, 'error': error})
+            continue
+        lote.append(registro)
+        if len(lote) >= tamano_lote:
+            error = guardar_lote(storage, lote, lock, reporte, clave, completar, confirmar)
+            if error:
+                reporte['error'] = f'{error}; los lotes anteriores quedaron guardados'
+                return reporte, False
+            lote = []
+    if lote:
+        error = guardar_lote(storage, lote, lock, reporte, clave, completar, confirmar)
+        if error:
+            reporte['error'] = f'{error}; los lotes anteriores quedaron guardados'
+            return reporte, False
+    return reporte, True
+
+def guardar_lote(storage, lote, lock, reporte, clave=None, completar=None, confirmar=None):
+    """
+    Combina un lote de registros ya validados con la última versión del almacenamiento
+    (no con la que había al empezar la importación) y lo guarda, con el lock tomado solo
+    durante la combinación y la escritura. Actualiza el reporte (ver importar_en_lotes).
+    :return: El mensaje de error, o None si el lote se guardó.
+    """
+    with lock:
+        if completar:
+            completar(lote)
+        registros = storage.cargar(copiar_registros=False) # Se reemplazan registros, no se modifican
+        indice = {r.get(clave): i for i, r in enumerate(registros)} if clave else {}
+        creadas = actualizadas = 0
+        for registro in lote:
+            if clave and registro[clave] in indice:
+                posicion = indice[registro[clave]]
+                registros[posicion] = {**registros[posicion], **registro}
+                actualizadas += 1
+            else:
+                if clave:
+                    indice[registro[clave]] = len(registros)
+                registros.append(registro)
+                creadas += 1
+        if not storage.guardar(registros):
+            return 'No se pudo guardar un lote'
+        reporte['creadas'] += creadas
+        reporte['actualizadas'] += actualizadas
+        reporte['lotes_guardados'] += 1
+        return confirmar(lote) if confirmar else None
+
+
+# --- MÉTRICAS DE SOLICITUDES ---
+def clasificar_solicitud(metodo, regla):
+    """
+    Retorna la clase de prioridad de una solicitud (ver admision.CLASES), o None si no pasa
+    por el control de admisión: las escrituras (ventas, tickets, altas y cambios) van primero,
+    las consultas puntuales después y los reportes (estadísticas, listas completas,
+    importaciones y archivado) al final.
+    :param metodo: Método HTTP.
+    :param regla: Regla de la ruta (ej. '/productos/<nombre>') o None.
+    """
+    if regla in RUTAS_SIN_ADMISION:
+        return None
+    if regla and (regla.startswith('/estadisticas') or regla.startswith('/importar') or regla == '/admin/archivar'
+                  or (metodo == 'GET' and regla in RUTAS_LISTAS_COMPLETAS)):
+        return 'reporte'
+    if metodo in ('POST', 'PUT', 'PATCH', 'DELETE'):
+        return 'escritura'
+    return 'consulta'
+
+@app.before_request
+def admitir_solicitud():
+    """
+    Aplica el control de admisión (ver admision.py) antes que cualquier otro trabajo: si el
+    servidor está saturado para la clase de la solicitud, o el cliente superó su límite,
+    responde de inmediato 503 o 429 con Retry-After.
+    """
+    if not control_admision.activo:
+        return None
+    clase = clasificar_solicitud(request.method, request.url_rule.rule if request.url_rule else None)
+    if clase is None:
+        return None
+    try:
+        g.admision = (clase, control_admision.admitir(clase, request.remote_addr))
+    except Rechazo as rechazo:
+        metricas.registrar_admision(clase, rechazo.motivo)
+        mensaje = ('Demasiadas solicitudes de este cliente' if rechazo.codigo == 429
+                   else 'Servidor ocupado, reintente más tarde')
+        response = jsonify({'error': mensaje, 'clase': clase, 'motivo': rechazo.motivo})
+        response.status_code = rechazo.codigo
+        response.headers['Retry-After'] = encabezado_retry_after(rechazo.reintentar_s)
+        return response
+    metricas.registrar_admision(clase)
+    return None
+
+@app.teardown_request
+def liberar_admision(error=None):
+    """Libera el lugar de la solicitud en el control de admisión, aunque haya fallado."""
+    admision = g.pop('admision', None)
+    if admision is not None:
+        control_admision.liberar(*admision)
+
+@app.teardown_request
+def descartar_perfil(error=None):
+    """Detiene el perfil de una solicitud que falló antes de guardarlo, para no bloquear el perfilado."""
+    perfil = g.pop('perfil', None)
+    if perfil is not None:
+        perfilador.descartar(perfil)
+
+@app.before_request
+def elegir_tienda():
+    """
+    Elige la tienda de la solicitud: la del prefijo /tiendas/<nombre> (ver PrefijoTienda), la
+    del encabezado X-Tienda o la principal. Con 'todas', las estadísticas se calculan en todas
+    las tiendas (ver calcular_en_tiendas); las demás rutas requieren una tienda concreta.
+    """
+    nombre = request.environ.get('tienda.nombre') or request.headers.get('X-Tienda') or TIENDA_PRINCIPAL
+    if nombre == TODAS_LAS_TIENDAS:
+        regla = request.url_rule.rule if request.url_rule else ''
+        if request.method == 'GET' and regla.startswith('/estadisticas'):
+            g.tienda = None
+            return None
+        return jsonify({'error': f'La tienda "{TODAS_LAS_TIENDAS}" solo se admite en las estadísticas'}), 400
+    g.tienda = TIENDAS.get(nombre)
+    if g.tienda is None:
+        return jsonify({'error': f'Tienda "{nombre}" no encontrada'}), 404
+    return None
+
+@app.before_request
+def fijar_instantanea():
+    """
+    Fija la versión publicada de los datos para toda la solicitud (ver JsonStorage.leer):
+    las consultas largas (ej. estadísticas) leen una vista consistente sin bloquear
+    a las escrituras, que publican versiones nuevas en paralelo.
+    """
+    g.instantanea = JsonStorage.instantanea()
+
+@app.before_request
+def iniciar_metricas_solicitud():
+    """
+    Inicia la medición de la solicitud en curso (ver metricas.py) y, si corresponde,
+    su perfilado con cProfile (ver perfilado.py).
+    """
+    metricas.iniciar_solicitud()
+    regla = request.url_rule.rule if request.url_rule else None
+    if perfilador.debe_perfilar(regla, request.headers):
+        g.perfil = perfilador.iniciar()
+
+@app.after_request
+def registrar_metricas_solicitud(response):
+    """
+    Registra la latencia por ruta, método y código, los tamaños de solicitud y respuesta,
+    y el tiempo por fase (almacenamiento, serialización y cómputo).
+    """
+    perfil = g.pop('perfil', None)
+    archivo_perfil = perfilador.terminar(perfil, request.method, request.url_rule and request.url_rule.rule) if perfil else None
+    fases = metricas.terminar_solicitud()
+    if fases is None:
+        return response
+    # Se usa la regla de la ruta (ej. '/productos/<nombre>') para no crear una serie por cada URL
+    ruta = request.url_rule.rule if request.url_rule else '<sin_ruta>'
+    if perfilador.es_lenta(fases['total']):
+        registrar_solicitud_lenta(ruta, response.status_code, fases, archivo_perfil)
+    etiquetas = (('ruta', ruta), ('metodo', request.method))
+    metricas.registro.observar('tienda_http_solicitudes_duracion_segundos', fases['total'],
+                               etiquetas + (('codigo', str(response.status_code)),))
+    metricas.registro.observar('tienda_http_solicitud_bytes', request.content_length or 0, etiquetas)
+    tamano_respuesta = response.calculate_content_length()
+    if tamano_respuesta is not None:
+        metricas.registro.observar('tienda_http_respuesta_bytes', tamano_respuesta, etiquetas)
+    for fase in ('almacenamiento', 'serializacion', 'computo'):
+        metricas.registro.observar('tienda_http_fase_segundos', fases[fase], etiquetas + (('fase', fase),))
+    return response
+
+def _codificacion_aceptada(encabezado):
+    """
+    Elige la codificación de compresión según el encabezado Accept-Encoding.
+    :return: 'br', 'gzip' o None.
+    """
+    aceptadas = set()
+    for parte in (encabezado or '').split(','):
+        nombre, _, parametros = parte.partition(';')
+        calidad = 1.0
+        clave, _, valor = parametros.strip().partition('=')
+        if clave.strip() == 'q':
+            try:
+                calidad = float(valor)
+            except ValueError:
+                calidad = 0.0
+        if calidad > 0:
+            aceptadas.add(nombre.strip().lower())
+    if brotli is not None and 'br' in aceptadas:
+        return 'br'
+    if 'gzip' in aceptadas or '*' in aceptadas:
+        return 'gzip'
+    return None
+
+@app.after_request
+def comprimir_respuesta(response):
+    """
+    Comprime con brotli o gzip (según Accept-Encoding) las respuestas de al menos
+    COMPRESION_MIN_BYTES. Se registra después del hook de métricas, por lo que se
+    ejecuta antes que él y las métricas reflejan los bytes realmente enviados.
+    """
+    response.vary.add('Accept-Encoding')
+    if (not COMPRESION_MIN_BYTES or response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers):
+        return response
+    codificacion = _codificacion_aceptada(request.headers.get('Accept-Encoding'))
+    if codificacion is None:
+        return response
+    cuerpo = response.get_data()
+    if len(cuerpo) < COMPRESION_MIN_BYTES:
+        return response
+    if codificacion == 'br':
+        comprimido = brotli.compress(cuerpo, quality=4)
+    else:
+        comprimido = gzip.compress(cuerpo, compresslevel=NIVEL_GZIP)
+    response.set_data(comprimido)
+    response.headers['Content-Encoding'] = codificacion
+    return response
+
+@app.after_request
+def esperar_lotes_pendientes(response):
+    """
+    Con escritura agrupada, retiene la respuesta hasta que las escrituras de la solicitud
+    estén en disco (ya sin los locks de los modelos, así otras solicitudes se suman al lote).
+    Si un lote no se pudo guardar, la respuesta pasa a ser un error 500: sus versiones ya se
+    descartaron (ver JsonStorage._descartar_versiones) y aquí se revierten los movimientos de
+    inventario de la solicitud, así no queda nada de una operación que respondió error.
+    Se registra al final para ejecutarse antes que la compresión y las métricas.
+    """
+    movimientos = g.pop('movimientos_diferidos', [])
+    for lote in g.pop('lotes_pendientes', []):
+        if not lote.esperar(GRUPO_COMMIT_TIMEOUT_S):
+            # Solo se revierte si el lote terminó con error (tras un timeout el resultado se desconoce)
+            if isinstance(lote, LoteEscritura) and lote.terminado.is_set():
+                for modelo, registrados in movimientos:
+                    modelo.revertir_movimientos(registrados)
+            response = jsonify({'error': 'No se pudieron guardar los cambios en disco'})
+            response.status_code = 500
+            break
+    return response
+
+def registrar_solicitud_lenta(ruta, codigo, fases, archivo_perfil=None):
+    """
+    Agrega la solicitud en curso al registro de solicitudes lentas, con sus parámetros,
+    el tamaño de los archivos de datos y el desglose de tiempos (en milisegundos).
+    """
+    tienda = g.get('tienda')
+    tiendas = [tienda] if tienda is not None else list(TIENDAS.values())
+    tamanos = {}
+    for tienda in tiendas:
+        for archivo in tienda.archivos():
+            # Con varias tiendas (estadísticas de 'todas') se antepone el nombre de cada una
+            clave = os.path.basename(archivo) if len(tiendas) == 1 else f'{tienda.nombre}/{os.path.basename(archivo)}'
+            try:
+                tamanos[clave] = os.path.getsize(archivo)
+            except OSError:
+                tamanos[clave] = None
+    perfilador.registrar_lenta({
+        'fecha': datetime.now().isoformat(timespec='milliseconds'),
+        'metodo': request.method,
+        'ruta': ruta,
+        'url': request.full_path,
+        'parametros': request.args.to_dict(),
+        'codigo': codigo,
+        'bytes_solicitud': request.content_length or 0,
+        'bytes_almacenamiento': fases['bytes_almacenamiento'],
+        'tamano_archivos': tamanos,
+        'total_ms': round(fases['total'] * 1000, 3),
+        'almacenamiento_ms': round(fases['almacenamiento'] * 1000, 3),
+        'computo_ms': round(fases['computo'] * 1000, 3),
+        'serializacion_ms': round(fases['serializacion'] * 1000, 3),
+        'perfil': archivo_perfil,
+    })
+
+@app.route('/admin/solicitudes_lentas', methods=['GET'])
+def get_solicitudes_lentas():
+    """
+    Endpoint para consultar las últimas solicitudes lentas registradas (incluyen rutas y
+    parámetros, con nombres de clientes). Requiere el encabezado 'X-Tienda-Admin' con el
+    token de TIENDA_TOKEN_ADMIN; si no está definido, el endpoint está deshabilitado.
+    Responde a: GET /admin/solicitudes_lentas
+    Retorna: Una lista JSON de solicitudes lentas (la más reciente primero), o 403 si no está autorizado.
+    """
+    if not es_administrador(request.headers):
+        return jsonify({'error': 'No autorizado'}), 403
+    return jsonify(perfilador.lentas())
+
+def es_administrador(encabezados):
+    """Indica si la solicitud trae el token de TIENDA_TOKEN_ADMIN en 'X-Tienda-Admin' (False si no hay token)."""
+    return token_admin_valido(encabezados, TOKEN_ADMIN)
+
+@app.route('/admin/archivar', methods=['POST'])
+def post_archivar():
+    """
+    Endpoint para archivar las ventas antiguas de la tienda (ver Venta.archivar).
+    Requiere el encabezado 'X-Tienda-Admin' con el token de TIENDA_TOKEN_ADMIN; si no está
+    definido, el endpoint está deshabilitado (use archivar.py con el servidor detenido).
+    Parámetros opcionales: 'dias' (por defecto TIENDA_RETENCION_DIAS) y 'simular=1' para
+    solo contar las ventas que se archivarían.
+    Responde a: POST /admin/archivar?dias=365
+    Retorna: La fecha de corte y las ventas archivadas y restantes con código 200 (OK),
+             400 si no hay días de retención, 403 si no está autorizado o 500 si no se pudo completar.
+    """
+    if not es_administrador(request.headers):
+        return jsonify({'error': 'No autorizado'}), 403
+    dias, error = _parametro_entero_positivo('dias')
+    if error:
+        return jsonify({'error': error}), 400
+    dias = dias or RETENCION_DIAS
+    if dias <= 0:
+        return jsonify({'error': "Indique el parámetro 'dias' o defina TIENDA_RETENCION_DIAS"}), 400
+    simular = request.args.get('simular', '').lower() in ('1', 'true', 'si')
+    resumen = g.tienda.ventas.archivar(dias, simular=simular)
+    return jsonify(dict(resumen, simulado=simular)), 500 if 'error' in resumen else 200
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Endpoint de métricas en formato de texto de Prometheus.
+    Responde a: GET /metrics
+    Retorna: Histogramas de latencia y tamaños por ruta, solicitudes en curso,
+             tiempos y bytes de JsonStorage.cargar/guardar por archivo y el estado
+             del control de admisión (en curso, en cola y rechazos por clase).
+    """
+    estado = control_admision.estado()
+    extras = [
+        ('tienda_admision_en_curso', 'gauge', 'Solicitudes admitidas en curso, por clase.',
+         [((('clase', clase),), datos['en_curso']) for clase, datos in estado.items()]),
+        ('tienda_admision_en_cola', 'gauge', 'Solicitudes esperando en la cola de admisión, por clase.',
+         [((('clase', clase),), datos['en_cola']) for clase, datos in estado.items()]),
+    ]
+    return metricas.exportar(extras), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
 
 
 # --- RUTAS FLASK (ENDPOINTS DE LA API) ---
 
+# --- Endpoints para TIENDAS ---
+@app.route('/tiendas', methods=['GET'])
+def get_tiendas():
+    """
+    Endpoint para obtener las tiendas que atiende el backend. Cualquier ruta de la API se puede
+    dirigir a una tienda con el prefijo /tiendas/<nombre> o el encabezado X-Tienda; las
+    estadísticas también aceptan la tienda 'todas'.
+    Responde a: GET /tiendas
+    Retorna: Una lista JSON de {'nombre', 'principal'} y código 200 (OK).
+    """
+    return jsonify([{'nombre': nombre, 'principal': nombre == TIENDA_PRINCIPAL} for nombre in TIENDAS])
+
 # --- Endpoints para PRODUCTOS ---
 @app.route('/productos', methods=['GET'])
 def get_productos():
@@ -376,7 +2484,7 @@ def get_productos():
     Responde a: GET /productos
     Retorna: Una lista JSON de todos los productos y un código de estado 200 (OK).
     """
-    return jsonify(Producto.todos())
+    return jsonify(g.tienda.productos.todos())
 
 @app.route('/productos', methods=['POST'])
 def post_producto():
@@ -386,9 +2494,52 @@ def post_producto():
     Responde a: POST /productos
     Retorna: El producto creado y código 201 (Created), o un mensaje de error y un código apropiado.
     """
-    resultado, codigo = Producto.crear(request.json)
+    resultado, codigo = g.tienda.productos.crear(request.json)
     return jsonify(resultado), codigo
 
+@app.route('/productos/sugerir', methods=['GET'])
+def get_sugerir_productos():
+    """
+    Endpoint de autocompletado de nombres de productos, sin distinguir tildes ni mayúsculas.
+    Parámetros en la URL: 'q' (texto escrito) y 'limit' (opcional, por defecto 10, máximo 50).
+    Responde a: GET /productos/sugerir?q=texto&limit=10
+    Retorna: Una lista JSON de nombres: primero los que empiezan con 'q' y luego los que la contienen.
+    """
+    limite, error = _parametro_entero_positivo('limit')
+    if error:
+        return jsonify({'error': error}), 400
+    return jsonify(g.tienda.productos.sugerir(request.args.get('q', ''), min(limite or LIMITE_SUGERENCIAS, MAX_SUGERENCIAS)))
+
+@app.route('/productos/bajo_stock', methods=['GET'])
+def get_productos_bajo_stock():
+    """
+    Endpoint para obtener los productos que se están agotando, de menor a mayor stock.
+    Parámetros opcionales: 'umbral' (stock máximo a incluir, por defecto TIENDA_UMBRAL_BAJO_STOCK)
+    y 'limit' (por defecto 50).
+    Responde a: GET /productos/bajo_stock
+    Retorna: Una lista JSON de {'nombre', 'stock', 'stock_minimo'} y código 200 (OK).
+    """
+    umbral = request.args.get('umbral')
+    if umbral is not None:
+        try:
+            umbral = int(umbral)
+        except ValueError:
+            return jsonify({'error': "El parámetro 'umbral' debe ser un entero"}), 400
+    limite, error = _parametro_entero_positivo('limit')
+    if error:
+        return jsonify({'error': error}), 400
+    return jsonify(g.tienda.productos.bajo_stock(umbral, limite))
+
+@app.route('/productos/bajo_stock/eventos', methods=['GET'])
+def get_eventos_bajo_stock():
+    """
+    Endpoint para obtener los últimos eventos de bajo stock (productos que bajaron hasta su
+    umbral de reposición), del más reciente al más antiguo.
+    Responde a: GET /productos/bajo_stock/eventos
+    Retorna: Una lista JSON de {'producto', 'stock', 'umbral', 'hora'} y código 200 (OK).
+    """
+    return jsonify(g.tienda.productos.libro().bajo_stock.ultimos_eventos())
+
 @app.route('/productos/<nombre>', methods=['GET'])
 def get_producto(nombre):
     """
@@ -396,7 +2547,7 @@ def get_producto(nombre):
     Responde a: GET /productos/<nombre_del_producto>
     Retorna: El producto encontrado y código 200 (OK), o un error 404 (Not Found).
     """
-    producto = Producto.buscar(nombre)
+    producto = g.tienda.productos.buscar(nombre)
     if producto:
         return jsonify(producto)
     return jsonify({'error': f'Producto "{nombre}" no encontrado'}), 404
@@ -409,7 +2560,7 @@ def put_producto(nombre):
     Responde a: PUT /productos/<nombre_del_producto>
     Retorna: El producto actualizado y código 200 (OK), o un error 404 (Not Found).
     """
-    resultado, codigo = Producto.actualizar(nombre, request.json)
+    resultado, codigo = g.tienda.productos.actualizar(nombre, request.json)
     return jsonify(resultado), codigo
 
 @app.route('/productos/<nombre>', methods=['DELETE'])
@@ -419,9 +2570,45 @@ def delete_producto(nombre):
     Responde a: DELETE /productos/<nombre_del_producto>
     Retorna: Un mensaje de éxito y código 200 (OK), o un error 404 (Not Found).
     """
-    resultado, codigo = Producto.eliminar(nombre)
+    resultado, codigo = g.tienda.productos.eliminar(nombre)
     return jsonify(resultado), codigo
 
+@app.route('/productos/<nombre>/reabastecer', methods=['POST'])
+def post_reabastecer_producto(nombre):
+    """
+    Endpoint para registrar la entrada de mercadería de un producto.
+    Requiere un cuerpo JSON con 'cantidad' (int > 0).
+    Responde a: POST /productos/<nombre_del_producto>/reabastecer
+    Retorna: El movimiento de inventario registrado y código 201 (Created), o un mensaje de error.
+    """
+    datos = request.get_json(silent=True) or {}
+    resultado, codigo = g.tienda.productos.reabastecer(nombre, datos.get('cantidad'))
+    return jsonify(resultado), codigo
+
+@app.route('/productos/<nombre>/stock', methods=['GET'])
+def get_stock_producto(nombre):
+    """
+    Endpoint para consultar el stock de un producto, actual o al final de una fecha.
+    Parámetros opcionales: 'fecha' (YYYY-MM-DD).
+    Responde a: GET /productos/<nombre_del_producto>/stock
+    Retorna: El stock y código 200 (OK), o un mensaje de error y un código apropiado.
+    """
+    resultado, codigo = g.tienda.productos.stock_en(nombre, request.args.get('fecha'))
+    return jsonify(resultado), codigo
+
+@app.route('/productos/<nombre>/movimientos', methods=['GET'])
+def get_movimientos_producto(nombre):
+    """
+    Endpoint para consultar los últimos movimientos de inventario de un producto.
+    Parámetros opcionales: 'limit' (por defecto 100).
+    Responde a: GET /productos/<nombre_del_producto>/movimientos
+    Retorna: Una lista JSON de movimientos (venta, cancelacion, reabastecimiento o ajuste) y código 200 (OK).
+    """
+    limite, error = _parametro_entero_positivo('limit')
+    if error:
+        return jsonify({'error': error}), 400
+    return jsonify(g.tienda.productos.movimientos(nombre, limite or 100))
+
 # --- Endpoints para PERSONAS ---
 @app.route('/personas', methods=['GET'])
 def get_personas():
@@ -430,7 +2617,7 @@ def get_personas():
     Responde a: GET /personas
     Retorna: Una lista JSON de todas las personas y un código de estado 200 (OK).
     """
-    return jsonify(Persona.todos())
+    return jsonify(g.tienda.personas.todos())
 
 @app.route('/personas', methods=['POST'])
 def post_persona():
@@ -440,9 +2627,22 @@ def post_persona():
     Responde a: POST /personas
     Retorna: La persona creada y código 201 (Created), o un mensaje de error y un código apropiado.
     """
-    resultado, codigo = Persona.crear(request.json)
+    resultado, codigo = g.tienda.personas.crear(request.json)
     return jsonify(resultado), codigo
 
+@app.route('/personas/sugerir', methods=['GET'])
+def get_sugerir_personas():
+    """
+    Endpoint de autocompletado de nombres de personas, sin distinguir tildes ni mayúsculas.
+    Parámetros en la URL: 'q' (texto escrito) y 'limit' (opcional, por defecto 10, máximo 50).
+    Responde a: GET /personas/sugerir?q=texto&limit=10
+    Retorna: Una lista JSON de nombres: primero los que empiezan con 'q' y luego los que la contienen.
+    """
+    limite, error = _parametro_entero_positivo('limit')
+    if error:
+        return jsonify({'error': error}), 400
+    return jsonify(g.tienda.personas.sugerir(request.args.get('q', ''), min(limite or LIMITE_SUGERENCIAS, MAX_SUGERENCIAS)))
+
 @app.route('/personas/<nombre>', methods=['GET'])
 def get_persona(nombre):
     """
@@ -450,7 +2650,7 @@ def get_persona(nombre):
     Responde a: GET /personas/<nombre_de_la_persona>
     Retorna: La persona encontrada y código 200 (OK), o un error 404 (Not Found).
     """
-    persona = Persona.buscar(nombre)
+    persona = g.tienda.personas.buscar(nombre)
     if persona:
         return jsonify(persona)
     return jsonify({'error': f'Persona "{nombre}" no encontrada'}), 404
@@ -463,7 +2663,7 @@ def put_persona(nombre):
     Responde a: PUT /personas/<nombre_de_la_persona>
     Retorna: La persona actualizada y código 200 (OK), o un error 404 (Not Found).
     """
-    resultado, codigo = Persona.actualizar(nombre, request.json)
+    resultado, codigo = g.tienda.personas.actualizar(nombre, request.json)
     return jsonify(resultado), codigo
 
 @app.route('/personas/<nombre>', methods=['DELETE'])
@@ -473,9 +2673,46 @@ def delete_persona(nombre):
     Responde a: DELETE /personas/<nombre_de_la_persona>
     Retorna: Un mensaje de éxito y código 200 (OK), o un error 404 (Not Found).
     """
-    resultado, codigo = Persona.eliminar(nombre)
+    resultado, codigo = g.tienda.personas.eliminar(nombre)
     return jsonify(resultado), codigo
 
+@app.route('/personas/<nombre>/ventas', methods=['GET'])
+def get_ventas_persona(nombre):
+    """
+    Endpoint para obtener el historial de compras de una persona, paginado.
+    Parámetros opcionales en la URL: 'limit' (por defecto 50) y 'offset' (ventas más recientes a saltar).
+    Responde a: GET /personas/<nombre_de_la_persona>/ventas?limit=50&offset=0
+    Retorna: El total de ventas de la persona y la página pedida (de la más reciente a la más antigua),
+             o un error 404 (Not Found) si la persona no existe.
+    """
+    limite, error = _parametro_entero_positivo('limit')
+    if error:
+        return jsonify({'error': error}), 400
+    desde, error = _parametro_entero_positivo('offset', permitir_cero=True)
+    if error:
+        return jsonify({'error': error}), 400
+    historial = g.tienda.ventas.historial_cliente(nombre, limite or 50, desde or 0)
+    if historial is None:
+        if not g.tienda.personas.buscar(nombre):
+            return jsonify({'error': f'Persona "{nombre}" no encontrada'}), 404
+        historial = {'cliente': nombre, 'total': 0, 'ventas': []}
+    return jsonify(historial)
+
+@app.route('/personas/<nombre>/resumen', methods=['GET'])
+def get_resumen_persona(nombre):
+    """
+    Endpoint para obtener el resumen de compras de una persona: ventas, unidades,
+    productos distintos, primera y última compra y origen favorito.
+    Responde a: GET /personas/<nombre_de_la_persona>/resumen
+    Retorna: El resumen y código 200 (OK), o un error 404 (Not Found) si la persona no existe.
+    """
+    resumen = g.tienda.ventas.resumen_cliente(nombre)
+    if resumen is None:
+        if not g.tienda.personas.buscar(nombre):
+            return jsonify({'error': f'Persona "{nombre}" no encontrada'}), 404
+        resumen = dict(ResumenCliente().como_dict(), cliente=nombre)
+    return jsonify(resumen)
+
 # --- Endpoints para VENTAS ---
 @app.route('/ventas', methods=['GET'])
 def get_ventas():
@@ -484,7 +2721,7 @@ def get_ventas():
     Responde a: GET /ventas
     Retorna: Una lista JSON de todas las ventas y un código de estado 200 (OK).
     """
-    return jsonify(Venta.todas())
+    return jsonify(g.tienda.ventas.todas())
 
 @app.route('/ventas', methods=['POST'])
 def post_venta():
@@ -495,18 +2732,65 @@ def post_venta():
     Responde a: POST /ventas
     Retorna: La venta registrada y código 201 (Created), o un mensaje de error y un código apropiado.
     """
-    resultado, codigo = Venta.crear(request.json)
+    resultado, codigo = g.tienda.ventas.crear(request.json)
+    return jsonify(resultado), codigo
+
+@app.route('/tickets', methods=['POST'])
+def post_ticket():
+    """
+    Endpoint para registrar un ticket (carrito) con varios productos en una sola operación atómica.
+    Requiere un cuerpo JSON con 'lineas' (lista de {'producto': nombre, 'cantidad': int})
+    y opcionalmente 'cliente'.
+    Responde a: POST /tickets
+    Retorna: El ticket registrado (con su número y sus líneas) y código 201 (Created),
+             o un mensaje de error con el detalle por línea y un código apropiado.
+    """
+    resultado, codigo = g.tienda.ventas.crear_ticket(request.get_json(silent=True))
+    return jsonify(resultado), codigo
+
+@app.route('/ventas/<int:id_venta>', methods=['GET'])
+def get_venta(id_venta):
+    """
+    Endpoint para obtener una venta por su id.
+    Responde a: GET /ventas/<id>
+    Retorna: La venta y código 200 (OK), o un mensaje de error y código 404 (Not Found).
+    """
+    venta = g.tienda.ventas.buscar(id_venta)
+    if venta:
+        return jsonify(venta)
+    return jsonify({'error': 'Venta no encontrada'}), 404
+
+@app.route('/ventas/<int:id_venta>', methods=['DELETE'])
+def delete_venta(id_venta):
+    """
+    Endpoint para cancelar una venta por su id y revertir el stock del producto.
+    Responde a: DELETE /ventas/<id>
+    Retorna: Un mensaje de éxito y código 200 (OK), o un mensaje de error y un código apropiado.
+    """
+    resultado, codigo = g.tienda.ventas.cancelar(id_venta)
+    return jsonify(resultado), codigo
+
+@app.route('/ventas/<int:id_venta>', methods=['PATCH'])
+def patch_venta(id_venta):
+    """
+    Endpoint para modificar una venta por su id.
+    Requiere un cuerpo JSON con 'fecha' (YYYY-MM-DD).
+    Responde a: PATCH /ventas/<id>
+    Retorna: La venta modificada y código 200 (OK), o un mensaje de error y un código apropiado.
+    """
+    resultado, codigo = g.tienda.ventas.modificar(id_venta, request.get_json(silent=True))
     return jsonify(resultado), codigo
 
 @app.route('/ventas/cambiar_fecha', methods=['PUT'])
 def cambiar_fecha_venta():
     """
-    Endpoint para modificar la fecha de una venta específica.
+    Endpoint para modificar la fecha de una venta específica (forma antigua: usar PATCH /ventas/<id>).
     Requiere en el cuerpo JSON:
     - 'producto': Nombre del producto en la venta.
     - 'cliente': Nombre del cliente en la venta.
     - 'fecha_anterior': Fecha actual de la venta a modificar (YYYY-MM-DD).
     - 'nueva_fecha': La nueva fecha para la venta (YYYY-MM-DD).
+    Si hay varias ventas con esos datos, se modifica la primera registrada.
     Responde a: PUT /ventas/cambiar_fecha
     Retorna: Un mensaje de éxito y código 200 (OK), o un mensaje de error y un código apropiado.
     """
@@ -522,35 +2806,25 @@ def cambiar_fecha_venta():
     if not (producto_nombre and cliente and fecha_anterior and nueva_fecha):
         return jsonify({"error": "Faltan campos obligatorios: producto, cliente, fecha_anterior, nueva_fecha"}), 400
 
-    ventas = Venta.todas()
-    modificada = False
-
-    for venta in ventas:
-        if (
-            venta.get('producto') == producto_nombre and
-            venta.get('cliente') == cliente and
-            venta.get('fecha') == fecha_anterior
-        ):
-            venta['fecha'] = nueva_fecha
-            modificada = True
-            break
-
-    if not modificada:
+    id_venta = g.tienda.ventas.buscar_id(producto_nombre, cliente, fecha_anterior)
+    if id_venta is None:
         return jsonify({"error": "Venta no encontrada con los datos proporcionados"}), 404
 
-    if Venta.storage.guardar(ventas):
+    resultado, codigo = g.tienda.ventas.modificar(id_venta, {'fecha': nueva_fecha})
+    if codigo == 200:
         return jsonify({"mensaje": "Fecha de la venta actualizada correctamente"}), 200
-    else:
-        return jsonify({"error": "No se pudo guardar la modificación"}), 500
+    return jsonify(resultado), codigo
 
 @app.route('/ventas/cancelar', methods=['DELETE'])
 def cancelar_venta():
     """
-    Endpoint para cancelar una venta específica y revertir el stock del producto.
+    Endpoint para cancelar una venta específica y revertir el stock del producto
+    (forma antigua: usar DELETE /ventas/<id>).
     Requiere en el cuerpo JSON:
     - 'producto': Nombre del producto de la venta a cancelar.
     - 'cliente': Nombre del cliente de la venta a cancelar.
     - 'fecha': Fecha de la venta a cancelar (YYYY-MM-DD).
+    Si hay varias ventas con esos datos, se cancela la primera registrada.
     Responde a: DELETE /ventas/cancelar
     Retorna: Un mensaje de éxito y código 200 (OK), o un mensaje de error y un código apropiado.
     """
@@ -565,66 +2839,144 @@ def cancelar_venta():
     if not (producto_nombre and cliente and fecha):
         return jsonify({"error": "Debe enviar producto, cliente y fecha"}), 400
 
-    ventas = Venta.todas()
-    venta_encontrada = None
-    indice_venta = -1
-    for i, v in enumerate(ventas):
-        if v.get('producto') == producto_nombre and v.get('cliente') == cliente and v.get('fecha') == fecha:
-            venta_encontrada = v
-            indice_venta = i
-            break
-
-    if venta_encontrada:
-        cantidad_vendida = venta_encontrada.get('cantidad', 0)
-        if cantidad_vendida <= 0:
-            return jsonify({"error": "Cantidad de venta inválida para cancelar"}), 400
-
-        ventas.pop(indice_venta)
-
-        producto = Producto.buscar(producto_nombre)
-        if producto:
-            producto['stock'] += cantidad_vendida
-            resultado_actualizacion, codigo_actualizacion = Producto.actualizar(producto['nombre'], producto)
-            
-            if codigo_actualizacion == 200:
-                if Venta.storage.guardar(ventas):
-                    return jsonify({"mensaje": "Venta cancelada y stock revertido correctamente"}), 200
-                else:
-                    return jsonify({"error": "Error al guardar los cambios en ventas después de revertir stock. Stock revertido."}), 500
-            else:
-                return jsonify({"error": f"Error al actualizar stock del producto '{producto_nombre}': {resultado_actualizacion.get('error')}"}), codigo_actualizacion
-        else:
-            return jsonify({"error": f"Error: Producto '{producto_nombre}' no encontrado para revertir el stock. Venta eliminada."}), 404
-    else:
+    id_venta = g.tienda.ventas.buscar_id(producto_nombre, cliente, fecha)
+    if id_venta is None:
         return jsonify({"error": "Venta no encontrada"}), 404
+    resultado, codigo = g.tienda.ventas.cancelar(id_venta)
+    return jsonify(resultado), codigo
+
+
+# --- Endpoints de IMPORTACIÓN MASIVA ---
+@app.route('/importar/<entidad>', methods=['POST'])
+def post_importar(entidad):
+    """
+    Endpoint para importar en lote productos, personas o ventas históricas.
+    El cuerpo se lee en streaming como NDJSON (un objeto JSON por línea) o CSV con encabezado;
+    el formato se toma del parámetro 'formato' ('ndjson' o 'csv') o del Content-Type.
+    Admite cuerpos comprimidos con 'Content-Encoding: gzip'.
+    Responde a: POST /importar/productos, POST /importar/personas, POST /importar/ventas
+    Retorna: Un reporte con filas procesadas, creadas, actualizadas y los errores por fila,
+             con código 200 (OK), o 500 si no se pudo guardar un lote.
+    """
+    modelos = {
+        'productos': (g.tienda.productos, ('stock',)),
+        'personas': (g.tienda.personas, ()),
+        'ventas': (g.tienda.ventas, ('cantidad',)),
+    }
+    if entidad not in modelos:
+        return jsonify({'error': f'No se puede importar "{entidad}": use productos, personas o ventas'}), 404
+    formato = request.args.get('formato') or ('csv' if 'csv' in (request.mimetype or '') else 'ndjson')
+    if formato not in ('ndjson', 'csv'):
+        return jsonify({'error': "El parámetro 'formato' debe ser 'ndjson' o 'csv'"}), 400
+
+    flujo = request.stream
+    if request.headers.get('Content-Encoding', '').lower() == 'gzip':
+        flujo = gzip.GzipFile(fileobj=flujo)
+    modelo, campos_enteros = modelos[entidad]
+    try:
+        reporte, exito = modelo.importar(leer_filas(flujo, formato, campos_enteros))
+    except (OSError, EOFError, csv.Error) as e:
+        return jsonify({'error': f'No se pudo leer el cuerpo de la importación: {e}'}), 400
+    return jsonify(reporte), 200 if exito else 500
 
 
 # --- Endpoints para ESTADÍSTICAS ---
+def _parametro_entero_positivo(nombre, permitir_cero=False):
+    """
+    Lee un parámetro entero positivo opcional de la URL.
+    :param nombre: Nombre del parámetro.
+    :param permitir_cero: Si es True también se acepta 0 (ej. para un desplazamiento).
+    :return: Una tupla (valor_o_None, error_o_None).
+    """
+    valor = request.args.get(nombre)
+    if valor is None or valor == '':
+        return None, None
+    descripcion = 'un entero mayor o igual a 0' if permitir_cero else 'un entero positivo'
+    try:
+        valor = int(valor)
+    except ValueError:
+        return None, f"El parámetro '{nombre}' debe ser {descripcion}"
+    if valor < 0 or (valor == 0 and not permitir_cero):
+        return None, f"El parámetro '{nombre}' debe ser {descripcion}"
+    return valor, None
+
+def calcular_en_tiendas(parcial):
+    """
+    Calcula un agregado parcial en la tienda de la solicitud o, si se pidieron todas, en cada
+    tienda en paralelo (con ejecutor_tiendas). Cada tienda lee sus datos con su propio lock,
+    así una consulta de todas no frena el cobro de ninguna más que una consulta local.
+    :param parcial: Función tienda -> agregado parcial de esa tienda.
+    :return: La lista de agregados parciales, uno por tienda.
+    """
+    tienda = g.get('tienda')
+    if tienda is not None:
+        return [parcial(tienda)]
+    return list(ejecutor_tiendas.map(parcial, TIENDAS.values()))
+
+def sumar_conteos(parciales):
+    """Combina diccionarios {clave: unidades} de varias tiendas sumando las unidades de cada clave."""
+    total = {}
+    for conteos in parciales:
+        for clave, unidades in conteos.items():
+            total[clave] = total.get(clave, 0) + unidades
+    return total
+
+def sumar_listas(parciales):
+    """Combina listas de igual largo de varias tiendas sumándolas posición por posición."""
+    return [sum(valores) for valores in zip(*parciales)]
+
+def combinar_resumenes(parciales):
+    """Combina resúmenes aproximados de varias tiendas (HyperLogLog o HistogramaCuantiles, ver aproximados.py)."""
+    total, *resto = parciales
+    for resumen in resto:
+        total.combinar(resumen)
+    return total
+
 @app.route('/estadisticas/ventas_por_dia', methods=['GET'])
 def get_estadisticas_ventas_por_dia():
     """
     Endpoint para obtener el total de unidades vendidas por día.
-    Parámetros opcionales en la URL: 'fecha_inicio' y 'fecha_fin' (formato YYYY-MM-DD).
-    Responde a: GET /estadisticas/ventas_por_dia?fecha_inicio=YYYY-MM-DD&fecha_fin=YYYY-MM-DD
-    Retorna: Un diccionario JSON con fechas como claves y el total de unidades vendidas como valores.
+    Parámetros opcionales en la URL: 'fecha_inicio' y 'fecha_fin' (formato YYYY-MM-DD),
+    y 'max_puntos' para limitar el número de puntos (agrupando por semana, mes o año).
+    Responde a: GET /estadisticas/ventas_por_dia?fecha_inicio=YYYY-MM-DD&fecha_fin=YYYY-MM-DD&max_puntos=N
+    Retorna: Un diccionario JSON con fechas (o periodos) como claves y el total de unidades vendidas como valores.
     """
     fecha_inicio = request.args.get('fecha_inicio')
     fecha_fin = request.args.get('fecha_fin')
-    estadisticas = Venta.obtener_estadisticas_ventas_por_dia(fecha_inicio, fecha_fin)
+    max_puntos, error = _parametro_entero_positivo('max_puntos')
+    if error:
+        return jsonify({'error': error}), 400
+    estadisticas = sumar_conteos(calcular_en_tiendas(
+        lambda tienda: tienda.ventas.obtener_estadisticas_ventas_por_dia(fecha_inicio, fecha_fin)))
+    if max_puntos:
+        # Se agrupa después de combinar las tiendas: cada una puede tener días distintos
+        estadisticas = Venta.agrupar_por_periodo(estadisticas, max_puntos)
+    else:
+        estadisticas = dict(sorted(estadisticas.items())) # Al combinar tiendas se pierde el orden por fecha
     return jsonify(estadisticas)
 
 @app.route('/estadisticas/productos_mas_vendidos', methods=['GET'])
 def get_estadisticas_productos_mas_vendidos():
     """
     Endpoint para obtener los productos más vendidos (por cantidad).
-    Parámetros opcionales en la URL: 'fecha_inicio' y 'fecha_fin' (formato YYYY-MM-DD).
-    Responde a: GET /estadisticas/productos_mas_vendidos?fecha_inicio=YYYY-MM-DD&fecha_fin=YYYY-MM-DD
+    Parámetros opcionales en la URL: 'fecha_inicio' y 'fecha_fin' (formato YYYY-MM-DD),
+    y 'top' para retornar solo los N más vendidos (el resto se agrupa en 'Otros').
+    Responde a: GET /estadisticas/productos_mas_vendidos?fecha_inicio=YYYY-MM-DD&fecha_fin=YYYY-MM-DD&top=N
     Retorna: Un diccionario JSON con nombres de productos como claves y la cantidad total vendida como valores,
              ordenado de forma descendente.
     """
     fecha_inicio = request.args.get('fecha_inicio')
     fecha_fin = request.args.get('fecha_fin')
-    estadisticas = Venta.obtener_estadisticas_productos_mas_vendidos(fecha_inicio, fecha_fin)
+    top, error = _parametro_entero_positivo('top')
+    if error:
+        return jsonify({'error': error}), 400
+    estadisticas = sumar_conteos(calcular_en_tiendas(
+        lambda tienda: tienda.ventas.obtener_estadisticas_productos_mas_vendidos(fecha_inicio, fecha_fin)))
+    if top:
+        # El top se elige sobre los totales combinados, no sobre el top de cada tienda
+        estadisticas = Venta.seleccionar_top(estadisticas, top)
+    else:
+        estadisticas = dict(sorted(estadisticas.items(), key=lambda item: item[1], reverse=True))
     return jsonify(estadisticas)
 
 @app.route('/estadisticas/ventas_por_origen', methods=['GET'])
@@ -637,10 +2989,154 @@ def get_estadisticas_ventas_por_origen():
     """
     fecha_inicio = request.args.get('fecha_inicio')
     fecha_fin = request.args.get('fecha_fin')
-    estadisticas = Venta.obtener_estadisticas_ventas_por_origen(fecha_inicio, fecha_fin)
-    return jsonify(estadisticas)
+    estadisticas = sumar_conteos(calcular_en_tiendas(
+        lambda tienda: tienda.ventas.obtener_estadisticas_ventas_por_origen(fecha_inicio, fecha_fin)))
+    return jsonify(dict(sorted(estadisticas.items())))
+
+
+def _parametro_rango(nombre):
+    """
+    Lee un rango de fechas 'inicio,fin' (YYYY-MM-DD) de la URL; una sola fecha es un rango de un día.
+    :param nombre: Nombre del parámetro.
+    :return: Una tupla ((inicio, fin) o None, error_o_None).
+    """
+    valor = request.args.get(nombre, '')
+    partes = [p.strip() for p in valor.split(',')]
+    if len(partes) == 1:
+        partes = partes * 2
+    formato = f"El parámetro '{nombre}' debe ser un rango 'YYYY-MM-DD,YYYY-MM-DD'"
+    if len(partes) != 2:
+        return None, formato
+    try:
+        inicio, fin = dia(partes[0]), dia(partes[1])
+    except ValueError:
+        return None, formato
+    if inicio > fin:
+        return None, f"El parámetro '{nombre}' tiene la fecha de inicio posterior a la de fin"
+    if fin - inicio + 1 > MAX_DIAS_COMPARAR:
+        return None, f"El parámetro '{nombre}' abarca más de {MAX_DIAS_COMPARAR} días"
+    return (date.fromordinal(inicio).isoformat(), date.fromordinal(fin).isoformat()), None
+
+@app.route('/estadisticas/comparar', methods=['GET'])
+def get_estadisticas_comparar():
+    """
+    Endpoint para comparar las unidades vendidas en dos rangos de fechas (ej. esta semana contra
+    la anterior, o el mismo mes del año pasado).
+    Parámetros en la URL: 'rango_a' y 'rango_b' (formato YYYY-MM-DD,YYYY-MM-DD), y opcionalmente
+    'producto' u 'origen' para comparar solo sus ventas, y 'ventana' (días de la media móvil, por defecto 7).
+    Responde a: GET /estadisticas/comparar?rango_a=YYYY-MM-DD,YYYY-MM-DD&rango_b=YYYY-MM-DD,YYYY-MM-DD
+    Retorna: Las unidades, el promedio diario y la media móvil de cada rango, y la diferencia
+             y variación porcentual de A respecto de B.
+    """
+    rango_a, error = _parametro_rango('rango_a')
+    if error:
+        return jsonify({'error': error}), 400
+    rango_b, error = _parametro_rango('rango_b')
+    if error:
+        return jsonify({'error': error}), 400
+    ventana, error = _parametro_entero_positivo('ventana')
+    if error:
+        return jsonify({'error': error}), 400
+    producto = request.args.get('producto')
+    origen = request.args.get('origen')
+    ventana = ventana or VENTANA_MEDIA_MOVIL
+    parciales = calcular_en_tiendas(
+        lambda tienda: tienda.ventas.unidades_diarias([rango_a, rango_b], producto, origen, ventana - 1))
+    comparacion = Venta.resumir_comparacion(rango_a, rango_b, sumar_listas(p[0] for p in parciales),
+                                            sumar_listas(p[1] for p in parciales), producto, origen, ventana)
+    return jsonify(comparacion)
+
+
+def _parametros_fechas_opcionales():
+    """
+    Lee y valida los parámetros opcionales 'fecha_inicio' y 'fecha_fin' (YYYY-MM-DD) de la URL.
+    :return: Una tupla (fecha_inicio, fecha_fin, error_o_None).
+    """
+    fechas = []
+    for nombre in ('fecha_inicio', 'fecha_fin'):
+        valor = request.args.get(nombre) or None
+        if valor is not None:
+            try:
+                datetime.strptime(valor, '%Y-%m-%d')
+            except ValueError:
+                return None, None, f"El parámetro '{nombre}' debe tener el formato YYYY-MM-DD"
+        fechas.append(valor)
+    return fechas[0], fechas[1], None
+
+@app.route('/estadisticas/distribucion', methods=['GET'])
+def get_estadisticas_distribucion():
+    """
+    Endpoint para estimar la distribución de la cantidad de unidades por venta (aproximada,
+    con error relativo acotado).
+    Parámetros opcionales en la URL: 'fecha_inicio' y 'fecha_fin' (formato YYYY-MM-DD), 'producto',
+    y 'cuantiles' (lista separada por comas entre 0 y 1, por defecto 0.5,0.9,0.99).
+    Responde a: GET /estadisticas/distribucion?fecha_inicio=YYYY-MM-DD&fecha_fin=YYYY-MM-DD&cuantiles=0.5,0.9
+    Retorna: La cantidad de ventas y los cuantiles estimados (ej. {'p50': 2, 'p90': 5}).
+    """
+    fecha_inicio, fecha_fin, error = _parametros_fechas_opcionales()
+    if error:
+        return jsonify({'error': error}), 400
+    try:
+        cuantiles = [float(q) for q in request.args.get('cuantiles', '0.5,0.9,0.99').split(',')]
+    except ValueError:
+        cuantiles = []
+    if not cuantiles or not all(0 <= q <= 1 for q in cuantiles):
+        return jsonify({'error': "El parámetro 'cuantiles' debe ser una lista de números entre 0 y 1"}), 400
+    producto = request.args.get('producto')
+    histograma = combinar_resumenes(calcular_en_tiendas(
+        lambda tienda: tienda.ventas.histograma_cantidades(fecha_inicio, fecha_fin, producto)))
+    return jsonify(Venta.resumir_distribucion(histograma, cuantiles, producto))
+
+@app.route('/estadisticas/clientes_unicos', methods=['GET'])
+def get_estadisticas_clientes_unicos():
+    """
+    Endpoint para estimar la cantidad de clientes distintos (aproximada, error estándar ~3%).
+    Parámetros opcionales en la URL: 'fecha_inicio' y 'fecha_fin' (formato YYYY-MM-DD) y 'producto'.
+    Responde a: GET /estadisticas/clientes_unicos?fecha_inicio=YYYY-MM-DD&fecha_fin=YYYY-MM-DD
+    Retorna: La cantidad estimada de clientes distintos y el error estándar relativo de la estimación.
+    """
+    fecha_inicio, fecha_fin, error = _parametros_fechas_opcionales()
+    if error:
+        return jsonify({'error': error}), 400
+    producto = request.args.get('producto')
+    hll = combinar_resumenes(calcular_en_tiendas(
+        lambda tienda: tienda.ventas.hll_clientes(fecha_inicio, fecha_fin, producto)))
+    return jsonify(Venta.resumir_clientes_unicos(hll, producto))
+
+
+# --- Ciclo de vida del servidor ---
+def precargar():
+    """
+    Prepara el backend antes de atender solicitudes. Con un servidor de producción
+    (ver servidor.py y gunicorn.conf.py) se ejecuta una sola vez en el proceso maestro,
+    antes de crear los workers: verifica que los archivos de datos se puedan leer y
+    deja calientes las cachés del sistema operativo. También asigna un id a las ventas
+    antiguas que no lo tienen, archiva las anteriores a TIENDA_RETENCION_DIAS y construye
+    el índice de ventas.
+    :return: Un diccionario con el número de registros de cada almacenamiento de la tienda
+             principal (y las ventas archivadas, si corresponde) y, si hay sucursales, los
+             de cada una en 'sucursales'.
+    """
+    resumen = TIENDAS[TIENDA_PRINCIPAL].precargar()
+    sucursales = {nombre: tienda.precargar() for nombre, tienda in TIENDAS.items() if nombre != TIENDA_PRINCIPAL}
+    if sucursales:
+        resumen['sucursales'] = sucursales
+    return resumen
+
+def cerrar():
+    """
+    Cierra el backend de forma ordenada: espera a que terminen las escrituras pendientes
+    en los archivos de datos de cada tienda y guarda una foto de su stock. Se llama al
+    apagar el servidor.
+    """
+    for tienda in TIENDAS.values():
+        tienda.cerrar()
 
 
-# --- Inicio de la aplicación ---
+# --- Inicio de la aplicación (servidor de desarrollo) ---
+# Para producción usar: python servidor.py (ver servidor.py)
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    precargar()
+    app.run(debug=os.environ.get('TIENDA_DEBUG') == '1',
+            host=os.environ.get('TIENDA_HOST', '0.0.0.0'),
+            port=int(os.environ.get('TIENDA_PUERTO', '5000')))
\ No newline at end of file
@@ -0,0 +1,52 @@
+"""
+Paquete de benchmarks del backend de la tienda.
+
+Módulos:
+- generar_datos: genera carpetas 'dat' sintéticas y deterministas a distintas escalas.
+- micro: microbenchmarks de JsonStorage, Producto, Venta y las estadísticas.
+- carga: generador de carga HTTP multi-cliente contra la aplicación Flask.
+- comparar: compara un resultado contra una línea base guardada y detecta regresiones.
+
+Todos los resultados se escriben en JSON con el mismo formato:
+{"tipo": ..., "parametros": {...}, "resultados": {nombre: {métrica: valor}}}
+"""
+import os
+import sys
+
+# Carpeta del proyecto (donde está backfinal.py), para poder importarlo desde los benchmarks
+RUTA_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RUTA_PROYECTO not in sys.path:
+    sys.path.insert(0, RUTA_PROYECTO)
+
+
+def percentil(valores_ordenados, p):
+    """
+    Calcula el percentil p (0-100) de una lista ya ordenada, con interpolación lineal.
+    :param valores_ordenados: Lista de números ordenada de forma ascendente.
+    :param p: Percentil a calcular.
+    :return: El valor del percentil, o 0.0 si la lista está vacía.
+    """
+    if not valores_ordenados:
+        return 0.0
+    posicion = (len(valores_ordenados) - 1) * p / 100
+    inferior = int(posicion)
+    superior = min(inferior + 1, len(valores_ordenados) - 1)
+    fraccion = posicion - inferior
+    return valores_ordenados[inferior] + (valores_ordenados[superior] - valores_ordenados[inferior]) * fraccion
+
+
+def resumen_latencias(latencias_s):
+    """
+    Resume una lista de latencias (en segundos) en milisegundos.
+    :return: Un diccionario con n, media_ms, p50_ms, p95_ms, p99_ms y max_ms.
+    """
+    ordenadas = sorted(latencias_s)
+    n = len(ordenadas)
+    return {
+        'n': n,
+        'media_ms': (sum(ordenadas) / n * 1000) if n else 0.0,
+        'p50_ms': percentil(ordenadas, 50) * 1000,
+        'p95_ms': percentil(ordenadas, 95) * 1000,
+        'p99_ms': percentil(ordenadas, 99) * 1000,
+        'max_ms': (ordenadas[-1] * 1000) if n else 0.0,
+    }
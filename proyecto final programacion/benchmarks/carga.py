@@ -0,0 +1,211 @@
+"""
+Generador de carga HTTP multi-cliente contra la API Flask de la tienda.
+
+Cada cliente es un hilo con su propia conexión keep-alive que elige rutas según una
+mezcla ponderada (lecturas de listas, estadísticas y ventas). Se reporta, por ruta,
+el throughput y las latencias p50/p95/p99 en JSON.
+
+Puede atacar un servidor ya levantado (--url) o levantar uno propio en este proceso
+sobre una copia temporal de una carpeta de datos (--datos).
+
+Uso:
+    python -m benchmarks.carga --datos /tmp/dat_100k --clientes 8 --duracion 30 --salida carga.json
+    python -m benchmarks.carga --url http://localhost:5000 --clientes 16 --duracion 60
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit, quote
+
+from benchmarks import resumen_latencias
+
+# Mezcla por defecto: (peso, método, ruta). Las rutas con {producto}, {inicio} y {fin} se completan al iniciar.
+MEZCLA_POR_DEFECTO = [
+    (20, 'POST', '/ventas'),
+    (15, 'GET', '/productos'),
+    (10, 'GET', '/personas'),
+    (5, 'GET', '/ventas'),
+    (15, 'GET', '/productos/{producto}'),
+    (10, 'GET', '/estadisticas/ventas_por_dia?fecha_inicio={inicio}&fecha_fin={fin}'),
+    (10, 'GET', '/estadisticas/productos_mas_vendidos?fecha_inicio={inicio}&fecha_fin={fin}'),
+    (10, 'GET', '/estadisticas/ventas_por_origen?fecha_inicio={inicio}&fecha_fin={fin}'),
+]
+
+
+def _nombre_ruta(metodo, ruta):
+    """Nombre con el que se agrupan los resultados: método y ruta sin parámetros."""
+    return f"{metodo} {ruta.split('?')[0]}"
+
+
+def _conectar(url):
+    partes = urlsplit(url)
+    return http.client.HTTPConnection(partes.hostname, partes.port or 80, timeout=60)
+
+
+def _solicitar(conexion, metodo, ruta, cuerpo=None):
+    """Realiza una solicitud y retorna (código_de_estado, bytes_de_respuesta)."""
+    encabezados = {'Content-Type': 'application/json'} if cuerpo is not None else {}
+    datos = json.dumps(cuerpo).encode('utf-8') if cuerpo is not None else None
+    conexion.request(metodo, ruta, body=datos, headers=encabezados)
+    respuesta = conexion.getresponse()
+    contenido = respuesta.read()
+    return respuesta.status, contenido
+
+
+def preparar_mezcla(url, mezcla):
+    """
+    Consulta el servidor para completar las rutas de la mezcla con datos reales
+    (un producto con stock, un cliente y un rango de fechas con ventas).
+    :return: Una lista de (peso, método, ruta, cuerpo_o_None).
+    """
+    conexion = _conectar(url)
+    _, productos = _solicitar(conexion, 'GET', '/productos')
+    _, personas = _solicitar(conexion, 'GET', '/personas')
+    _, por_dia = _solicitar(conexion, 'GET', '/estadisticas/ventas_por_dia')
+    conexion.close()
+    productos = json.loads(productos) or [{'nombre': 'sin productos', 'stock': 0}]
+    personas = json.loads(personas) or [{'nombre': 'Sin nombre'}]
+    fechas = sorted(json.loads(por_dia)) or ['2000-01-01']
+
+    producto = max(productos, key=lambda p: p.get('stock', 0))['nombre']
+    cliente = personas[0]['nombre']
+    valores = {'producto': quote(producto), 'inicio': fechas[len(fechas) * 3 // 4], 'fin': fechas[-1]}
+
+    preparada = []
+    for peso, metodo, ruta in mezcla:
+        cuerpo = None
+        if metodo == 'POST' and ruta == '/ventas':
+            cuerpo = {'producto': {'nombre': producto}, 'cantidad': 1, 'cliente': cliente}
+        preparada.append((peso, metodo, ruta.format(**valores), cuerpo))
+    return preparada
+
+
+def ejecutar(url, clientes=4, duracion=10.0, mezcla=None, semilla=1):
+    """
+    Ejecuta la prueba de carga.
+    :param url: URL base del servidor (ej. 'http://localhost:5000').
+    :param clientes: Número de clientes concurrentes.
+    :param duracion: Duración de la prueba en segundos.
+    :param mezcla: Lista de (peso, método, ruta); por defecto MEZCLA_POR_DEFECTO.
+    :param semilla: Semilla para la elección de rutas.
+    :return: Un diccionario de resultados en el formato común de los benchmarks.
+    """
+    preparada = preparar_mezcla(url, mezcla or MEZCLA_POR_DEFECTO)
+    pesos = [peso for peso, _, _, _ in preparada]
+    registros = [] # (nombre_ruta, código, latencia_s, bytes) de todos los clientes
+    lock = threading.Lock()
+    fin = time.perf_counter() + duracion
+
+    def cliente(indice):
+        rnd = random.Random(semilla + indice)
+        conexion = _conectar(url)
+        locales = []
+        while time.perf_counter() < fin:
+            _, metodo, ruta, cuerpo = rnd.choices(preparada, weights=pesos)[0]
+            inicio = time.perf_counter()
+            try:
+                codigo, contenido = _solicitar(conexion, metodo, ruta, cuerpo)
+                tamano = len(contenido)
+            except (OSError, http.client.HTTPException):
+                conexion.close()
+                conexion = _conectar(url)
+                codigo, tamano = 0, 0 # 0 = error de conexión
+            locales.append((_nombre_ruta(metodo, ruta), codigo, time.perf_counter() - inicio, tamano))
+        conexion.close()
+        with lock:
+            registros.extend(locales)
+
+    inicio_prueba = time.perf_counter()
+    hilos = [threading.Thread(target=cliente, args=(i,), daemon=True) for i in range(clientes)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    transcurrido = time.perf_counter() - inicio_prueba
+
+    por_ruta = {}
+    for nombre, codigo, latencia, tamano in registros:
+        por_ruta.setdefault(nombre, []).append((codigo, latencia, tamano))
+    resultados = {}
+    for nombre, filas in sorted(por_ruta.items()):
+        resumen = resumen_latencias([latencia for _, latencia, _ in filas])
+        resumen['rps'] = len(filas) / transcurrido
+        resumen['bytes_medios'] = sum(tamano for _, _, tamano in filas) / len(filas)
+        resumen['codigos'] = {}
+        for codigo, _, _ in filas:
+            resumen['codigos'][str(codigo)] = resumen['codigos'].get(str(codigo), 0) + 1
+        resultados[nombre] = resumen
+    total = resumen_latencias([latencia for _, _, latencia, _ in registros])
+    total['rps'] = len(registros) / transcurrido
+    resultados['TOTAL'] = total
+
+    return {
+        'tipo': 'carga',
+        'parametros': {'url': url, 'clientes': clientes, 'duracion_s': duracion, 'semilla': semilla},
+        'resultados': resultados,
+    }
+
+
+def servidor_local(carpeta_datos):
+    """
+    Levanta la aplicación Flask en un hilo de este proceso sobre una copia temporal de los datos.
+    :return: Una tupla (url, función_para_detenerlo).
+    """
+    from werkzeug.serving import make_server
+
+    temporal = tempfile.mkdtemp(prefix='tienda_carga_')
+    copia = os.path.join(temporal, 'dat')
+    shutil.copytree(carpeta_datos, copia)
+    os.environ['TIENDA_DATOS_DIR'] = copia
+    import backfinal
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR) # Sin una línea de log por solicitud
+    servidor = make_server('127.0.0.1', 0, backfinal.app, threaded=True)
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+
+    def detener():
+        servidor.shutdown()
+        shutil.rmtree(temporal, ignore_errors=True)
+
+    return f"http://127.0.0.1:{servidor.server_port}", detener
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Prueba de carga HTTP de la API de la tienda.')
+    destino = parser.add_mutually_exclusive_group(required=True)
+    destino.add_argument('--url', help='URL de un servidor ya levantado')
+    destino.add_argument('--datos', help='Carpeta de datos para levantar un servidor local')
+    parser.add_argument('--clientes', type=int, default=4)
+    parser.add_argument('--duracion', type=float, default=10.0, help='Segundos')
+    parser.add_argument('--semilla', type=int, default=1)
+    parser.add_argument('--salida', help='Archivo JSON de resultados (por defecto, salida estándar)')
+    args = parser.parse_args(argv)
+
+    detener = None
+    url = args.url
+    if args.datos:
+        url, detener = servidor_local(args.datos)
+    try:
+        resultado = ejecutar(url, args.clientes, args.duracion, semilla=args.semilla)
+    finally:
+        if detener:
+            detener()
+
+    texto = json.dumps(resultado, ensure_ascii=False, indent=2)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as file:
+            file.write(texto)
+    else:
+        print(texto)
+
+
+if __name__ == '__main__':
+    main()
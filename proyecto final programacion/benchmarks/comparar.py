@@ -0,0 +1,75 @@
+"""
+Compara un resultado de benchmark contra una línea base guardada.
+
+Se consideran regresiones:
+- las métricas de latencia ('*_ms') que empeoran (suben) más que la tolerancia, y
+- el throughput ('rps') que baja más que la tolerancia.
+
+Sale con código 1 si hay alguna regresión, para poder usarlo antes de desplegar.
+
+Uso:
+    python -m benchmarks.comparar linea_base.json actual.json --tolerancia 0.15
+"""
+import argparse
+import json
+import sys
+
+METRICAS_LATENCIA = ('p50_ms', 'p95_ms', 'p99_ms')
+
+
+def comparar(base, actual, tolerancia=0.10, metricas=METRICAS_LATENCIA):
+    """
+    Compara dos resultados con el formato común de los benchmarks.
+    :param base: Resultado de la línea base.
+    :param actual: Resultado a evaluar.
+    :param tolerancia: Variación relativa permitida (0.10 = 10 %).
+    :param metricas: Métricas de latencia a comparar.
+    :return: Una lista de diccionarios, uno por métrica comparada, con la clave 'regresion'.
+    """
+    filas = []
+    for nombre, metricas_base in base.get('resultados', {}).items():
+        metricas_actual = actual.get('resultados', {}).get(nombre)
+        if metricas_actual is None:
+            continue
+        for metrica in metricas + ('rps',):
+            if metrica not in metricas_base or metrica not in metricas_actual:
+                continue
+            valor_base = metricas_base[metrica]
+            valor_actual = metricas_actual[metrica]
+            if not valor_base:
+                continue
+            cambio = (valor_actual - valor_base) / valor_base
+            # En latencias, subir es peor; en throughput, bajar es peor
+            regresion = cambio < -tolerancia if metrica == 'rps' else cambio > tolerancia
+            filas.append({'nombre': nombre, 'metrica': metrica, 'base': valor_base,
+                          'actual': valor_actual, 'cambio': cambio, 'regresion': regresion})
+    return filas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compara resultados de benchmarks contra una línea base.')
+    parser.add_argument('base', help='JSON de la línea base')
+    parser.add_argument('actual', help='JSON del resultado actual')
+    parser.add_argument('--tolerancia', type=float, default=0.10, help='Variación relativa permitida (0.10 = 10 %%)')
+    args = parser.parse_args(argv)
+
+    with open(args.base, encoding='utf-8') as file:
+        base = json.load(file)
+    with open(args.actual, encoding='utf-8') as file:
+        actual = json.load(file)
+    if base.get('tipo') != actual.get('tipo'):
+        print(f"Los resultados no son comparables: '{base.get('tipo')}' vs '{actual.get('tipo')}'")
+        return 2
+
+    filas = comparar(base, actual, args.tolerancia)
+    for fila in filas:
+        marca = 'REGRESIÓN' if fila['regresion'] else 'ok'
+        print(f"{marca:10} {fila['nombre']:<55} {fila['metrica']:<7} "
+              f"{fila['base']:>10.2f} -> {fila['actual']:>10.2f} ({fila['cambio']:+.1%})")
+    regresiones = sum(1 for fila in filas if fila['regresion'])
+    print(f"{regresiones} regresión(es) de {len(filas)} métricas comparadas")
+    return 1 if regresiones else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
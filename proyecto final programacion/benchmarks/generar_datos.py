@@ -0,0 +1,134 @@
+"""
+Generador determinista de carpetas de datos sintéticas (product.json, person.json, venta.json).
+
+La popularidad de productos y clientes sigue una distribución tipo Zipf (pocos concentran
+la mayoría de las ventas) y la de las fechas tiene tendencia creciente y estacionalidad
+semanal. Con la misma semilla y parámetros siempre se genera el mismo contenido.
+
+Las ventas se escriben en streaming, por lo que se pueden generar millones sin
+mantenerlas en memoria.
+
+Uso:
+    python -m benchmarks.generar_datos --destino /tmp/dat_100k --ventas 100000 --productos 5000
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+from datetime import date, timedelta
+
+ORIGENES = ['Chiapas', 'Veracruz', 'Oaxaca', 'Puebla', 'Jalisco', 'Michoacán', 'Guerrero',
+            'Colombia', 'Brasil', 'Perú', 'Etiopía', 'Kenia', 'Importado', 'Local']
+
+# Peso relativo de cada día de la semana (lunes a domingo)
+PESO_DIA_SEMANA = [0.8, 0.85, 0.9, 1.0, 1.25, 1.5, 1.1]
+
+TAMANO_LOTE = 10000 # Ventas generadas por iteración al escribir en streaming
+
+
+def pesos_zipf(n, exponente):
+    """
+    Retorna los pesos acumulados de una distribución tipo Zipf para n elementos.
+    :param n: Número de elementos.
+    :param exponente: Exponente de la distribución (mayor = más concentrada).
+    """
+    return list(itertools.accumulate(1.0 / (rango ** exponente) for rango in range(1, n + 1)))
+
+
+def pesos_fechas(fecha_inicio, dias):
+    """
+    Retorna las fechas del rango y sus pesos acumulados: crecimiento lineal a lo largo
+    del periodo (el negocio crece) multiplicado por la estacionalidad semanal.
+    """
+    fechas = [fecha_inicio + timedelta(days=i) for i in range(dias)]
+    pesos = [(1.0 + i / max(dias, 1)) * PESO_DIA_SEMANA[f.weekday()] for i, f in enumerate(fechas)]
+    return [f.isoformat() for f in fechas], list(itertools.accumulate(pesos))
+
+
+def _escribir_lista(ruta, elementos):
+    """Escribe una lista JSON elemento por elemento (una línea por registro)."""
+    with open(ruta, 'w', encoding='utf-8') as file:
+        file.write('[\n')
+        primero = True
+        for elemento in elementos:
+            if not primero:
+                file.write(',\n')
+            file.write(json.dumps(elemento, ensure_ascii=False))
+            primero = False
+        file.write('\n]\n')
+
+
+def generar(destino, ventas=10000, productos=1000, personas=500, dias=365,
+            fecha_inicio=date(2024, 1, 1), semilla=42, exponente=1.1):
+    """
+    Genera una carpeta de datos sintética.
+    :param destino: Carpeta donde se escriben los tres archivos JSON.
+    :param ventas: Número de ventas a generar.
+    :param productos: Número de productos del catálogo.
+    :param personas: Número de clientes.
+    :param dias: Número de días cubiertos por las ventas.
+    :param fecha_inicio: Primer día del rango de ventas.
+    :param semilla: Semilla del generador aleatorio.
+    :param exponente: Exponente Zipf de la popularidad de productos y clientes.
+    :return: Un diccionario con el resumen de lo generado.
+    """
+    rnd = random.Random(semilla)
+    os.makedirs(destino, exist_ok=True)
+
+    catalogo = [{'nombre': f'Producto {i:06d}',
+                 'stock': rnd.randint(ventas // max(productos, 1) + 10, ventas // max(productos, 1) * 4 + 100),
+                 'origen': rnd.choice(ORIGENES)}
+                for i in range(productos)]
+    clientes = [{'nombre': f'Cliente {i:06d}'} for i in range(personas)]
+    _escribir_lista(os.path.join(destino, 'product.json'), catalogo)
+    _escribir_lista(os.path.join(destino, 'person.json'), clientes)
+
+    acumulado_productos = pesos_zipf(productos, exponente)
+    acumulado_clientes = pesos_zipf(personas, exponente)
+    fechas, acumulado_fechas = pesos_fechas(fecha_inicio, dias)
+    # Cantidades por venta: la mayoría de los tickets son de 1 a 3 unidades
+    cantidades = list(range(1, 11))
+    acumulado_cantidades = list(itertools.accumulate(1.0 / c ** 1.5 for c in cantidades))
+
+    def generar_ventas():
+        restantes = ventas
+        while restantes > 0:
+            lote = min(TAMANO_LOTE, restantes)
+            restantes -= lote
+            lote_productos = rnd.choices(catalogo, cum_weights=acumulado_productos, k=lote)
+            lote_clientes = rnd.choices(clientes, cum_weights=acumulado_clientes, k=lote)
+            lote_fechas = rnd.choices(fechas, cum_weights=acumulado_fechas, k=lote)
+            lote_cantidades = rnd.choices(cantidades, cum_weights=acumulado_cantidades, k=lote)
+            for producto, cliente, fecha, cantidad in zip(lote_productos, lote_clientes, lote_fechas, lote_cantidades):
+                yield {
+                    'producto': producto['nombre'],
+                    'cantidad': cantidad,
+                    'cliente': cliente['nombre'],
+                    'origen': producto['origen'],
+                    'fecha': fecha,
+                }
+
+    _escribir_lista(os.path.join(destino, 'venta.json'), generar_ventas())
+    return {'destino': destino, 'ventas': ventas, 'productos': productos, 'personas': personas,
+            'dias': dias, 'semilla': semilla}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Genera una carpeta de datos sintética para benchmarks.')
+    parser.add_argument('--destino', required=True, help='Carpeta de salida')
+    parser.add_argument('--ventas', type=int, default=10000)
+    parser.add_argument('--productos', type=int, default=1000)
+    parser.add_argument('--personas', type=int, default=500)
+    parser.add_argument('--dias', type=int, default=365)
+    parser.add_argument('--fecha-inicio', default='2024-01-01')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--exponente', type=float, default=1.1, help='Sesgo Zipf de popularidad')
+    args = parser.parse_args(argv)
+    resumen = generar(args.destino, args.ventas, args.productos, args.personas, args.dias,
+                      date.fromisoformat(args.fecha_inicio), args.semilla, args.exponente)
+    print(json.dumps(resumen, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
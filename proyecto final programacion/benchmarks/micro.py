@@ -0,0 +1,107 @@
+"""
+Microbenchmarks de las operaciones del backend, sin pasar por HTTP.
+
+Se ejecutan sobre una copia temporal de la carpeta de datos indicada, así que las
+escrituras (Venta.crear, JsonStorage.guardar) nunca modifican los datos originales.
+
+Uso:
+    python -m benchmarks.micro --datos /tmp/dat_100k --repeticiones 20 --salida micro.json
+"""
+import argparse
+import importlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks import resumen_latencias
+
+
+def medir(funcion, repeticiones):
+    """
+    Ejecuta funcion() el número de veces indicado y resume sus latencias.
+    :return: El diccionario de resumen_latencias.
+    """
+    latencias = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        latencias.append(time.perf_counter() - inicio)
+    return resumen_latencias(latencias)
+
+
+def _importar_backend(carpeta_datos):
+    """Importa (o reimporta) backfinal apuntando a la carpeta de datos dada."""
+    os.environ['TIENDA_DATOS_DIR'] = carpeta_datos
+    if 'backfinal' in sys.modules:
+        return importlib.reload(sys.modules['backfinal'])
+    return importlib.import_module('backfinal')
+
+
+def ejecutar(carpeta_datos, repeticiones=10, repeticiones_escritura=None):
+    """
+    Ejecuta todos los microbenchmarks.
+    :param carpeta_datos: Carpeta con product.json, person.json y venta.json.
+    :param repeticiones: Repeticiones de cada operación de lectura.
+    :param repeticiones_escritura: Repeticiones de las operaciones que escriben (por defecto, las mismas).
+    :return: Un diccionario de resultados en el formato común de los benchmarks.
+    """
+    repeticiones_escritura = repeticiones_escritura or repeticiones
+    with tempfile.TemporaryDirectory(prefix='tienda_bench_') as temporal:
+        copia = os.path.join(temporal, 'dat')
+        shutil.copytree(carpeta_datos, copia)
+        backend = _importar_backend(copia)
+
+        ventas = backend.Venta.todas()
+        productos = backend.Producto.todos()
+        fechas = sorted(v['fecha'] for v in ventas if 'fecha' in v)
+        # Rango de consulta: el último cuarto del histórico
+        fecha_inicio = fechas[len(fechas) * 3 // 4] if fechas else None
+        fecha_fin = fechas[-1] if fechas else None
+        producto_medio = productos[len(productos) // 2]['nombre'] if productos else ''
+        # Producto con mayor stock, para que Venta.crear no se quede sin unidades
+        producto_venta = max(productos, key=lambda p: p.get('stock', 0))['nombre'] if productos else ''
+
+        almacenamiento_guardar = backend.JsonStorage(os.path.join(temporal, 'guardar', 'venta.json'))
+        resultados = {
+            'JsonStorage.leer_archivo(ventas)': medir(backend.Venta.storage._leer_archivo, repeticiones),
+            'JsonStorage.cargar(ventas)': medir(backend.Venta.storage.cargar, repeticiones),
+            'JsonStorage.guardar(ventas)': medir(lambda: almacenamiento_guardar.guardar(ventas), repeticiones_escritura),
+            'Producto.buscar(existente)': medir(lambda: backend.Producto.buscar(producto_medio), repeticiones),
+            'Producto.buscar(inexistente)': medir(lambda: backend.Producto.buscar('__no_existe__'), repeticiones),
+            'Venta.crear': medir(lambda: backend.Venta.crear(
+                {'producto': {'nombre': producto_venta}, 'cantidad': 1, 'cliente': 'Benchmark'}), repeticiones_escritura),
+        }
+        for nombre in ('ventas_por_dia', 'productos_mas_vendidos', 'ventas_por_origen'):
+            funcion = getattr(backend.Venta, f'obtener_estadisticas_{nombre}')
+            resultados[f'estadisticas.{nombre}(todo)'] = medir(funcion, repeticiones)
+            resultados[f'estadisticas.{nombre}(rango)'] = medir(lambda: funcion(fecha_inicio, fecha_fin), repeticiones)
+
+    return {
+        'tipo': 'micro',
+        'parametros': {'datos': carpeta_datos, 'repeticiones': repeticiones,
+                       'ventas': len(ventas), 'productos': len(productos)},
+        'resultados': resultados,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Microbenchmarks del backend de la tienda.')
+    parser.add_argument('--datos', required=True, help='Carpeta de datos (ver benchmarks.generar_datos)')
+    parser.add_argument('--repeticiones', type=int, default=10)
+    parser.add_argument('--repeticiones-escritura', type=int, default=None)
+    parser.add_argument('--salida', help='Archivo JSON de resultados (por defecto, salida estándar)')
+    args = parser.parse_args(argv)
+    resultado = ejecutar(args.datos, args.repeticiones, args.repeticiones_escritura)
+    texto = json.dumps(resultado, ensure_ascii=False, indent=2)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as file:
+            file.write(texto)
+    else:
+        print(texto)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Índice de nombres para el autocompletado (sugerencias de productos y personas).
+
+Los nombres se normalizan (sin tildes y en minúsculas) y se guardan ordenados: las
+coincidencias por prefijo se encuentran con búsqueda binaria, sin recorrer la lista. Las
+coincidencias en cualquier parte del nombre se buscan con str.find sobre un solo texto con
+todos los nombres, que recorre la memoria en C en lugar de comparar nombre por nombre.
+
+El índice es inmutable: cuando cambian los datos se construye uno nuevo (ver
+IndiceNombres.para), así las consultas concurrentes no necesitan locks.
+"""
+import bisect
+import threading
+import unicodedata
+
+SEPARADOR = '\n' # No aparece en los nombres normalizados (ver normalizar)
+
+
+def normalizar(texto):
+    """
+    Normaliza un texto para compararlo sin distinguir tildes ni mayúsculas
+    (ej. 'Café Molido' -> 'cafe molido').
+    """
+    descompuesto = unicodedata.normalize('NFKD', str(texto))
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_tildes.casefold().split())
+
+
+class IndiceNombres:
+    """
+    Nombres ordenados por su forma normalizada, para sugerencias por prefijo y por subcadena.
+    """
+    # Índices ya construidos: {clave: (version_de_los_datos, indice)}
+    _cache = {}
+    _lock_cache = threading.Lock()
+
+    def __init__(self, nombres):
+        pares = sorted({(normalizar(n), n) for n in nombres if isinstance(n, str) and n})
+        self.claves = [clave for clave, _ in pares]
+        self.nombres = [nombre for _, nombre in pares]
+        self._texto = SEPARADOR.join(self.claves)
+        # Posición de inicio de cada nombre dentro de _texto, para ubicar una coincidencia
+        self._inicios = []
+        posicion = 0
+        for clave in self.claves:
+            self._inicios.append(posicion)
+            posicion += len(clave) + len(SEPARADOR)
+
+    @classmethod
+    def para(cls, clave, version, obtener_nombres):
+        """
+        Retorna el índice de un conjunto de datos, reconstruyéndolo solo si cambió su versión.
+        :param clave: Identifica el conjunto de datos (ej. la ruta del archivo).
+        :param version: Versión actual de los datos.
+        :param obtener_nombres: Función que retorna los nombres a indexar.
+        """
+        vigente = cls._cache.get(clave)
+        if vigente is not None and vigente[0] == version:
+            return vigente[1]
+        with cls._lock_cache:
+            vigente = cls._cache.get(clave)
+            if vigente is None or vigente[0] != version:
+                vigente = (version, cls(obtener_nombres()))
+                cls._cache[clave] = vigente
+        return vigente[1]
+
+    def __len__(self):
+        return len(self.nombres)
+
+    def sugerir(self, consulta, limite=10):
+        """
+        Retorna hasta 'limite' nombres que coinciden con la consulta: primero los que
+        empiezan con ella y luego los que la contienen, cada grupo en orden alfabético.
+        :param consulta: Texto escrito por el usuario (sin distinguir tildes ni mayúsculas).
+        :param limite: Cantidad máxima de sugerencias.
+        """
+        consulta = normalizar(consulta)
+        if not consulta:
+            return self.nombres[:limite]
+
+        inicio = bisect.bisect_left(self.claves, consulta)
+        fin = inicio
+        while fin < len(self.claves) and fin - inicio < limite and self.claves[fin].startswith(consulta):
+            fin += 1
+        resultado = self.nombres[inicio:fin]
+
+        # Completar con los nombres que contienen la consulta más adelante (no al inicio)
+        encontrados = set(range(inicio, fin))
+        posicion = self._texto.find(consulta)
+        while posicion != -1 and len(resultado) < limite:
+            i = bisect.bisect_right(self._inicios, posicion) - 1
+            if i not in encontrados and not self.claves[i].startswith(consulta):
+                encontrados.add(i)
+                resultado.append(self.nombres[i])
+            # Se sigue buscando desde el siguiente nombre: una coincidencia por nombre basta
+            siguiente = self._inicios[i + 1] if i + 1 < len(self._inicios) else len(self._texto)
+            posicion = self._texto.find(consulta, siguiente)
+        return resultado
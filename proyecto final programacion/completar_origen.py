@@ -0,0 +1,38 @@
+"""
+Completa el 'origen' de las ventas antiguas de venta.json que no lo tienen.
+
+Las ventas nuevas guardan el origen del producto al registrarse; las anteriores a ese cambio
+dependían del catálogo para las estadísticas por origen y desaparecían si el producto se
+renombraba o eliminaba. Esta herramienta copia el origen del producto actual a cada venta
+sin origen ('Desconocido' si el producto ya no existe). Es idempotente: se puede ejecutar
+más de una vez.
+
+Usar con el servidor detenido (o sobre una copia de los datos):
+    python completar_origen.py                  # carpeta dat/ del proyecto
+    python completar_origen.py --datos /ruta/dat --simular
+"""
+import argparse
+import json
+import os
+import sys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Completa el 'origen' de las ventas que no lo tienen.")
+    parser.add_argument('--datos', help='Carpeta de datos (por defecto TIENDA_DATOS_DIR o dat/ del proyecto)')
+    parser.add_argument('--simular', action='store_true', help='Solo informa cuántas ventas se completarían')
+    args = parser.parse_args(argv)
+
+    if args.datos:
+        os.environ['TIENDA_DATOS_DIR'] = os.path.abspath(args.datos)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import backfinal # Después de fijar TIENDA_DATOS_DIR: el módulo lee la carpeta al importarse
+
+    resumen = backfinal.Venta.completar_origen(simular=args.simular)
+    backfinal.cerrar()
+    print(json.dumps(dict(resumen, simulado=args.simular), ensure_ascii=False))
+    return 1 if 'error' in resumen else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
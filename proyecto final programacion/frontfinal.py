@@ -1,16 +1,170 @@
+import time
+_INICIO_PROCESO = time.perf_counter() # Referencia para medir el tiempo de arranque del cliente
+
 import tkinter as tk
 from tkinter import ttk, messagebox, Toplevel
-import requests
 import json
 from datetime import datetime
-from tkcalendar import DateEntry, Calendar
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from tkinter import filedialog
 import threading # Importar el módulo threading
+import collections
+import random
+import os
+# Los módulos pesados (requests, matplotlib, tkcalendar) se importan en el primer uso
+# para que la ventana principal aparezca cuanto antes.
 
 API_URL = "http://localhost:5000" # URL base de tu API Flask
 
+# Archivo donde el cliente guarda las últimas respuestas exitosas de la API (caché local)
+CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache_cliente.json')
+RETRASO_ESCRITURA_CACHE_S = 1.0 # Agrupa varias respuestas en una sola escritura del archivo de caché
+
+# Parámetros para las solicitudes de estadísticas
+DEBOUNCE_ESTADISTICAS_MS = 400 # Espera tras el último cambio de fecha antes de consultar la API
+MAX_SOLICITUDES_ESTADISTICAS = 3 # Máximo de solicitudes de estadísticas en vuelo al mismo tiempo
+PIXELES_POR_BARRA = 12 # Ancho mínimo en pantalla de cada barra; limita 'max_puntos' según el ancho del gráfico
+TOP_PRODUCTOS_GRAFICO = 20 # Productos mostrados en el gráfico de más vendidos (el resto va a 'Otros')
+
+# Reintentos cuando el servidor rechaza una solicitud por sobrecarga (503/429 con Retry-After)
+MAX_REINTENTOS_SOBRECARGA = 3
+ESPERA_BASE_REINTENTO_S = 0.5 # Se duplica en cada intento (backoff exponencial)
+MAX_ESPERA_REINTENTO_S = 10.0
+
+# Autocompletado de los combobox de productos y clientes (consulta /productos/sugerir y /personas/sugerir)
+DEBOUNCE_SUGERENCIAS_MS = 250 # Espera tras la última tecla antes de consultar la API
+LIMITE_SUGERENCIAS = 15 # Sugerencias mostradas en el combobox
+MAX_SUGERENCIAS_CACHEADAS = 500 # Consultas recordadas en memoria (se vacía al actualizar los datos)
+
+
+class CacheLocal:
+    """
+    Caché en disco de las últimas respuestas exitosas de la API (stale-while-revalidate).
+    Al iniciar, la aplicación dibuja con estos datos de inmediato y luego los revalida
+    en segundo plano contra el servidor. Es seguro usarla desde varios hilos.
+    """
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._lock = threading.Lock()
+        self._timer = None
+        self._datos = self._cargar()
+
+    def _cargar(self):
+        """Carga el archivo de caché; retorna un diccionario vacío si no existe o está corrupto."""
+        try:
+            with open(self.filepath, 'r', encoding='utf-8') as file:
+                datos = json.load(file)
+            return datos if isinstance(datos, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _clave(endpoint, params):
+        """Construye la clave de la caché a partir del endpoint y sus parámetros."""
+        return f"{endpoint}?{json.dumps(params or {}, sort_keys=True)}"
+
+    def obtener(self, endpoint, params=None):
+        """
+        Retorna la última respuesta guardada para el endpoint y parámetros dados.
+        :return: Los datos guardados o None si no hay entrada en la caché.
+        """
+        with self._lock:
+            entrada = self._datos.get(self._clave(endpoint, params))
+        return entrada['datos'] if entrada else None
+
+    def guardar(self, endpoint, params, datos):
+        """
+        Guarda una respuesta en la caché y programa su escritura a disco.
+        Las escrituras se agrupan durante RETRASO_ESCRITURA_CACHE_S segundos.
+        """
+        with self._lock:
+            self._datos[self._clave(endpoint, params)] = {'datos': datos, 'guardado': datetime.now().isoformat()}
+            if self._timer is None:
+                self._timer = threading.Timer(RETRASO_ESCRITURA_CACHE_S, self._escribir)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _escribir(self):
+        """Escribe la caché a disco de forma atómica (archivo temporal + reemplazo)."""
+        with self._lock:
+            self._timer = None
+            contenido = json.dumps(self._datos, ensure_ascii=False)
+        temporal = f"{self.filepath}.tmp"
+        try:
+            with open(temporal, 'w', encoding='utf-8') as file:
+                file.write(contenido)
+            os.replace(temporal, self.filepath)
+        except OSError:
+            pass # La caché es solo una optimización; un fallo de escritura no debe afectar a la aplicación
+
+
+class GraficoBarras:
+    """
+    Gráfico de barras reutilizable dibujado sobre un eje propio de Matplotlib.
+    Cuando las categorías no cambian, reutiliza las barras existentes y solo actualiza
+    sus alturas (y colores); el diseño de la figura (tight_layout) se recalcula únicamente
+    cuando cambia el conjunto de etiquetas. El redibujado se delega a draw_idle().
+    """
+    def __init__(self, ax, canvas, mensaje_vacio, rotacion_etiquetas=0):
+        self.ax = ax
+        self.canvas = canvas
+        self.rotacion_etiquetas = rotacion_etiquetas
+        self.barras = None # BarContainer actual (None si no hay datos)
+        self.etiquetas = None # Etiquetas del eje X dibujadas actualmente
+        self.texto_vacio = ax.text(0.5, 0.5, mensaje_vacio, ha='center', va='center', transform=ax.transAxes)
+
+    def tiene_datos(self):
+        """Indica si el gráfico muestra barras actualmente."""
+        return self.barras is not None
+
+    def actualizar(self, data, title=None, xlabel=None, ylabel=None, colores=None):
+        """
+        Actualiza el gráfico con nuevos datos.
+        :param data: Diccionario con etiquetas como claves y alturas de barra como valores.
+        :param title: Título del gráfico. Opcional.
+        :param xlabel: Etiqueta del eje X. Opcional.
+        :param ylabel: Etiqueta del eje Y. Opcional.
+        :param colores: Lista de colores por barra. Opcional.
+        """
+        etiquetas = list(data.keys()) if data else []
+        valores = list(data.values()) if data else []
+        recalcular_diseno = False
+
+        if etiquetas != self.etiquetas:
+            # Cambió el conjunto de categorías: se reconstruyen las barras
+            if self.barras is not None:
+                self.barras.remove()
+                self.barras = None
+            posiciones = list(range(len(etiquetas))) # Posiciones numéricas: evita acumular categorías en el eje
+            if etiquetas:
+                self.barras = self.ax.bar(posiciones, valores, color=colores)
+            self.ax.set_xticks(posiciones)
+            self.ax.set_xticklabels(etiquetas, rotation=self.rotacion_etiquetas)
+            self.etiquetas = etiquetas
+            recalcular_diseno = True
+        elif self.barras is not None:
+            # Mismas categorías: solo se actualizan las alturas de las barras existentes
+            for rect, valor in zip(self.barras, valores):
+                rect.set_height(valor)
+            if colores:
+                for rect, color in zip(self.barras, colores):
+                    rect.set_color(color)
+
+        self.texto_vacio.set_visible(not etiquetas)
+        if etiquetas:
+            self.ax.relim()
+            self.ax.autoscale_view()
+        if title is not None:
+            self.ax.set_title(title)
+        if xlabel is not None:
+            self.ax.set_xlabel(xlabel)
+        if ylabel is not None:
+            self.ax.set_ylabel(ylabel)
+
+        if recalcular_diseno:
+            self.ax.figure.tight_layout() # Solo cuando cambian las etiquetas
+        self.canvas.draw_idle() # Redibujado diferido, no bloquea el hilo de Tkinter
+
+
 class TiendaApp:
     def __init__(self, root):
         self.root = root
@@ -40,15 +194,63 @@ class TiendaApp:
         btn_actualizar_todo = ttk.Button(root, text="Actualizar Todos los Datos", command=self.actualizar_todos_los_datos)
         btn_actualizar_todo.pack(pady=5)
 
-        # Cargar el contenido de cada pestaña
-        self.cargar_tab_productos()
-        self.cargar_tab_clientes()
-        self.cargar_tab_ventas()
-        self.cargar_tab_estadisticas()
-        self.setup_tab_utilidad()
+        # Estado de las solicitudes de estadísticas: cada cambio de filtro abre una nueva
+        # "generación" y las respuestas de generaciones anteriores se descartan.
+        self._estadisticas_generacion = 0
+        self._estadisticas_en_vuelo = 0
+        self._estadisticas_pendientes = [] # Cola de (generacion, endpoint, params, callback)
+        self._estadisticas_after_id = None # Temporizador del debounce de los DateEntry
+
+        # Caché local de respuestas: permite dibujar al instante y revalidar en segundo plano
+        self.cache = CacheLocal(CACHE_FILE)
+
+        # Autocompletado: sugerencias ya recibidas {(endpoint, texto): nombres} y debounce por combobox
+        self._sugerencias_cache = collections.OrderedDict()
+        self._sugerencias_after_ids = {}
+
+        # Cada pestaña se construye (y carga sus datos) la primera vez que se selecciona.
+        # Para cada pestaña: (función que crea sus widgets, función que carga sus datos o None)
+        self._pestanas = {
+            str(self.tab_productos): (self.cargar_tab_productos, self.cargar_datos_productos),
+            str(self.tab_clientes): (self.cargar_tab_clientes, self.cargar_datos_clientes),
+            str(self.tab_ventas): (self.cargar_tab_ventas, self.cargar_datos_ventas),
+            str(self.tab_estadisticas): (self.cargar_tab_estadisticas, self.actualizar_estadisticas_con_filtro),
+            str(self.tab_utilidad): (self.setup_tab_utilidad, None),
+        }
+        self._pestanas_construidas = [] # En orden de construcción
+        self.tiempos_inicio = {} # {etapa: milisegundos desde el inicio del proceso}
+        self.tab_control.bind("<<NotebookTabChanged>>", self._al_cambiar_pestana)
 
-        # Cargar todos los datos al iniciar la aplicación para tener una vista inicial
-        self.actualizar_todos_los_datos()
+        # Construir la pestaña visible al iniciar: se muestran primero los datos de la caché
+        # local y se revalidan en segundo plano, sin bloquear la ventana con mensajes de espera
+        self._al_cambiar_pestana()
+        self._registrar_tiempo_inicio("interfaz construida")
+        self.root.after_idle(self._registrar_tiempo_inicio, "primera pantalla")
+
+    def _registrar_tiempo_inicio(self, etapa):
+        """
+        Registra e informa por consola el tiempo transcurrido desde el inicio del proceso.
+        :param etapa: Descripción de la etapa alcanzada.
+        """
+        ms = (time.perf_counter() - _INICIO_PROCESO) * 1000
+        self.tiempos_inicio[etapa] = ms
+        print(f"[inicio] {etapa}: {ms:.1f} ms")
+
+    def _al_cambiar_pestana(self, event=None):
+        """
+        Construye la pestaña seleccionada la primera vez que se muestra e inicia la carga de sus datos.
+        """
+        pestana = self.tab_control.select()
+        if not pestana or pestana in self._pestanas_construidas:
+            return
+        construir, cargar_datos = self._pestanas[pestana]
+        inicio = time.perf_counter()
+        construir()
+        self._pestanas_construidas.append(pestana)
+        if cargar_datos:
+            cargar_datos()
+        nombre = self.tab_control.tab(pestana, 'text')
+        print(f"[inicio] pestaña '{nombre}' construida en {(time.perf_counter() - inicio) * 1000:.1f} ms")
 
     def mostrar_mensaje(self, titulo, mensaje):
         """Muestra un cuadro de diálogo informativo."""
@@ -62,31 +264,47 @@ class TiendaApp:
 
     def _make_api_request_threaded(self, method, endpoint, json_data=None, params=None,
                                    success_callback=None, error_callback=None,
-                                   success_msg=None, error_title="Error de API"):
+                                   success_msg=None, error_title="Error de API", usar_cache=False,
+                                   silencioso=False):
         """
         Realiza una solicitud a la API en un hilo separado para no bloquear la interfaz de usuario.
         Los callbacks (funciones a ejecutar tras éxito o error) se ejecutan en el hilo principal de Tkinter.
+        Si usar_cache es True, la respuesta exitosa de un GET se guarda en la caché local.
+        Si silencioso es True, los errores no se muestran en un cuadro de diálogo (solo se llama a error_callback).
         """
+        mostrar_error = (lambda titulo, mensaje: None) if silencioso else self.mostrar_error
+
         def run_request():
+            import requests # Importación diferida: se resuelve en el hilo de trabajo, no en el arranque
             response = None # Inicializar response para manejo de errores
             try:
                 url = f"{API_URL}/{endpoint}" # Construir la URL completa de la API
                 
-                # Realizar la solicitud HTTP según el método especificado
-                if method == 'GET':
-                    response = requests.get(url, params=params)
-                elif method == 'POST':
-                    response = requests.post(url, json=json_data)
-                elif method == 'PUT':
-                    response = requests.put(url, json=json_data)
-                elif method == 'DELETE':
-                    response = requests.delete(url, json=json_data)
-                else:
-                    raise ValueError("Método HTTP no soportado por _make_api_request_threaded")
+                # Realizar la solicitud HTTP según el método especificado. Si el servidor está
+                # saturado (503/429 con Retry-After) se reintenta tras la espera indicada
+                for intento in range(MAX_REINTENTOS_SOBRECARGA + 1):
+                    if method == 'GET':
+                        response = requests.get(url, params=params)
+                    elif method == 'POST':
+                        response = requests.post(url, json=json_data)
+                    elif method == 'PUT':
+                        response = requests.put(url, json=json_data)
+                    elif method == 'PATCH':
+                        response = requests.patch(url, json=json_data)
+                    elif method == 'DELETE':
+                        response = requests.delete(url, json=json_data)
+                    else:
+                        raise ValueError("Método HTTP no soportado por _make_api_request_threaded")
+                    espera = self._espera_reintento(response, intento)
+                    if espera is None:
+                        break
+                    time.sleep(espera)
 
                 response.raise_for_status() # Lanza una excepción si el código de estado es 4xx o 5xx
 
                 result_data = response.json() # Obtener la respuesta JSON
+                if usar_cache and method == 'GET':
+                    self.cache.guardar(endpoint, params, result_data)
                 if success_msg:
                     self.mostrar_mensaje("Éxito", success_msg) # Mostrar mensaje de éxito si se proporciona
                 if success_callback:
@@ -103,31 +321,31 @@ class TiendaApp:
                         error_msg = str(http_err)
                 except json.JSONDecodeError:
                     error_msg = f"Error del servidor: {response.text if response else 'No response'}"
-                self.mostrar_error(error_title, f"Error HTTP {response.status_code if response else 'N/A'}: {error_msg}")
+                mostrar_error(error_title, f"Error HTTP {response.status_code if response else 'N/A'}: {error_msg}")
                 if error_callback:
                     self.root.after(0, error_callback, error_msg)
             except requests.exceptions.ConnectionError as conn_err:
                 # Manejo de errores de conexión (ej. el servidor no está corriendo)
-                self.mostrar_error(error_title, f"Error de conexión: No se pudo conectar al servidor Flask. Asegúrate de que esté corriendo. {conn_err}")
+                mostrar_error(error_title, f"Error de conexión: No se pudo conectar al servidor Flask. Asegúrate de que esté corriendo. {conn_err}")
                 if error_callback:
                     self.root.after(0, error_callback, str(conn_err))
             except requests.exceptions.Timeout as timeout_err:
                 # Manejo de errores de tiempo de espera
-                self.mostrar_error(error_title, f"Tiempo de espera agotado: El servidor tardó demasiado en responder. {timeout_err}")
+                mostrar_error(error_title, f"Tiempo de espera agotado: El servidor tardó demasiado en responder. {timeout_err}")
                 if error_callback:
                     self.root.after(0, error_callback, str(timeout_err))
             except requests.exceptions.RequestException as req_err:
                 # Otros errores generales de solicitud
-                self.mostrar_error(error_title, f"Error de solicitud: {req_err}")
+                mostrar_error(error_title, f"Error de solicitud: {req_err}")
                 if error_callback:
                     self.root.after(0, error_callback, str(req_err))
             except ValueError as val_err:
                 # Errores de validación interna
-                self.mostrar_error(error_title, str(val_err))
+                mostrar_error(error_title, str(val_err))
                 if error_callback:
                     self.root.after(0, error_callback, str(val_err))
             except Exception as ex: # Captura cualquier otra excepción inesperada
-                self.mostrar_error(error_title, f"Ocurrió un error inesperado: {ex}")
+                mostrar_error(error_title, f"Ocurrió un error inesperado: {ex}")
                 if error_callback:
                     self.root.after(0, error_callback, str(ex))
 
@@ -136,32 +354,109 @@ class TiendaApp:
         thread.daemon = True # Permite que el programa se cierre incluso si el hilo está corriendo
         thread.start()
 
-    def actualizar_todos_los_datos(self):
+    @staticmethod
+    def _espera_reintento(response, intento):
         """
-        Inicia la actualización de todos los datos en las diferentes pestañas.
-        Las operaciones de carga se realizan de forma asíncrona mediante hilos.
+        Retorna los segundos a esperar antes de reintentar una solicitud rechazada por
+        sobrecarga (503 o 429 con Retry-After), o None si no corresponde reintentar.
+        La espera respeta Retry-After, crece exponencialmente con cada intento y tiene una
+        parte aleatoria (jitter) para que los clientes no reintenten todos a la vez.
+        :param intento: Número de intento (0 para el primero).
         """
-        self.mostrar_mensaje("Actualizando", "Cargando datos, por favor espere...")
+        if response.status_code not in (429, 503) or intento >= MAX_REINTENTOS_SOBRECARGA:
+            return None
+        try:
+            retry_after = float(response.headers.get('Retry-After', ''))
+        except ValueError:
+            return None # Sin Retry-After el rechazo no es del control de admisión: no se reintenta
+        espera = max(retry_after, ESPERA_BASE_REINTENTO_S * 2 ** intento)
+        return min(random.uniform(espera, espera * 1.5), MAX_ESPERA_REINTENTO_S)
 
-        # Cargar datos para la pestaña de Productos
-        self.cargar_lista_productos()
-        self.cargar_productos_combo_editar()
+    def _get_con_cache(self, endpoint, success_callback, params=None):
+        """
+        Realiza un GET con estrategia stale-while-revalidate: si hay una respuesta en la
+        caché local, se entrega de inmediato a success_callback y luego se revalida con
+        el servidor en segundo plano, volviendo a llamar a success_callback con los datos frescos.
+        """
+        cacheado = self.cache.obtener(endpoint, params)
+        if cacheado is not None:
+            success_callback(cacheado)
+        self._make_api_request_threaded('GET', endpoint, params=params,
+                                        success_callback=success_callback, usar_cache=True)
 
-        # Cargar datos para la pestaña de Clientes
-        self.cargar_lista_clientes()
-        self.cargar_clientes_combo_eliminar()
+    def configurar_autocompletado(self, combo, endpoint):
+        """
+        Hace que un combobox sugiera nombres a medida que se escribe, consultando
+        '<endpoint>/sugerir' en lugar de cargar la lista completa de productos o personas.
+        :param combo: El ttk.Combobox a configurar.
+        :param endpoint: 'productos' o 'personas'.
+        """
+        combo.bind('<KeyRelease>', lambda event: self._programar_sugerencias(combo, endpoint, event))
+        combo.bind('<FocusIn>', lambda event: self._pedir_sugerencias(combo, endpoint), add='+')
 
-        # Cargar datos para la pestaña de Ventas
-        self.cargar_lista_ventas()
-        self.cargar_productos_combo_venta()
-        self.cargar_clientes_combo_venta()
-        self.cargar_ventas_combo_cancelar()
+    def _programar_sugerencias(self, combo, endpoint, event=None):
+        """
+        Programa la consulta de sugerencias tras una tecla. Las teclas seguidas se agrupan
+        en una sola consulta (debounce); las de navegación no generan consultas.
+        """
+        if event is not None and event.keysym in ('Up', 'Down', 'Left', 'Right', 'Return', 'Escape', 'Tab'):
+            return
+        after_id = self._sugerencias_after_ids.pop(combo, None)
+        if after_id is not None:
+            self.root.after_cancel(after_id)
+        self._sugerencias_after_ids[combo] = self.root.after(DEBOUNCE_SUGERENCIAS_MS,
+                                                             self._pedir_sugerencias, combo, endpoint)
+
+    def _pedir_sugerencias(self, combo, endpoint):
+        """
+        Muestra en el combobox las sugerencias para el texto escrito: desde la caché en memoria
+        si ya se consultaron, o pidiéndolas a la API. Las respuestas que llegan cuando el texto
+        ya cambió se guardan en la caché pero no se muestran.
+        """
+        self._sugerencias_after_ids.pop(combo, None)
+        texto = combo.get()
+        clave = (endpoint, texto.strip().casefold())
+        if clave in self._sugerencias_cache:
+            self._sugerencias_cache.move_to_end(clave)
+            combo['values'] = self._sugerencias_cache[clave]
+            return
+
+        def _on_success(nombres):
+            self._sugerencias_cache[clave] = nombres
+            while len(self._sugerencias_cache) > MAX_SUGERENCIAS_CACHEADAS:
+                self._sugerencias_cache.popitem(last=False)
+            if combo.get() == texto:
+                combo['values'] = nombres
+        self._make_api_request_threaded('GET', f'{endpoint}/sugerir', params={'q': texto, 'limit': LIMITE_SUGERENCIAS},
+                                        success_callback=_on_success, silencioso=True)
+
+    def refrescar_sugerencias(self, combo, endpoint):
+        """
+        Descarta las sugerencias cacheadas de un endpoint (los datos cambiaron) y vuelve a
+        pedir las del texto actual del combobox.
+        """
+        for clave in [c for c in self._sugerencias_cache if c[0] == endpoint]:
+            del self._sugerencias_cache[clave]
+        self._pedir_sugerencias(combo, endpoint)
+
+    def actualizar_todos_los_datos(self, mostrar_avisos=True):
+        """
+        Inicia la actualización de todos los datos en las diferentes pestañas.
+        Las operaciones de carga se realizan de forma asíncrona mediante hilos.
+        :param mostrar_avisos: Si es True, muestra los mensajes de inicio y fin de la actualización.
+        """
+        if mostrar_avisos:
+            self.mostrar_mensaje("Actualizando", "Cargando datos, por favor espere...")
 
-        # Cargar datos para la pestaña de Estadísticas
-        self.actualizar_estadisticas_con_filtro()
+        # Cargar los datos solo de las pestañas ya construidas; las demás los cargarán al abrirse
+        for pestana in self._pestanas_construidas:
+            cargar_datos = self._pestanas[pestana][1]
+            if cargar_datos:
+                cargar_datos()
 
         # Mostrar mensaje de actualización completa después de un breve retraso
-        self.root.after(2000, lambda: self.mostrar_mensaje("Actualización Completa", "Todos los datos y gráficos han sido actualizados."))
+        if mostrar_avisos:
+            self.root.after(2000, lambda: self.mostrar_mensaje("Actualización Completa", "Todos los datos y gráficos han sido actualizados."))
 
 
     # --- Pestaña de Productos ---
@@ -192,6 +487,7 @@ class TiendaApp:
         lbl_seleccionar_producto.grid(row=5, column=0, padx=5, pady=5)
         self.combo_productos_editar = ttk.Combobox(self.tab_productos, values=[])
         self.combo_productos_editar.grid(row=5, column=1, padx=5, pady=5)
+        self.configurar_autocompletado(self.combo_productos_editar, 'productos')
 
         # Botones para modificar y eliminar productos
         btn_modificar_producto = ttk.Button(self.tab_productos, text="Modificar Producto", command=self.modificar_producto)
@@ -210,12 +506,14 @@ class TiendaApp:
         self.tree_productos.column("Origen", width=100)
         self.tree_productos.grid(row=8, column=0, columnspan=2, padx=5, pady=5)
 
+    def cargar_datos_productos(self):
+        """Carga los datos de la pestaña de Productos."""
+        self.cargar_lista_productos()
+        self.cargar_productos_combo_editar()
+
     def cargar_productos_combo_editar(self):
-        """Carga los nombres de los productos en el combobox de edición."""
-        def _on_success(productos):
-            nombres_productos = [producto['nombre'] for producto in productos]
-            self.combo_productos_editar['values'] = nombres_productos
-        self._make_api_request_threaded('GET', 'productos', success_callback=_on_success)
+        """Actualiza las sugerencias de productos del combobox de edición (se completan al escribir)."""
+        self.refrescar_sugerencias(self.combo_productos_editar, 'productos')
 
     def crear_producto(self):
         """Envía una solicitud a la API para crear un nuevo producto."""
@@ -272,7 +570,7 @@ class TiendaApp:
             for producto in productos: # Insertar nuevos datos
                 self.tree_productos.insert("", tk.END, text=producto['nombre'],
                                            values=(producto['stock'], producto.get('origen', 'N/A')))
-        self._make_api_request_threaded('GET', 'productos', success_callback=_on_success)
+        self._get_con_cache('productos', _on_success)
 
 
     ## --- Pestaña de Clientes ---
@@ -293,6 +591,7 @@ class TiendaApp:
         lbl_seleccionar_cliente_eliminar.grid(row=2, column=0, padx=5, pady=5)
         self.combo_clientes_eliminar = ttk.Combobox(self.tab_clientes, values=[])
         self.combo_clientes_eliminar.grid(row=2, column=1, padx=5, pady=5)
+        self.configurar_autocompletado(self.combo_clientes_eliminar, 'personas')
 
         # Botón para eliminar un cliente
         btn_eliminar_cliente = ttk.Button(self.tab_clientes, text="Eliminar Cliente", command=self.eliminar_cliente)
@@ -304,12 +603,14 @@ class TiendaApp:
         self.tree_clientes.column("#0", width=200)
         self.tree_clientes.grid(row=4, column=0, columnspan=2, padx=5, pady=5)
 
+    def cargar_datos_clientes(self):
+        """Carga los datos de la pestaña de Clientes."""
+        self.cargar_lista_clientes()
+        self.cargar_clientes_combo_eliminar()
+
     def cargar_clientes_combo_eliminar(self):
-        """Carga los nombres de los clientes en el combobox de eliminación."""
-        def _on_success(personas):
-            nombres_clientes = [persona['nombre'] for persona in personas]
-            self.combo_clientes_eliminar['values'] = nombres_clientes
-        self._make_api_request_threaded('GET', 'personas', success_callback=_on_success)
+        """Actualiza las sugerencias de clientes del combobox de eliminación (se completan al escribir)."""
+        self.refrescar_sugerencias(self.combo_clientes_eliminar, 'personas')
 
     def crear_cliente(self):
         """Envía una solicitud a la API para crear un nuevo cliente."""
@@ -341,7 +642,7 @@ class TiendaApp:
                 self.tree_clientes.delete(item)
             for persona in personas: # Insertar nuevos datos
                 self.tree_clientes.insert("", tk.END, text=persona.get('nombre'))
-        self._make_api_request_threaded('GET', 'personas', success_callback=_on_success)
+        self._get_con_cache('personas', _on_success)
 
     ## --- Pestaña de Ventas ---
     def cargar_tab_ventas(self):
@@ -351,6 +652,7 @@ class TiendaApp:
         lbl_producto.grid(row=0, column=0, padx=5, pady=5)
         self.combo_productos_venta = ttk.Combobox(self.tab_ventas, values=[])
         self.combo_productos_venta.grid(row=0, column=1, padx=5, pady=5)
+        self.configurar_autocompletado(self.combo_productos_venta, 'productos')
 
         lbl_cantidad = ttk.Label(self.tab_ventas, text="Cantidad:")
         lbl_cantidad.grid(row=1, column=0, padx=5, pady=5)
@@ -361,6 +663,7 @@ class TiendaApp:
         lbl_cliente.grid(row=2, column=0, padx=5, pady=5)
         self.combo_clientes_venta = ttk.Combobox(self.tab_ventas, values=[])
         self.combo_clientes_venta.grid(row=2, column=1, padx=5, pady=5)
+        self.configurar_autocompletado(self.combo_clientes_venta, 'personas')
 
         # Botón para realizar una venta
         btn_realizar_venta = ttk.Button(self.tab_ventas, text="Realizar Venta", command=self.realizar_venta)
@@ -380,7 +683,7 @@ class TiendaApp:
 
         # Treeview para mostrar la lista de ventas
         self.tree_ventas = ttk.Treeview(self.tab_ventas, columns=("Producto", "Cantidad", "Cliente", "Fecha", "Origen"))
-        self.tree_ventas.heading("#0", text="Índice") # Un índice simple para identificar ventas
+        self.tree_ventas.heading("#0", text="ID") # Id de la venta en el backend
         self.tree_ventas.heading("Producto", text="Producto")
         self.tree_ventas.heading("Cantidad", text="Cantidad")
         self.tree_ventas.heading("Cliente", text="Cliente")
@@ -389,30 +692,31 @@ class TiendaApp:
         self.tree_ventas.column("#0", width=50)
         self.tree_ventas.grid(row=8, column=0, columnspan=2, padx=5, pady=5)
 
+    def cargar_datos_ventas(self):
+        """Carga los datos de la pestaña de Ventas."""
+        self.cargar_lista_ventas()
+        self.cargar_productos_combo_venta()
+        self.cargar_clientes_combo_venta()
+        self.cargar_ventas_combo_cancelar()
+
     def cargar_productos_combo_venta(self):
-        """Carga los nombres de los productos en el combobox para nuevas ventas."""
-        def _on_success(productos):
-            nombres_productos = [producto['nombre'] for producto in productos]
-            self.combo_productos_venta['values'] = nombres_productos
-        self._make_api_request_threaded('GET', 'productos', success_callback=_on_success)
+        """Actualiza las sugerencias de productos del combobox para nuevas ventas (se completan al escribir)."""
+        self.refrescar_sugerencias(self.combo_productos_venta, 'productos')
 
     def cargar_clientes_combo_venta(self):
-        """Carga los nombres de los clientes en el combobox para nuevas ventas."""
-        def _on_success(personas):
-            nombres_clientes = [persona['nombre'] for persona in personas]
-            self.combo_clientes_venta['values'] = nombres_clientes
-        self._make_api_request_threaded('GET', 'personas', success_callback=_on_success)
+        """Actualiza las sugerencias de clientes del combobox para nuevas ventas (se completan al escribir)."""
+        self.refrescar_sugerencias(self.combo_clientes_venta, 'personas')
 
     def cargar_ventas_combo_cancelar(self):
         """Carga las ventas existentes en el combobox para cancelar/modificar."""
         def _on_success(ventas):
             # Formatear las ventas para mostrarlas de forma legible en el combobox
             self.combo_ventas_cancelar['values'] = [
-                f"{venta.get('producto', 'N/A')} - {venta.get('cliente', 'Sin nombre')} - {venta.get('fecha', 'N/A')}"
+                f"#{venta.get('id', '?')} {venta.get('producto', 'N/A')} - {venta.get('cliente', 'Sin nombre')} - {venta.get('fecha', 'N/A')}"
                 for venta in ventas
             ]
             self.combo_ventas_cancelar.ventas_data = ventas # Almacenar datos completos para futuras operaciones
-        self._make_api_request_threaded('GET', 'ventas', success_callback=_on_success)
+        self._get_con_cache('ventas', _on_success)
 
     def realizar_venta(self):
         """Envía una solicitud a la API para registrar una nueva venta."""
@@ -429,33 +733,32 @@ class TiendaApp:
         else:
             self.mostrar_error("Error", "Por favor, seleccione un producto, un cliente e ingrese una cantidad válida (número entero positivo).")
 
+    def _venta_seleccionada(self):
+        """
+        Retorna la venta seleccionada: la fila marcada en el Treeview o, si no hay ninguna,
+        la elegida en el combobox de cancelar/modificar. Retorna None si no hay selección.
+        """
+        seleccion = self.tree_ventas.selection()
+        if seleccion:
+            item = self.tree_ventas.item(seleccion[0])
+            valores = item['values']
+            return {'id': item['text'], 'producto': valores[0], 'cliente': valores[2], 'fecha': valores[3]}
+        indice = self.combo_ventas_cancelar.current()
+        ventas = getattr(self.combo_ventas_cancelar, 'ventas_data', [])
+        if 0 <= indice < len(ventas):
+            return ventas[indice]
+        return None
+
     def cancelar_venta(self):
-        """Envía una solicitud a la API para cancelar una venta y revertir el stock."""
-        seleccion = self.combo_ventas_cancelar.get()
-        if not seleccion:
+        """Envía una solicitud a la API para cancelar una venta (por su id) y revertir el stock."""
+        venta = self._venta_seleccionada()
+        if not venta or venta.get('id') in (None, ''):
             self.mostrar_error("Error", "Debe seleccionar una venta para cancelar.")
             return
 
-        try:
-            # Parsear la selección para obtener los detalles de la venta
-            partes = seleccion.split(" - ")
-            if len(partes) == 3: # Asegurarse de que el formato sea el esperado
-                producto, cliente, fecha = partes
-            else:
-                self.mostrar_error("Error", "Formato de venta no válido en la selección. Asegúrese de que el producto, cliente y fecha estén presentes.")
-                return
-
-        except ValueError:
-            self.mostrar_error("Error", "Formato de venta no válido.")
-            return
-
-        data = {
-            "producto": producto,
-            "cliente": cliente,
-            "fecha": fecha
-        }
-        if messagebox.askyesno("Confirmar Cancelación", f"¿Seguro que desea cancelar la venta de '{producto}' a '{cliente}' con fecha '{fecha}'? Esto revertirá el stock."):
-            self._make_api_request_threaded('DELETE', 'ventas/cancelar', json_data=data,
+        producto, cliente, fecha = venta.get('producto'), venta.get('cliente'), venta.get('fecha')
+        if messagebox.askyesno("Confirmar Cancelación", f"¿Seguro que desea cancelar la venta #{venta['id']} de '{producto}' a '{cliente}' con fecha '{fecha}'? Esto revertirá el stock."):
+            self._make_api_request_threaded('DELETE', f"ventas/{venta['id']}",
                                              success_msg="Venta cancelada y stock revertido correctamente.",
                                              success_callback=lambda _: self.actualizar_todos_los_datos()) # Actualizar UI tras éxito
 
@@ -464,9 +767,9 @@ class TiendaApp:
         def _on_success(ventas):
             for item in self.tree_ventas.get_children(): # Limpiar Treeview existente
                 self.tree_ventas.delete(item)
-            for i, venta in enumerate(ventas): # Insertar nuevos datos
-                self.tree_ventas.insert("", tk.END, text=i + 1, values=(venta.get('producto', 'N/A'), venta.get('cantidad', 'N/A'), venta.get('cliente', 'Sin nombre'), venta.get('fecha', 'N/A'), venta.get('origen', 'Desconocido')))
-        self._make_api_request_threaded('GET', 'ventas', success_callback=_on_success)
+            for venta in ventas: # Insertar nuevos datos (el texto de la fila es el id de la venta)
+                self.tree_ventas.insert("", tk.END, text=venta.get('id', ''), values=(venta.get('producto', 'N/A'), venta.get('cantidad', 'N/A'), venta.get('cliente', 'Sin nombre'), venta.get('fecha', 'N/A'), venta.get('origen', 'Desconocido')))
+        self._get_con_cache('ventas', _on_success)
 
     def cambiar_fecha_venta(self):
         """Abre una ventana para seleccionar una nueva fecha para una venta seleccionada."""
@@ -477,14 +780,15 @@ class TiendaApp:
 
         item = self.tree_ventas.item(selected[0]) # Obtener los datos de la venta seleccionada
         venta_data = item['values']
-        if not venta_data or len(venta_data) < 4:
+        id_venta = item['text']
+        if not venta_data or len(venta_data) < 4 or id_venta in (None, ''):
             self.mostrar_error("Error", "Venta seleccionada no válida o datos incompletos.")
             return
 
-        producto = venta_data[0]
-        cliente = venta_data[2]
         fecha_anterior = venta_data[3]
 
+        from tkcalendar import DateEntry # Importación diferida
+
         # Crear una nueva ventana Toplevel para el calendario
         top = Toplevel(self.root)
         top.title("Seleccionar Nueva Fecha")
@@ -520,13 +824,7 @@ class TiendaApp:
             nueva_fecha_obj = self.date_entry_nueva_fecha.get_date()
             nueva_fecha_str = nueva_fecha_obj.strftime("%Y-%m-%d") # Formatear la fecha
 
-            datos = {
-                "producto": producto,
-                "cliente": cliente,
-                "fecha_anterior": fecha_anterior,
-                "nueva_fecha": nueva_fecha_str
-            }
-            self._make_api_request_threaded('PUT', 'ventas/cambiar_fecha', json_data=datos,
+            self._make_api_request_threaded('PATCH', f"ventas/{id_venta}", json_data={"fecha": nueva_fecha_str},
                                              success_msg="Fecha modificada correctamente.",
                                              success_callback=lambda _: (top.destroy(), self.actualizar_todos_los_datos())) # Cerrar ventana y actualizar UI
 
@@ -544,6 +842,11 @@ class TiendaApp:
     # --- Pestaña de Estadísticas ---
     def cargar_tab_estadisticas(self):
         """Carga los widgets y elementos de la pestaña de Estadísticas."""
+        # Importaciones diferidas: solo se pagan al abrir esta pestaña
+        from tkcalendar import DateEntry
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
         # Selectores de fecha para filtrar estadísticas
         lbl_fecha_inicio = ttk.Label(self.tab_estadisticas, text="Fecha inicio (YYYY-MM-DD):")
         lbl_fecha_inicio.grid(row=0, column=0, padx=5, pady=5)
@@ -555,24 +858,29 @@ class TiendaApp:
         self.fecha_fin_entry = DateEntry(self.tab_estadisticas, date_pattern="yyyy-mm-dd")
         self.fecha_fin_entry.grid(row=1, column=1, padx=5, pady=5)
 
+        # Al cambiar cualquiera de las fechas se programa una actualización (con debounce)
+        for entry in (self.fecha_inicio_entry, self.fecha_fin_entry):
+            entry.bind("<<DateEntrySelected>>", self.programar_actualizacion_estadisticas)
+            entry.bind("<Return>", self.programar_actualizacion_estadisticas)
+
         # Botón para actualizar las estadísticas con el filtro de fechas
         btn_actualizar = ttk.Button(self.tab_estadisticas, text="Actualizar Estadísticas con Filtro", command=self.actualizar_estadisticas_con_filtro)
         btn_actualizar.grid(row=2, column=0, columnspan=2, padx=5, pady=10)
 
         # Botones para mostrar diferentes tipos de gráficos estadísticos
-        btn_ventas_por_dia = ttk.Button(self.tab_estadisticas, text="Ver Ventas por Día", command=lambda: self.mostrar_ventas_por_dia(
+        btn_ventas_por_dia = ttk.Button(self.tab_estadisticas, text="Ver Ventas por Día", command=lambda: self.mostrar_estadistica_individual(self.mostrar_ventas_por_dia,
             self.fecha_inicio_entry.get_date().strftime("%Y-%m-%d"),
             self.fecha_fin_entry.get_date().strftime("%Y-%m-%d")
         ))
         btn_ventas_por_dia.grid(row=3, column=0, columnspan=2, padx=5, pady=5)
 
-        btn_productos_mas_vendidos = ttk.Button(self.tab_estadisticas, text="Ver Productos Más Vendidos", command=lambda: self.mostrar_productos_mas_vendidos(
+        btn_productos_mas_vendidos = ttk.Button(self.tab_estadisticas, text="Ver Productos Más Vendidos", command=lambda: self.mostrar_estadistica_individual(self.mostrar_productos_mas_vendidos,
             self.fecha_inicio_entry.get_date().strftime("%Y-%m-%d"),
             self.fecha_fin_entry.get_date().strftime("%Y-%m-%d")
         ))
         btn_productos_mas_vendidos.grid(row=4, column=0, columnspan=2, padx=5, pady=5)
 
-        btn_ventas_por_origen = ttk.Button(self.tab_estadisticas, text="Ver Ventas por Origen", command=lambda: self.mostrar_ventas_por_origen(
+        btn_ventas_por_origen = ttk.Button(self.tab_estadisticas, text="Ver Ventas por Origen", command=lambda: self.mostrar_estadistica_individual(self.mostrar_ventas_por_origen,
             self.fecha_inicio_entry.get_date().strftime("%Y-%m-%d"),
             self.fecha_fin_entry.get_date().strftime("%Y-%m-%d")
         ))
@@ -583,20 +891,96 @@ class TiendaApp:
         btn_guardar_grafico.grid(row=6, column=0, columnspan=2, padx=5, pady=10)
 
         # Configuración del área de visualización de gráficos (Matplotlib)
-        self.figure = plt.Figure(figsize=(8, 6), dpi=100)
-        self.plot = self.figure.add_subplot(111) # Añadir un subplot a la figura
+        # Cada estadística tiene su propio eje para que las respuestas no se pisen entre sí
+        self.figure = Figure(figsize=(8, 9), dpi=100)
+        ejes = self.figure.subplots(3, 1)
         self.canvas = FigureCanvasTkAgg(self.figure, master=self.tab_estadisticas) # Crear un canvas de Tkinter para la figura
+        self.graficos_estadisticas = {
+            'ventas_por_dia': GraficoBarras(ejes[0], self.canvas, 'No hay datos disponibles para mostrar.', rotacion_etiquetas=45),
+            'productos_mas_vendidos': GraficoBarras(ejes[1], self.canvas, 'No hay datos disponibles para mostrar.', rotacion_etiquetas=45),
+            'ventas_por_origen': GraficoBarras(ejes[2], self.canvas, 'No hay datos disponibles para mostrar.'),
+        }
         self.canvas_widget = self.canvas.get_tk_widget() # Obtener el widget Tkinter del canvas
         self.canvas_widget.grid(row=7, column=0, columnspan=2, padx=5, pady=10, sticky="nsew")
         self.tab_estadisticas.grid_rowconfigure(7, weight=1)
         self.tab_estadisticas.grid_columnconfigure(0, weight=1)
         self.tab_estadisticas.grid_columnconfigure(1, weight=1)
 
+    def programar_actualizacion_estadisticas(self, event=None):
+        """
+        Programa la actualización de las estadísticas tras un cambio en los DateEntry.
+        Los cambios rápidos y consecutivos se agrupan en una sola actualización (debounce).
+        """
+        if self._estadisticas_after_id is not None:
+            self.root.after_cancel(self._estadisticas_after_id)
+        self._estadisticas_after_id = self.root.after(DEBOUNCE_ESTADISTICAS_MS, self.actualizar_estadisticas_con_filtro)
+
+    def _nueva_generacion_estadisticas(self):
+        """
+        Abre una nueva generación de solicitudes de estadísticas.
+        Cancela el debounce pendiente y descarta las solicitudes que aún no se enviaron.
+        """
+        if self._estadisticas_after_id is not None:
+            self.root.after_cancel(self._estadisticas_after_id)
+            self._estadisticas_after_id = None
+        self._estadisticas_generacion += 1
+        self._estadisticas_pendientes.clear()
+
+    def _solicitar_estadistica(self, endpoint, params, on_success):
+        """
+        Encola una solicitud de estadísticas asociada a la generación actual.
+        :param endpoint: Ruta de la API a consultar (ej. 'estadisticas/ventas_por_dia').
+        :param params: Parámetros de la URL.
+        :param on_success: Callback a ejecutar con los datos si la respuesta sigue vigente.
+        """
+        self._estadisticas_pendientes.append((self._estadisticas_generacion, endpoint, params, on_success))
+        self._despachar_estadisticas()
+
+    def _despachar_estadisticas(self):
+        """
+        Envía solicitudes de la cola mientras no se supere MAX_SOLICITUDES_ESTADISTICAS.
+        Las solicitudes de generaciones anteriores se descartan sin llegar al servidor.
+        Se ejecuta siempre en el hilo principal de Tkinter.
+        """
+        while self._estadisticas_pendientes and self._estadisticas_en_vuelo < MAX_SOLICITUDES_ESTADISTICAS:
+            generacion, endpoint, params, on_success = self._estadisticas_pendientes.pop(0)
+            if generacion != self._estadisticas_generacion:
+                continue # Solicitud obsoleta: ni siquiera se envía
+
+            def _al_terminar(data, generacion=generacion, on_success=on_success):
+                self._estadisticas_en_vuelo -= 1
+                if generacion == self._estadisticas_generacion: # Solo se dibujan respuestas vigentes
+                    on_success(data)
+                self._despachar_estadisticas()
+
+            def _al_fallar(_error):
+                self._estadisticas_en_vuelo -= 1
+                self._despachar_estadisticas()
+
+            # Dibujar primero la última respuesta guardada para este filtro (si existe)
+            cacheado = self.cache.obtener(endpoint, params)
+            if cacheado is not None:
+                on_success(cacheado)
+
+            self._estadisticas_en_vuelo += 1
+            self._make_api_request_threaded('GET', endpoint, params=params, usar_cache=True,
+                                            success_callback=_al_terminar, error_callback=_al_fallar)
+
+    def mostrar_estadistica_individual(self, funcion_mostrar, fecha_inicio, fecha_fin):
+        """
+        Muestra un único gráfico estadístico descartando las respuestas de consultas anteriores.
+        :param funcion_mostrar: Una de las funciones mostrar_* de la pestaña de estadísticas.
+        """
+        self._nueva_generacion_estadisticas()
+        funcion_mostrar(fecha_inicio, fecha_fin)
+
     def actualizar_estadisticas_con_filtro(self):
         """
         Obtiene las fechas de inicio y fin de los DateEntry y actualiza
         todos los gráficos estadísticos con esos filtros.
+        Las respuestas de filtros anteriores que sigan en vuelo se descartan.
         """
+        self._nueva_generacion_estadisticas()
         fecha_inicio = self.fecha_inicio_entry.get_date().strftime("%Y-%m-%d")
         fecha_fin = self.fecha_fin_entry.get_date().strftime("%Y-%m-%d")
 
@@ -605,26 +989,16 @@ class TiendaApp:
         self.mostrar_productos_mas_vendidos(fecha_inicio, fecha_fin)
         self.mostrar_ventas_por_origen(fecha_inicio, fecha_fin)
 
-    def mostrar_grafico(self, data, title, xlabel, ylabel):
+    def mostrar_grafico(self, clave, data, title, xlabel, ylabel):
         """
-        Genera y muestra un gráfico de barras utilizando Matplotlib.
+        Muestra los datos en el gráfico de barras de la estadística indicada.
+        :param clave: Estadística a actualizar ('ventas_por_dia', 'productos_mas_vendidos' o 'ventas_por_origen').
         :param data: Diccionario con los datos del gráfico (keys son etiquetas, values son alturas de barra).
         :param title: Título del gráfico.
         :param xlabel: Etiqueta del eje X.
         :param ylabel: Etiqueta del eje Y.
         """
-        self.plot.clear() # Limpiar el plot anterior
-        if data:
-            labels = list(data.keys())
-            values = list(data.values())
-            self.plot.bar(labels, values) # Crear el gráfico de barras
-            self.plot.set_title(title)
-            self.plot.set_xlabel(xlabel)
-            self.plot.set_ylabel(ylabel)
-            self.figure.tight_layout() # Ajustar el diseño para que todo quepa
-        else:
-            self.plot.text(0.5, 0.5, 'No hay datos disponibles para mostrar.', ha='center', va='center', transform=self.plot.transAxes)
-        self.canvas.draw() # Dibujar el gráfico en el canvas de Tkinter
+        self.graficos_estadisticas[clave].actualizar(data, title, xlabel, ylabel)
 
     def mostrar_ventas_por_dia(self, fecha_inicio=None, fecha_fin=None):
         """Obtiene datos de ventas por día de la API y los muestra en un gráfico."""
@@ -632,12 +1006,15 @@ class TiendaApp:
             title = "Ventas por Día"
             if fecha_inicio and fecha_fin:
                 title += f" ({fecha_inicio} a {fecha_fin})" # Añadir el rango de fechas al título
-            self.mostrar_grafico(data, title, "Día", "Cantidad Vendida")
+            self.mostrar_grafico('ventas_por_dia', data, title, "Día", "Cantidad Vendida")
 
         params = {}
         if fecha_inicio and fecha_fin:
             params = {"fecha_inicio": fecha_inicio, "fecha_fin": fecha_fin}
-        self._make_api_request_threaded('GET', 'estadisticas/ventas_por_dia', params=params, success_callback=_on_success)
+        # El número de puntos queda acotado por el ancho del gráfico, no por el tamaño de los datos
+        ancho = max(self.canvas.get_tk_widget().winfo_width(), 400)
+        params["max_puntos"] = max(ancho // PIXELES_POR_BARRA, 1)
+        self._solicitar_estadistica('estadisticas/ventas_por_dia', params, _on_success)
 
     def mostrar_productos_mas_vendidos(self, fecha_inicio=None, fecha_fin=None):
         """Obtiene datos de productos más vendidos de la API y los muestra en un gráfico."""
@@ -645,12 +1022,13 @@ class TiendaApp:
             title = "Productos Más Vendidos"
             if fecha_inicio and fecha_fin:
                 title += f" ({fecha_inicio} a {fecha_fin})"
-            self.mostrar_grafico(data, title, "Producto", "Cantidad Total Vendida")
+            self.mostrar_grafico('productos_mas_vendidos', data, title, "Producto", "Cantidad Total Vendida")
 
         params = {}
         if fecha_inicio and fecha_fin:
             params = {"fecha_inicio": fecha_inicio, "fecha_fin": fecha_fin}
-        self._make_api_request_threaded('GET', 'estadisticas/productos_mas_vendidos', params=params, success_callback=_on_success)
+        params["top"] = TOP_PRODUCTOS_GRAFICO
+        self._solicitar_estadistica('estadisticas/productos_mas_vendidos', params, _on_success)
 
     def mostrar_ventas_por_origen(self, fecha_inicio=None, fecha_fin=None):
         """Obtiene datos de ventas por origen de la API y los muestra en un gráfico."""
@@ -658,17 +1036,17 @@ class TiendaApp:
             title = "Ventas por Origen"
             if fecha_inicio and fecha_fin:
                 title += f" ({fecha_inicio} a {fecha_fin})"
-            self.mostrar_grafico(data, title, "Origen", "Cantidad Total Vendida")
+            self.mostrar_grafico('ventas_por_origen', data, title, "Origen", "Cantidad Total Vendida")
 
         params = {}
         if fecha_inicio and fecha_fin:
             params = {"fecha_inicio": fecha_inicio, "fecha_fin": fecha_fin}
-        self._make_api_request_threaded('GET', 'estadisticas/ventas_por_origen', params=params, success_callback=_on_success)
+        self._solicitar_estadistica('estadisticas/ventas_por_origen', params, _on_success)
 
     def guardar_grafico_actual(self):
         """Permite al usuario guardar el gráfico actualmente visible como una imagen."""
         # Verificar si hay un gráfico con datos para guardar
-        if not self.figure.get_axes() or not self.plot.has_data():
+        if not any(grafico.tiene_datos() for grafico in self.graficos_estadisticas.values()):
             self.mostrar_error("Error al guardar", "No hay ningún gráfico con datos para guardar. Genere uno primero.")
             return
 
@@ -743,8 +1121,13 @@ class TiendaApp:
         self.utilidad_chart_frame = ttk.Frame(self.tab_utilidad)
         self.utilidad_chart_frame.pack(padx=10, pady=10, fill="both", expand=True)
 
+        # Importaciones diferidas: solo se pagan al abrir esta pestaña
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
         # Crear una figura y un eje para el gráfico de utilidad
-        self.utilidad_figure, self.utilidad_ax = plt.subplots(figsize=(6, 4), dpi=100)
+        self.utilidad_figure = Figure(figsize=(6, 4), dpi=100)
+        self.utilidad_ax = self.utilidad_figure.subplots()
         # Crear un lienzo (canvas) de Matplotlib para Tkinter
         self.utilidad_canvas = FigureCanvasTkAgg(self.utilidad_figure, master=self.utilidad_chart_frame)
         # Obtener el widget de Tkinter del lienzo
@@ -752,6 +1135,10 @@ class TiendaApp:
         # Empaquetar el widget del gráfico en el frame
         self.utilidad_plot_widget.pack(side=tk.TOP, fill=tk.BOTH, expand=1)
 
+        self.utilidad_ax.grid(axis='y', linestyle='--', alpha=0.7) # Añadir una cuadrícula en el eje Y
+        self.grafico_utilidad = GraficoBarras(self.utilidad_ax, self.utilidad_canvas,
+                                              'Ingrese datos para ver la utilidad.', rotacion_etiquetas=45)
+
         # Diccionario para almacenar {producto: utilidad total} para el gráfico
         self.productos_utilidad_calculadora = {} 
         # Inicializar el gráfico vacío al inicio
@@ -820,31 +1207,14 @@ class TiendaApp:
         Actualiza el gráfico de barras que muestra la utilidad total por producto
         calculada en la pestaña de utilidad rápida.
         Las barras son verdes para utilidades positivas (ganancia) y rojas para utilidades negativas (pérdida).
+        Si solo cambió la utilidad de un producto ya graficado, se actualiza su barra sin reconstruir el gráfico.
         """
-        self.utilidad_ax.clear() # Limpiar el eje del gráfico para dibujar uno nuevo
-        
-        # Si no hay productos en el diccionario de la calculadora, mostrar un mensaje en el gráfico
-        if not self.productos_utilidad_calculadora:
-            self.utilidad_ax.text(0.5, 0.5, 'Ingrese datos para ver la utilidad.', 
-                                 horizontalalignment='center', verticalalignment='center', transform=self.utilidad_ax.transAxes)
-            self.utilidad_canvas.draw_idle() # Redibujar el canvas
-            return
-
-        # Obtener la lista de productos y sus utilidades totales del diccionario de la calculadora
-        productos = list(self.productos_utilidad_calculadora.keys())
         utilidades = list(self.productos_utilidad_calculadora.values())
-
         # Definir colores para las barras: rojo para pérdida, verde para ganancia
         colors = ['red' if u < 0 else 'green' for u in utilidades]
-
-        # Crear el gráfico de barras
-        self.utilidad_ax.bar(productos, utilidades, color=colors)
-        self.utilidad_ax.set_ylabel("Utilidad Total ($)") # Etiqueta del eje Y
-        self.utilidad_ax.set_title("Utilidad Total por Producto (Calculadora Rápida)") # Título del gráfico
-        self.utilidad_ax.tick_params(axis='x', rotation=45) # Rotar etiquetas del eje X para mejor visibilidad y alinearlas a la derecha
-        self.utilidad_ax.grid(axis='y', linestyle='--', alpha=0.7) # Añadir una cuadrícula en el eje Y
-        self.utilidad_figure.tight_layout() # Ajustar el diseño para que todo quepa bien
-        self.utilidad_canvas.draw_idle() # Redibujar el canvas para mostrar los cambios
+        self.grafico_utilidad.actualizar(self.productos_utilidad_calculadora,
+                                         title="Utilidad Total por Producto (Calculadora Rápida)",
+                                         ylabel="Utilidad Total ($)", colores=colors)
 
 if __name__ == "__main__":
     root = tk.Tk() # Inicializar la ventana principal de Tkinter
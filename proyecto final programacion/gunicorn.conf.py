@@ -0,0 +1,37 @@
+"""
+Configuración de gunicorn para el backend de la tienda (ver servidor.py).
+
+Uso directo:
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from servidor import configuracion  # noqa: E402
+
+_config = configuracion()
+
+bind = f"{_config['host']}:{_config['puerto']}"
+workers = _config['workers']
+threads = _config['hilos']
+worker_class = 'gthread' # Hilos por worker: concurrencia sin duplicar los datos en memoria
+timeout = _config['timeout']
+graceful_timeout = _config['timeout_apagado'] # Tiempo para terminar las solicitudes en curso al apagar
+keepalive = 5
+preload_app = True # Importa wsgi.py (y precarga los datos) una vez, antes de crear los workers
+accesslog = '-'
+errorlog = '-'
+
+
+def worker_exit(server, worker):
+    """Al terminar un worker, completa las escrituras pendientes antes de salir."""
+    import backfinal
+    backfinal.cerrar()
+
+
+def on_exit(server):
+    """Al apagar gunicorn, completa las escrituras pendientes del proceso maestro."""
+    import backfinal
+    backfinal.cerrar()
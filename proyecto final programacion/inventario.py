@@ -0,0 +1,360 @@
+"""
+Libro de movimientos de inventario (solo se agregan líneas, nunca se reescriben).
+
+Cada venta, cancelación, reabastecimiento o ajuste agrega una línea JSON al archivo de
+movimientos con el cambio de stock y el stock resultante. El stock actual vive en memoria
+como un contador por producto, así que una venta cuesta una línea agregada al final del
+archivo en lugar de reescribir todo productos.json.
+
+Cada cierto número de movimientos se guarda una foto (snapshot) del stock con la posición
+del archivo hasta la que está aplicada: al iniciar solo se reaplican los movimientos
+posteriores a la última foto.
+
+El índice de bajo stock (IndiceBajoStock) se mantiene con cada movimiento y responde
+"qué productos tienen menos de N unidades" sin recorrer todo el catálogo.
+"""
+import bisect
+import collections
+import heapq
+import json
+import os
+import threading
+from datetime import datetime
+
+TIPOS_MOVIMIENTO = ('venta', 'cancelacion', 'reabastecimiento', 'ajuste')
+MAX_EVENTOS_BAJO_STOCK = 200 # Eventos de bajo stock que se conservan en memoria
+
+
+class IndiceBajoStock:
+    """
+    Productos ordenados por stock en un montículo (heap) de mínimos con invalidación perezosa:
+    cada cambio agrega una entrada (stock, producto) y las entradas viejas se descartan al
+    consultarlas. Una consulta de los k productos con menos stock cuesta O(k log n).
+
+    Además detecta cuando un producto baja hasta su umbral de reposición ('stock_minimo' del
+    producto, o el umbral por defecto) y lo notifica a los suscriptores.
+    """
+    def __init__(self, umbral_defecto=5):
+        self.umbral_defecto = umbral_defecto
+        self._lock = threading.Lock()
+        self._heap = []
+        self._stock = {}
+        self._umbrales = {}
+        self._suscriptores = []
+        self.eventos = collections.deque(maxlen=MAX_EVENTOS_BAJO_STOCK)
+
+    def reconstruir(self, stock):
+        """Reconstruye el índice completo a partir de {producto: stock}."""
+        with self._lock:
+            self._stock = dict(stock)
+            self._heap = [(cantidad, producto) for producto, cantidad in self._stock.items()]
+            heapq.heapify(self._heap)
+
+    def configurar(self, umbrales):
+        """
+        Fija el catálogo vigente y sus umbrales: los productos que no están en él salen del índice.
+        :param umbrales: {producto: stock_minimo_o_None}.
+        """
+        with self._lock:
+            self._umbrales = {nombre: u for nombre, u in umbrales.items() if isinstance(u, int)}
+            for nombre in [n for n in self._stock if n not in umbrales]:
+                del self._stock[nombre] # Sus entradas del heap quedan viejas y se descartan solas
+
+    def fijar_umbral(self, producto, umbral):
+        """Fija (o quita, con None) el umbral de reposición de un producto."""
+        with self._lock:
+            if isinstance(umbral, int):
+                self._umbrales[producto] = umbral
+            else:
+                self._umbrales.pop(producto, None)
+
+    def umbral(self, producto):
+        return self._umbrales.get(producto, self.umbral_defecto)
+
+    def suscribir(self, funcion):
+        """
+        Registra una función que recibe cada evento de bajo stock (un diccionario). Se llama
+        mientras se registra el movimiento, así que debe ser rápida.
+        """
+        self._suscriptores.append(funcion)
+
+    def actualizar(self, producto, stock):
+        """Registra el nuevo stock de un producto y emite un evento si cruzó su umbral hacia abajo."""
+        with self._lock:
+            anterior = self._stock.get(producto)
+            self._stock[producto] = stock
+            heapq.heappush(self._heap, (stock, producto))
+            # Compacta cuando las entradas viejas superan a las vigentes
+            if len(self._heap) > 2 * len(self._stock) + 64:
+                self._heap = [(cantidad, nombre) for nombre, cantidad in self._stock.items()]
+                heapq.heapify(self._heap)
+            umbral = self.umbral(producto)
+            evento = None
+            if anterior is not None and anterior > umbral >= stock:
+                evento = {'producto': producto, 'stock': stock, 'umbral': umbral,
+                          'hora': datetime.now().isoformat(timespec='seconds')}
+                self.eventos.append(evento)
+        if evento:
+            for funcion in self._suscriptores:
+                funcion(evento)
+
+    def ultimos_eventos(self):
+        """Retorna los eventos de bajo stock conservados, del más reciente al más antiguo."""
+        with self._lock:
+            return list(reversed(self.eventos))
+
+    def quitar(self, producto):
+        """Saca un producto del índice (ej. al eliminarlo del catálogo)."""
+        with self._lock:
+            self._stock.pop(producto, None)
+            self._umbrales.pop(producto, None)
+
+    def consultar(self, umbral, limite):
+        """
+        Retorna los productos con stock menor o igual al umbral, de menor a mayor stock.
+        :param umbral: Stock máximo a incluir.
+        :param limite: Número máximo de productos.
+        :return: Lista de {'nombre', 'stock', 'stock_minimo'}.
+        """
+        with self._lock:
+            resultado = []
+            vigentes = []
+            vistos = set()
+            while self._heap and len(resultado) < limite:
+                stock, producto = self._heap[0]
+                if stock > umbral:
+                    break
+                heapq.heappop(self._heap)
+                if self._stock.get(producto) != stock or producto in vistos:
+                    continue # Entrada vieja o repetida: se descarta
+                vistos.add(producto)
+                vigentes.append((stock, producto))
+                resultado.append({'nombre': producto, 'stock': stock, 'stock_minimo': self.umbral(producto)})
+            for entrada in vigentes:
+                heapq.heappush(self._heap, entrada)
+            return resultado
+
+
+class LibroInventario:
+    """
+    Stock actual por producto respaldado por un archivo de movimientos y fotos periódicas.
+    Los productos se identifican por nombre.
+    """
+    def __init__(self, ruta_movimientos, ruta_snapshot, movimientos_por_snapshot=1000, umbral_bajo_stock=5):
+        self.ruta_movimientos = ruta_movimientos
+        self.ruta_snapshot = ruta_snapshot
+        self.movimientos_por_snapshot = movimientos_por_snapshot
+        self._lock = threading.RLock()
+        self._stock = {}
+        self._seq = 0 # Número del último movimiento registrado
+        self._offset = 0 # Bytes del archivo de movimientos ya aplicados
+        self._desde_snapshot = 0 # Movimientos registrados desde la última foto
+        self._historial = None # {producto: ([fechas], [stock_al_final_del_día])}, se construye al consultarlo
+        self._lock_fsync = threading.Lock()
+        self._sincronizado = 0 # Bytes del archivo de movimientos que ya están en disco (fsync)
+        self.bajo_stock = IndiceBajoStock(umbral_bajo_stock)
+        self.abierto = False
+
+    def abrir(self, stock_inicial):
+        """
+        Carga la última foto y reaplica los movimientos posteriores. Si todavía no hay
+        movimientos ni foto, registra el stock inicial como ajustes (migración).
+        :param stock_inicial: Función sin argumentos que retorna {producto: stock}; solo
+                              se llama si el libro está vacío.
+        """
+        with self._lock:
+            if self.abierto:
+                return
+            snapshot = self._leer_snapshot()
+            if snapshot:
+                self._stock = dict(snapshot['stock'])
+                self._seq = snapshot['seq']
+                self._offset = snapshot['offset']
+            self._reaplicar()
+            self._sincronizado = self._offset
+            self.bajo_stock.reconstruir(self._stock)
+            self.abierto = True
+            if self._seq == 0:
+                movimientos = [('ajuste', nombre, stock, 'inicial')
+                               for nombre, stock in stock_inicial().items() if isinstance(stock, int)]
+                if movimientos:
+                    self.registrar(movimientos)
+                self.guardar_snapshot()
+
+    def _leer_snapshot(self):
+        try:
+            with open(self.ruta_snapshot, 'rb') as file:
+                return json.loads(file.read())
+        except (FileNotFoundError, json.JSONDecodeError, UnicodeDecodeError):
+            return None
+
+    def _reaplicar(self):
+        """Aplica los movimientos escritos después de la foto; descarta una última línea incompleta."""
+        if not os.path.exists(self.ruta_movimientos):
+            self._offset = 0
+            return
+        with open(self.ruta_movimientos, 'rb') as file:
+            file.seek(self._offset)
+            for linea in file:
+                if not linea.endswith(b'\n'):
+                    break # Escritura interrumpida: se trunca abajo
+                try:
+                    movimiento = json.loads(linea)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    break
+                self._stock[movimiento['producto']] = movimiento['stock']
+                self._seq = movimiento['seq']
+                self._offset += len(linea)
+                self._desde_snapshot += 1
+        if os.path.getsize(self.ruta_movimientos) > self._offset:
+            with open(self.ruta_movimientos, 'r+b') as file:
+                file.truncate(self._offset)
+
+    def guardar_snapshot(self):
+        """Guarda una foto atómica del stock actual y de la posición aplicada del archivo."""
+        with self._lock:
+            contenido = json.dumps({'seq': self._seq, 'offset': self._offset,
+                                    'fecha': datetime.now().isoformat(timespec='seconds'),
+                                    'stock': self._stock}, ensure_ascii=False).encode('utf-8')
+            temporal = f"{self.ruta_snapshot}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.ruta_snapshot), exist_ok=True)
+                with open(temporal, 'wb') as file:
+                    file.write(contenido)
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(temporal, self.ruta_snapshot)
+            except OSError:
+                return False
+            self._desde_snapshot = 0
+            return True
+
+    def stock(self, producto):
+        """Retorna el stock actual de un producto, o None si no tiene movimientos."""
+        return self._stock.get(producto)
+
+    def stock_actual(self):
+        """Retorna una copia de {producto: stock} con el stock actual de todos los productos."""
+        with self._lock:
+            return dict(self._stock)
+
+    def registrar(self, movimientos, sincronizar=True):
+        """
+        Registra varios movimientos con una sola escritura al final del archivo (todos o ninguno).
+        :param movimientos: Lista de (tipo, producto, delta, referencia), con tipo en TIPOS_MOVIMIENTO.
+        :param sincronizar: Si es False no se hace fsync: el llamador debe llamar luego a
+                            sincronizar(posicion()) antes de confirmar la operación.
+        :return: La lista de movimientos registrados, o None si no se pudo escribir.
+        """
+        ahora = datetime.now()
+        fecha, hora = ahora.strftime('%Y-%m-%d'), ahora.isoformat(timespec='seconds')
+        with self._lock:
+            stock = {}
+            registrados = []
+            seq = self._seq
+            for tipo, producto, delta, referencia in movimientos:
+                if tipo not in TIPOS_MOVIMIENTO:
+                    raise ValueError(f'Tipo de movimiento desconocido: {tipo}')
+                seq += 1
+                stock[producto] = stock.get(producto, self._stock.get(producto, 0)) + delta
+                registrados.append({'seq': seq, 'fecha': fecha, 'hora': hora, 'tipo': tipo,
+                                    'producto': producto, 'delta': delta, 'stock': stock[producto],
+                                    'referencia': referencia})
+            contenido = b''.join(json.dumps(m, ensure_ascii=False).encode('utf-8') + b'\n' for m in registrados)
+            try:
+                os.makedirs(os.path.dirname(self.ruta_movimientos), exist_ok=True)
+                with open(self.ruta_movimientos, 'ab') as file:
+                    file.write(contenido)
+                    file.flush()
+                    if sincronizar:
+                        os.fsync(file.fileno())
+            except OSError:
+                return None
+            self._stock.update(stock)
+            for producto, cantidad in stock.items():
+                self.bajo_stock.actualizar(producto, cantidad)
+            self._seq = seq
+            self._offset += len(contenido)
+            if sincronizar:
+                self._sincronizado = self._offset
+            self._desde_snapshot += len(registrados)
+            if self._historial is not None:
+                for movimiento in registrados:
+                    self._agregar_al_historial(movimiento)
+            if self._desde_snapshot >= self.movimientos_por_snapshot:
+                self.guardar_snapshot()
+            return registrados
+
+    def posicion(self):
+        """Retorna la posición (en bytes) hasta la que se escribieron movimientos."""
+        return self._offset
+
+    def sincronizar(self, hasta):
+        """
+        Asegura en disco los movimientos escritos hasta la posición 'hasta'. Un solo fsync
+        cubre todo lo escrito antes, así las solicitudes concurrentes comparten el mismo fsync.
+        :return: True si los movimientos quedaron en disco.
+        """
+        with self._lock_fsync:
+            if self._sincronizado >= hasta:
+                return True
+            objetivo = self._offset
+            try:
+                descriptor = os.open(self.ruta_movimientos, os.O_RDONLY)
+                try:
+                    os.fsync(descriptor)
+                finally:
+                    os.close(descriptor)
+            except OSError:
+                return False
+            self._sincronizado = max(self._sincronizado, objetivo)
+            return True
+
+    def movimientos(self, producto=None):
+        """
+        Recorre el archivo de movimientos en orden, sin cargarlo completo en memoria.
+        :param producto: Si se indica, solo los movimientos de ese producto.
+        :return: Un generador de diccionarios de movimiento.
+        """
+        with self._lock:
+            limite = self._offset
+        if not os.path.exists(self.ruta_movimientos):
+            return
+        with open(self.ruta_movimientos, 'rb') as file:
+            leidos = 0
+            for linea in file:
+                leidos += len(linea)
+                if leidos > limite:
+                    break
+                movimiento = json.loads(linea)
+                if producto is None or movimiento['producto'] == producto:
+                    yield movimiento
+
+    def _agregar_al_historial(self, movimiento):
+        fechas, stocks = self._historial.setdefault(movimiento['producto'], ([], []))
+        if fechas and fechas[-1] == movimiento['fecha']:
+            stocks[-1] = movimiento['stock']
+        else:
+            fechas.append(movimiento['fecha'])
+            stocks.append(movimiento['stock'])
+
+    def stock_en(self, producto, fecha):
+        """
+        Retorna el stock de un producto al final de un día. El historial por día se construye
+        recorriendo el archivo una sola vez (en la primera consulta) y luego se mantiene al día;
+        cada consulta es una búsqueda binaria.
+        :param producto: Nombre del producto.
+        :param fecha: Fecha 'YYYY-MM-DD'.
+        :return: El stock a esa fecha (0 si el producto aún no tenía movimientos), o None si no tiene historial.
+        """
+        with self._lock:
+            if self._historial is None:
+                self._historial = {}
+                for movimiento in self.movimientos():
+                    self._agregar_al_historial(movimiento)
+            historial = self._historial.get(producto)
+            if historial is None:
+                return None
+            fechas, stocks = historial
+            posicion = bisect.bisect_right(fechas, fecha)
+            return stocks[posicion - 1] if posicion else 0
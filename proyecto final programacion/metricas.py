@@ -0,0 +1,261 @@
+"""
+Métricas del backend en formato de texto de Prometheus.
+
+Los contadores son por hilo: cada hilo escribe solo en su propio fragmento (sin locks en
+el camino de cada solicitud) y la exportación suma todos los fragmentos. Los fragmentos
+de hilos que ya terminaron se acumulan en un total global para no perder sus valores.
+"""
+import threading
+import time
+
+# Límites superiores (en segundos) de los buckets de los histogramas de latencia
+BUCKETS_LATENCIA = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Límites superiores (en bytes) de los buckets de los histogramas de tamaño
+BUCKETS_BYTES = (100, 1000, 10000, 100000, 1000000, 10000000, 100000000)
+# Límites superiores de los buckets del histograma de escrituras por lote (group commit)
+BUCKETS_LOTE = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+# Descripción y tipo de cada métrica exportada: {nombre: (tipo, ayuda, buckets_o_None)}
+DEFINICIONES = {
+    'tienda_http_solicitudes_duracion_segundos': ('histogram', 'Duración de las solicitudes HTTP por ruta, método y código.', BUCKETS_LATENCIA),
+    'tienda_http_solicitud_bytes': ('histogram', 'Tamaño del cuerpo de las solicitudes HTTP.', BUCKETS_BYTES),
+    'tienda_http_respuesta_bytes': ('histogram', 'Tamaño del cuerpo de las respuestas HTTP.', BUCKETS_BYTES),
+    'tienda_http_fase_segundos': ('histogram', 'Tiempo de cada solicitud por fase: almacenamiento, serialización o cómputo.', BUCKETS_LATENCIA),
+    'tienda_http_solicitudes_iniciadas_total': ('counter', 'Solicitudes HTTP iniciadas.', None),
+    'tienda_http_solicitudes_terminadas_total': ('counter', 'Solicitudes HTTP terminadas.', None),
+    'tienda_almacenamiento_duracion_segundos': ('histogram', 'Duración de JsonStorage.cargar/guardar por archivo.', BUCKETS_LATENCIA),
+    'tienda_almacenamiento_bytes_total': ('counter', 'Bytes leídos o escritos por JsonStorage por archivo.', None),
+    'tienda_almacenamiento_lote_escrituras': ('histogram', 'Escrituras agrupadas en cada lote de JsonStorage (group commit).', BUCKETS_LOTE),
+    'tienda_almacenamiento_lotes_total': ('counter', 'Lotes escritos por JsonStorage, por archivo y resultado.', None),
+    'tienda_inventario_bajo_stock_eventos_total': ('counter', 'Veces que un producto bajó hasta su umbral de reposición.', None),
+    'tienda_admision_admitidas_total': ('counter', 'Solicitudes admitidas por el control de admisión, por clase.', None),
+    'tienda_admision_rechazos_total': ('counter', 'Solicitudes rechazadas por el control de admisión, por clase y motivo.', None),
+}
+
+
+class _Fragmento:
+    """Contadores e histogramas de un solo hilo."""
+    def __init__(self):
+        self.hilo = threading.current_thread()
+        self.contadores = {} # {(nombre, etiquetas): valor}
+        self.histogramas = {} # {(nombre, etiquetas): [conteos_por_bucket..., suma, total]}
+
+
+class RegistroMetricas:
+    """
+    Registro de métricas con fragmentos por hilo.
+    Las etiquetas se pasan como tuplas ordenadas de pares (nombre, valor).
+    """
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock() # Solo para registrar fragmentos nuevos y exportar
+        self._fragmentos = []
+        self._retirados = _Fragmento() # Acumulado de hilos que ya terminaron
+
+    def _fragmento(self):
+        fragmento = getattr(self._local, 'fragmento', None)
+        if fragmento is None:
+            fragmento = _Fragmento()
+            self._local.fragmento = fragmento
+            with self._lock:
+                self._compactar()
+                self._fragmentos.append(fragmento)
+        return fragmento
+
+    def _compactar(self):
+        """Suma al acumulado global los fragmentos de hilos terminados (llamar con el lock tomado)."""
+        vivos = []
+        for fragmento in self._fragmentos:
+            if fragmento.hilo.is_alive():
+                vivos.append(fragmento)
+            else:
+                _sumar(self._retirados, fragmento)
+        self._fragmentos = vivos
+
+    def incrementar(self, nombre, etiquetas=(), valor=1):
+        """Incrementa un contador."""
+        contadores = self._fragmento().contadores
+        clave = (nombre, etiquetas)
+        contadores[clave] = contadores.get(clave, 0) + valor
+
+    def observar(self, nombre, valor, etiquetas=()):
+        """Registra una observación en un histograma."""
+        histogramas = self._fragmento().histogramas
+        clave = (nombre, etiquetas)
+        buckets = DEFINICIONES[nombre][2]
+        datos = histogramas.get(clave)
+        if datos is None:
+            datos = [0] * (len(buckets) + 2)
+            histogramas[clave] = datos
+        for i, limite in enumerate(buckets):
+            if valor <= limite:
+                datos[i] += 1
+                break
+        datos[-2] += valor
+        datos[-1] += 1
+
+    def totales(self):
+        """
+        Suma los fragmentos de todos los hilos.
+        :return: Una tupla (contadores, histogramas) con el mismo formato que _Fragmento.
+        """
+        total = _Fragmento()
+        with self._lock:
+            self._compactar()
+            _sumar(total, self._retirados)
+            for fragmento in self._fragmentos:
+                _sumar(total, fragmento)
+        return total.contadores, total.histogramas
+
+    def exportar(self, extras=None):
+        """
+        Genera el texto de exposición de Prometheus.
+        :param extras: Lista opcional de (nombre, tipo, ayuda, valor) con métricas calculadas al exportar;
+                       el valor puede ser un número o una lista de (etiquetas, número).
+        :return: El texto en formato Prometheus (versión 0.0.4).
+        """
+        contadores, histogramas = self.totales()
+        lineas = []
+        for nombre, (tipo, ayuda, buckets) in DEFINICIONES.items():
+            lineas.append(f'# HELP {nombre} {ayuda}')
+            lineas.append(f'# TYPE {nombre} {tipo}')
+            if tipo == 'counter':
+                for (metrica, etiquetas), valor in sorted(contadores.items()):
+                    if metrica == nombre:
+                        lineas.append(f'{nombre}{_formatear_etiquetas(etiquetas)} {_numero(valor)}')
+            else:
+                for (metrica, etiquetas), datos in sorted(histogramas.items()):
+                    if metrica != nombre:
+                        continue
+                    acumulado = 0
+                    for limite, conteo in zip(buckets, datos):
+                        acumulado += conteo
+                        lineas.append(f'{nombre}_bucket{_formatear_etiquetas(etiquetas + (("le", _numero(limite)),))} {acumulado}')
+                    lineas.append(f'{nombre}_bucket{_formatear_etiquetas(etiquetas + (("le", "+Inf"),))} {datos[-1]}')
+                    lineas.append(f'{nombre}_sum{_formatear_etiquetas(etiquetas)} {_numero(datos[-2])}')
+                    lineas.append(f'{nombre}_count{_formatear_etiquetas(etiquetas)} {datos[-1]}')
+        for nombre, tipo, ayuda, valor in extras or []:
+            lineas.append(f'# HELP {nombre} {ayuda}')
+            lineas.append(f'# TYPE {nombre} {tipo}')
+            for etiquetas, numero in (valor if isinstance(valor, list) else [((), valor)]):
+                lineas.append(f'{nombre}{_formatear_etiquetas(etiquetas)} {_numero(numero)}')
+        return '\n'.join(lineas) + '\n'
+
+
+def _sumar(destino, origen):
+    """Suma los contadores e histogramas de un fragmento sobre otro."""
+    for clave, valor in list(origen.contadores.items()):
+        destino.contadores[clave] = destino.contadores.get(clave, 0) + valor
+    for clave, datos in list(origen.histogramas.items()):
+        actuales = destino.histogramas.get(clave)
+        if actuales is None:
+            destino.histogramas[clave] = list(datos)
+        else:
+            for i, valor in enumerate(datos):
+                actuales[i] += valor
+
+
+def _formatear_etiquetas(etiquetas):
+    if not etiquetas:
+        return ''
+    partes = []
+    for nombre, valor in etiquetas:
+        valor = str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        partes.append(f'{nombre}="{valor}"')
+    return '{' + ','.join(partes) + '}'
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+# Registro global del proceso
+registro = RegistroMetricas()
+
+# Tiempos acumulados por fase de la solicitud en curso, por hilo (ver iniciar_solicitud)
+_solicitud_actual = threading.local()
+
+
+def iniciar_solicitud():
+    """Marca el inicio de una solicitud en el hilo actual y reinicia sus tiempos por fase."""
+    _solicitud_actual.fases = {'almacenamiento': 0.0, 'serializacion': 0.0}
+    _solicitud_actual.bytes_almacenamiento = 0
+    _solicitud_actual.inicio = time.perf_counter()
+    registro.incrementar('tienda_http_solicitudes_iniciadas_total')
+
+
+def terminar_solicitud():
+    """
+    Marca el fin de la solicitud del hilo actual.
+    :return: Un diccionario con la duración total y el tiempo por fase (en segundos), o None si no había solicitud.
+    """
+    inicio = getattr(_solicitud_actual, 'inicio', None)
+    if inicio is None:
+        return None
+    total = time.perf_counter() - inicio
+    fases = dict(_solicitud_actual.fases)
+    fases['computo'] = max(total - fases['almacenamiento'] - fases['serializacion'], 0.0)
+    fases['total'] = total
+    fases['bytes_almacenamiento'] = _solicitud_actual.bytes_almacenamiento
+    _solicitud_actual.inicio = None
+    registro.incrementar('tienda_http_solicitudes_terminadas_total')
+    return fases
+
+
+def sumar_fase(fase, segundos):
+    """Suma tiempo a una fase de la solicitud en curso del hilo actual (si hay una)."""
+    if getattr(_solicitud_actual, 'inicio', None) is not None:
+        _solicitud_actual.fases[fase] += segundos
+
+
+def registrar_almacenamiento(operacion, archivo, segundos, num_bytes):
+    """
+    Registra una operación de JsonStorage.
+    :param operacion: 'cargar' o 'guardar'.
+    :param archivo: Nombre del archivo (sin ruta).
+    :param segundos: Duración de la operación.
+    :param num_bytes: Bytes leídos o escritos.
+    """
+    etiquetas = (('operacion', operacion), ('archivo', archivo))
+    registro.observar('tienda_almacenamiento_duracion_segundos', segundos, etiquetas)
+    registro.incrementar('tienda_almacenamiento_bytes_total', etiquetas, num_bytes)
+    if getattr(_solicitud_actual, 'inicio', None) is not None:
+        _solicitud_actual.fases['almacenamiento'] += segundos
+        _solicitud_actual.bytes_almacenamiento += num_bytes
+
+
+def registrar_lote(archivo, escrituras, exito):
+    """
+    Registra un lote de escritura agrupada de JsonStorage.
+    :param archivo: Nombre del archivo (sin ruta).
+    :param escrituras: Número de guardar() que se escribieron juntos.
+    :param exito: Si el lote se guardó correctamente.
+    """
+    registro.observar('tienda_almacenamiento_lote_escrituras', escrituras, (('archivo', archivo),))
+    registro.incrementar('tienda_almacenamiento_lotes_total',
+                         (('archivo', archivo), ('resultado', 'ok' if exito else 'error')))
+
+
+def registrar_admision(clase, motivo=None):
+    """
+    Registra una solicitud admitida o rechazada por el control de admisión (ver admision.py).
+    :param clase: Clase de prioridad de la solicitud.
+    :param motivo: Motivo del rechazo, o None si fue admitida.
+    """
+    if motivo is None:
+        registro.incrementar('tienda_admision_admitidas_total', (('clase', clase),))
+    else:
+        registro.incrementar('tienda_admision_rechazos_total', (('clase', clase), ('motivo', motivo)))
+
+
+def exportar(extras=None):
+    """
+    Genera el texto de exposición de Prometheus del registro global,
+    incluyendo el número de solicitudes en curso.
+    :param extras: Métricas adicionales calculadas al exportar (ver RegistroMetricas.exportar).
+    """
+    contadores, _ = registro.totales()
+    en_curso = (contadores.get(('tienda_http_solicitudes_iniciadas_total', ()), 0)
+                - contadores.get(('tienda_http_solicitudes_terminadas_total', ()), 0))
+    return registro.exportar([('tienda_http_solicitudes_en_curso', 'gauge', 'Solicitudes HTTP en curso.', en_curso)]
+                             + (extras or []))
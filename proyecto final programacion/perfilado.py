@@ -0,0 +1,155 @@
+"""
+Perfilado bajo demanda y registro de solicitudes lentas del backend.
+
+Se configura por variables de entorno (ver Perfilador.desde_entorno):
+- TIENDA_PERFILAR: 'todas' para perfilar todas las solicitudes, o una lista de reglas de
+  ruta separadas por comas (ej. '/estadisticas/ventas_por_dia,/ventas'). Vacía = desactivado.
+- TIENDA_TOKEN_ADMIN: si se define, las solicitudes con el encabezado 'X-Tienda-Perfilar: 1'
+  y el token en 'X-Tienda-Admin' (ver token_admin_valido) se perfilan aunque TIENDA_PERFILAR
+  esté vacía.
+- TIENDA_PERFILES_DIR: carpeta donde se guardan los perfiles (.prof, legibles con pstats/snakeviz).
+- TIENDA_UMBRAL_LENTO_MS: solicitudes más lentas que este umbral van al registro de lentas (0 = desactivado).
+- TIENDA_LOG_LENTAS: archivo (rotativo) del registro de solicitudes lentas.
+
+Cuando el perfilado está desactivado, el costo por solicitud es una comparación.
+Se perfila una solicitud a la vez: las que llegan mientras otra se perfila se atienden sin perfil.
+"""
+import collections
+import cProfile
+import hmac
+import json
+import logging
+import logging.handlers
+import os
+import re
+import threading
+from datetime import datetime
+
+ENCABEZADO_ADMIN = 'X-Tienda-Admin' # Token de TIENDA_TOKEN_ADMIN, para todas las rutas de administración
+ENCABEZADO_PERFILAR = 'X-Tienda-Perfilar'
+MAX_ENTRADAS_LENTAS = 200 # Entradas del registro de lentas que se conservan en memoria
+
+
+def token_admin_valido(encabezados, token):
+    """
+    Indica si la solicitud trae el token de administración en 'X-Tienda-Admin' (comparado en
+    tiempo constante). Sin token configurado retorna False: lo de administración queda deshabilitado.
+    :param encabezados: Encabezados de la solicitud.
+    :param token: El token configurado (TIENDA_TOKEN_ADMIN), o None.
+    """
+    recibido = encabezados.get(ENCABEZADO_ADMIN)
+    return bool(token) and recibido is not None and hmac.compare_digest(recibido.encode(), token.encode())
+
+
+class Perfilador:
+    """
+    Decide qué solicitudes perfilar con cProfile, guarda sus perfiles en disco y mantiene
+    un registro rotativo de solicitudes lentas con su desglose de tiempos.
+    """
+    def __init__(self, rutas=None, todas=False, token=None, directorio=None,
+                 umbral_lento_s=None, archivo_log=None):
+        self.rutas = set(rutas or [])
+        self.todas = todas
+        self.token = token
+        self.directorio = directorio
+        self.umbral_lento_s = umbral_lento_s
+        self.activo = bool(self.todas or self.rutas or self.token)
+        self._lentas = collections.deque(maxlen=MAX_ENTRADAS_LENTAS)
+        self._lock = threading.Lock()
+        # cProfile admite un solo perfil activo por proceso (desde Python 3.12 lanza ValueError)
+        self._lock_perfil = threading.Lock()
+        self._log = None
+        if archivo_log and umbral_lento_s:
+            self._log = logging.getLogger('tienda.solicitudes_lentas')
+            self._log.setLevel(logging.INFO)
+            self._log.propagate = False
+            if not self._log.handlers:
+                manejador = logging.handlers.RotatingFileHandler(archivo_log, maxBytes=5 * 1024 * 1024,
+                                                                 backupCount=3, encoding='utf-8')
+                self._log.addHandler(manejador)
+
+    @classmethod
+    def desde_entorno(cls, ruta_base):
+        """
+        Crea el perfilador a partir de las variables de entorno.
+        :param ruta_base: Carpeta del proyecto, usada para las rutas por defecto.
+        """
+        perfilar = os.environ.get('TIENDA_PERFILAR', '').strip()
+        todas = perfilar.lower() in ('1', 'todas', 'true')
+        rutas = [] if todas else [r.strip() for r in perfilar.split(',') if r.strip()]
+        umbral_ms = float(os.environ.get('TIENDA_UMBRAL_LENTO_MS', '1000'))
+        return cls(rutas=rutas, todas=todas,
+                   token=os.environ.get('TIENDA_TOKEN_ADMIN') or None,
+                   directorio=os.environ.get('TIENDA_PERFILES_DIR') or os.path.join(ruta_base, 'perfiles'),
+                   umbral_lento_s=umbral_ms / 1000 if umbral_ms > 0 else None,
+                   archivo_log=os.environ.get('TIENDA_LOG_LENTAS') or os.path.join(ruta_base, 'solicitudes_lentas.log'))
+
+    def es_admin(self, encabezados):
+        """Indica si la solicitud trae el token de administración correcto (ver token_admin_valido)."""
+        return token_admin_valido(encabezados, self.token)
+
+    def debe_perfilar(self, regla, encabezados):
+        """
+        Indica si una solicitud debe perfilarse.
+        :param regla: Regla de la ruta (ej. '/productos/<nombre>') o None.
+        :param encabezados: Encabezados de la solicitud.
+        """
+        if not self.activo:
+            return False
+        return (self.todas or regla in self.rutas
+                or (bool(encabezados.get(ENCABEZADO_PERFILAR)) and self.es_admin(encabezados)))
+
+    def iniciar(self):
+        """
+        Inicia un perfil de cProfile en el hilo actual y lo retorna. Si ya hay otra solicitud
+        perfilándose no espera: retorna None y la solicitud se atiende sin perfilar.
+        """
+        if not self._lock_perfil.acquire(blocking=False):
+            return None
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError: # Otro perfilador (ajeno a este) ya está activo
+            self._lock_perfil.release()
+            return None
+        return perfil
+
+    def descartar(self, perfil):
+        """Detiene el perfil sin guardarlo y permite perfilar otra solicitud."""
+        perfil.disable()
+        self._lock_perfil.release()
+
+    def terminar(self, perfil, metodo, regla):
+        """
+        Detiene el perfil y lo guarda en el directorio de perfiles.
+        :return: La ruta del archivo .prof generado, o None si no se pudo guardar.
+        """
+        self.descartar(perfil)
+        nombre_ruta = re.sub(r'[^A-Za-z0-9_]+', '_', regla or 'sin_ruta').strip('_') or 'raiz'
+        marca = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        archivo = os.path.join(self.directorio, f'{marca}_{metodo}_{nombre_ruta}.prof')
+        try:
+            os.makedirs(self.directorio, exist_ok=True)
+            perfil.dump_stats(archivo)
+        except OSError:
+            return None
+        return archivo
+
+    def es_lenta(self, segundos):
+        """Indica si una duración supera el umbral de solicitud lenta."""
+        return self.umbral_lento_s is not None and segundos >= self.umbral_lento_s
+
+    def registrar_lenta(self, entrada):
+        """
+        Agrega una entrada al registro de solicitudes lentas (en memoria y en el archivo rotativo).
+        :param entrada: Diccionario serializable con los datos de la solicitud.
+        """
+        with self._lock:
+            self._lentas.append(entrada)
+        if self._log:
+            self._log.info(json.dumps(entrada, ensure_ascii=False))
+
+    def lentas(self):
+        """Retorna las últimas solicitudes lentas registradas, de la más reciente a la más antigua."""
+        with self._lock:
+            return list(reversed(self._lentas))
@@ -0,0 +1,133 @@
+"""
+Series diarias acumuladas (sumas de prefijos) de unidades vendidas.
+
+Por cada día con ventas se guarda el total acumulado hasta ese día, en dos arreglos compactos
+(array de la biblioteca estándar): días y acumulados. El total de cualquier rango de fechas
+es la diferencia de dos acumulados, cada uno ubicado con una búsqueda binaria, sin recorrer
+las ventas. Se lleva una serie total, una por producto y una por origen.
+
+Registrar una venta del último día con ventas (el caso normal) agrega o modifica el último
+elemento; una venta con fecha pasada (importación, cambio de fecha, cancelación) corrige
+los acumulados de los días posteriores.
+"""
+import bisect
+from array import array
+from datetime import date
+
+
+def dia(fecha):
+    """Convierte una fecha 'YYYY-MM-DD' en su número de día (ordinal); lanza ValueError si es inválida."""
+    return date.fromisoformat(fecha).toordinal()
+
+
+class SerieAcumulada:
+    """
+    Unidades acumuladas por día de una serie, solo en los días con ventas.
+    """
+    def __init__(self):
+        self.dias = array('l')
+        self.acumulado = array('q')
+
+    @classmethod
+    def desde_conteos(cls, conteos):
+        """
+        Construye la serie de una sola vez a partir de las unidades de cada día.
+        :param conteos: Diccionario {número_de_día: unidades}.
+        """
+        serie = cls()
+        total = 0
+        for numero_dia in sorted(conteos):
+            total += conteos[numero_dia]
+            serie.dias.append(numero_dia)
+            serie.acumulado.append(total)
+        return serie
+
+    def sumar(self, numero_dia, cantidad):
+        """Suma 'cantidad' (puede ser negativa) a las unidades del día indicado."""
+        i = bisect.bisect_left(self.dias, numero_dia)
+        if i == len(self.dias) or self.dias[i] != numero_dia:
+            self.dias.insert(i, numero_dia)
+            self.acumulado.insert(i, self.acumulado[i - 1] if i else 0)
+        for j in range(i, len(self.acumulado)):
+            self.acumulado[j] += cantidad
+
+    def hasta(self, numero_dia):
+        """Retorna las unidades acumuladas hasta el día indicado, inclusive."""
+        i = bisect.bisect_right(self.dias, numero_dia)
+        return self.acumulado[i - 1] if i else 0
+
+    def rango(self, inicio, fin):
+        """Retorna las unidades vendidas entre dos días, ambos inclusive."""
+        return self.hasta(fin) - self.hasta(inicio - 1)
+
+
+class SeriesVentas:
+    """
+    Series acumuladas de unidades vendidas: total, por producto y por origen.
+    Se actualizan con cada venta agregada o quitada (ver IndiceVentas en backfinal.py).
+    """
+    def __init__(self):
+        self.total = SerieAcumulada()
+        self.por_producto = {}
+        self.por_origen = {}
+
+    @classmethod
+    def construir(cls, ventas):
+        """
+        Construye las series de una lista de ventas en una sola pasada (sin insertar día por
+        día en los arreglos, que costaría O(días) por venta si no están ordenadas por fecha).
+        """
+        total, por_producto, por_origen = {}, {}, {}
+        for venta in ventas:
+            dato = cls._dia_y_cantidad(venta)
+            if dato is None:
+                continue
+            numero_dia, cantidad = dato
+            total[numero_dia] = total.get(numero_dia, 0) + cantidad
+            conteos = por_producto.setdefault(venta.get('producto'), {})
+            conteos[numero_dia] = conteos.get(numero_dia, 0) + cantidad
+            if venta.get('origen'):
+                conteos = por_origen.setdefault(venta['origen'], {})
+                conteos[numero_dia] = conteos.get(numero_dia, 0) + cantidad
+        series = cls()
+        series.total = SerieAcumulada.desde_conteos(total)
+        series.por_producto = {k: SerieAcumulada.desde_conteos(c) for k, c in por_producto.items()}
+        series.por_origen = {k: SerieAcumulada.desde_conteos(c) for k, c in por_origen.items()}
+        return series
+
+    @staticmethod
+    def _dia_y_cantidad(venta):
+        """Retorna (número_de_día, cantidad) de una venta, o None si su fecha o cantidad son inválidas."""
+        cantidad = venta.get('cantidad')
+        if not isinstance(cantidad, int):
+            return None
+        try:
+            return dia(venta.get('fecha')), cantidad
+        except (TypeError, ValueError):
+            return None
+
+    def sumar(self, venta, signo=1):
+        """
+        Agrega (signo=1) o quita (signo=-1) las unidades de una venta de las series.
+        Las ventas con fecha o cantidad inválidas se ignoran, como en las estadísticas.
+        """
+        dato = self._dia_y_cantidad(venta)
+        if dato is None:
+            return
+        numero_dia, cantidad = dato
+        cantidad *= signo
+        self.total.sumar(numero_dia, cantidad)
+        self.por_producto.setdefault(venta.get('producto'), SerieAcumulada()).sumar(numero_dia, cantidad)
+        if venta.get('origen'):
+            self.por_origen.setdefault(venta['origen'], SerieAcumulada()).sumar(numero_dia, cantidad)
+
+    def serie(self, producto=None, origen=None):
+        """
+        Retorna la serie pedida: la de un producto, la de un origen o la total.
+        Si el producto u origen no tiene ventas, retorna una serie vacía.
+        """
+        if producto is not None:
+            return self.por_producto.get(producto) or SerieAcumulada()
+        if origen is not None:
+            return self.por_origen.get(origen) or SerieAcumulada()
+        return self.total
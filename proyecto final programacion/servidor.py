@@ -0,0 +1,158 @@
+"""
+Lanzador de producción del backend de la tienda.
+
+Sirve la misma aplicación Flask de backfinal.py con un servidor WSGI de producción,
+sin el recargador ni el depurador del servidor de desarrollo:
+- gunicorn (Linux/macOS), con la configuración de gunicorn.conf.py;
+- waitress (Windows, o si gunicorn no está instalado);
+- si no hay ninguno, el servidor de werkzeug en modo multihilo.
+
+Configuración por variables de entorno:
+- TIENDA_HOST (por defecto 0.0.0.0) y TIENDA_PUERTO (por defecto 5000).
+- TIENDA_WORKERS: procesos worker (por defecto 1). Los datos viven en archivos JSON
+  compartidos, así que varios procesos no coordinan sus escrituras: usar más de 1
+  solo si se sabe lo que se hace. La concurrencia se obtiene con hilos.
+- TIENDA_HILOS: hilos por worker (por defecto 8).
+- TIENDA_TIMEOUT: segundos máximos por solicitud (por defecto 60).
+- TIENDA_TIMEOUT_APAGADO: segundos para terminar las solicitudes en curso al apagar (por defecto 30).
+- TIENDA_SERVIDOR: fuerza 'gunicorn', 'waitress' o 'werkzeug'.
+
+Uso:
+    python servidor.py
+"""
+import importlib.util
+import os
+import signal
+import sys
+import threading
+
+RUTA_BASE = os.path.dirname(os.path.abspath(__file__))
+
+
+def configuracion():
+    """Lee la configuración del servidor desde las variables de entorno."""
+    return {
+        'host': os.environ.get('TIENDA_HOST', '0.0.0.0'),
+        'puerto': int(os.environ.get('TIENDA_PUERTO', '5000')),
+        'workers': int(os.environ.get('TIENDA_WORKERS', '1')),
+        'hilos': int(os.environ.get('TIENDA_HILOS', '8')),
+        'timeout': int(os.environ.get('TIENDA_TIMEOUT', '60')),
+        'timeout_apagado': int(os.environ.get('TIENDA_TIMEOUT_APAGADO', '30')),
+    }
+
+
+def _disponible(modulo):
+    return importlib.util.find_spec(modulo) is not None
+
+
+def elegir_servidor():
+    """Elige el servidor WSGI a usar según TIENDA_SERVIDOR, el sistema y los paquetes instalados."""
+    forzado = os.environ.get('TIENDA_SERVIDOR')
+    if forzado:
+        return forzado
+    if os.name != 'nt' and _disponible('gunicorn'):
+        return 'gunicorn'
+    if _disponible('waitress'):
+        return 'waitress'
+    return 'werkzeug'
+
+
+def servir_gunicorn():
+    """Reemplaza este proceso por gunicorn con gunicorn.conf.py (precarga la app antes de crear los workers)."""
+    os.chdir(RUTA_BASE)
+    os.execv(sys.executable, [sys.executable, '-m', 'gunicorn',
+                              '-c', os.path.join(RUTA_BASE, 'gunicorn.conf.py'), 'wsgi:app'])
+
+
+class SolicitudesEnCurso:
+    """
+    Middleware WSGI que cuenta las solicitudes en curso. Al apagar, waitress y werkzeug dejan
+    de aceptar conexiones pero no esperan a los hilos que siguen atendiendo: con esperar()
+    se terminan esas solicitudes antes de cerrar el backend (gunicorn ya lo hace por su
+    cuenta, con graceful_timeout).
+    """
+    def __init__(self, aplicacion):
+        self.aplicacion = aplicacion
+        self.en_curso = 0
+        self._condicion = threading.Condition()
+
+    def __call__(self, environ, start_response):
+        with self._condicion:
+            self.en_curso += 1
+        try:
+            return self.aplicacion(environ, start_response)
+        finally:
+            with self._condicion:
+                self.en_curso -= 1
+                self._condicion.notify_all()
+
+    def esperar(self, timeout):
+        """Espera a que no queden solicitudes en curso. Retorna False si venció el timeout."""
+        with self._condicion:
+            return self._condicion.wait_for(lambda: self.en_curso == 0, timeout)
+
+
+def _terminar(aplicacion, config):
+    """Espera las solicitudes en curso (hasta TIENDA_TIMEOUT_APAGADO) y cierra el backend."""
+    import wsgi
+    if not aplicacion.esperar(config['timeout_apagado']):
+        print(f"Apagado: {aplicacion.en_curso} solicitudes no terminaron en {config['timeout_apagado']} s")
+    wsgi.backfinal.cerrar()
+
+
+def _apagar_al_recibir_senal(detener):
+    """Instala manejadores de SIGINT/SIGTERM que detienen el servidor de forma ordenada."""
+    def manejador(signum, frame):
+        # El apagado se hace en otro hilo: detener() puede bloquear hasta que termine el bucle del servidor
+        threading.Thread(target=detener, daemon=True).start()
+    signal.signal(signal.SIGINT, manejador)
+    if hasattr(signal, 'SIGTERM'):
+        signal.signal(signal.SIGTERM, manejador)
+
+
+def servir_waitress(config):
+    """Sirve la aplicación con waitress (multihilo, compatible con Windows)."""
+    from waitress.server import create_server
+    import wsgi
+
+    aplicacion = SolicitudesEnCurso(wsgi.app)
+    servidor = create_server(aplicacion, host=config['host'], port=config['puerto'],
+                             threads=config['hilos'], channel_timeout=config['timeout'])
+    _apagar_al_recibir_senal(servidor.close)
+    print(f"Sirviendo con waitress en http://{config['host']}:{config['puerto']} ({config['hilos']} hilos)")
+    try:
+        servidor.run()
+    except OSError:
+        pass # close() desde el manejador de señales interrumpe el bucle de waitress
+    finally:
+        _terminar(aplicacion, config)
+
+
+def servir_werkzeug(config):
+    """Sirve la aplicación con el servidor multihilo de werkzeug, sin depurador ni recargador."""
+    from werkzeug.serving import make_server
+    import wsgi
+
+    aplicacion = SolicitudesEnCurso(wsgi.app)
+    servidor = make_server(config['host'], config['puerto'], aplicacion, threaded=True)
+    _apagar_al_recibir_senal(servidor.shutdown)
+    print(f"Sirviendo con werkzeug (multihilo) en http://{config['host']}:{config['puerto']}")
+    try:
+        servidor.serve_forever()
+    finally:
+        _terminar(aplicacion, config)
+
+
+def main():
+    config = configuracion()
+    servidor = elegir_servidor()
+    if servidor == 'gunicorn':
+        servir_gunicorn()
+    elif servidor == 'waitress':
+        servir_waitress(config)
+    else:
+        servir_werkzeug(config)
+
+
+if __name__ == '__main__':
+    main()
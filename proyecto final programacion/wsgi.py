@@ -0,0 +1,16 @@
+"""
+Punto de entrada WSGI del backend (ej. 'gunicorn -c gunicorn.conf.py wsgi:app').
+
+Importar este módulo precarga los datos una sola vez; con preload_app de gunicorn
+esto ocurre en el proceso maestro, antes de crear los workers.
+"""
+import atexit
+
+import backfinal
+
+app = backfinal.app
+resumen_precarga = backfinal.precargar()
+print(f"Datos precargados: {resumen_precarga}")
+
+# Si el proceso termina sin pasar por los hooks del servidor, igual se completan las escrituras
+atexit.register(backfinal.cerrar)